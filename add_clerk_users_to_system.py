@@ -1,14 +1,55 @@
+"""
+Clerk → Supabase clients sync
+
+Mirrors Clerk users into the clients table: new users are inserted, and
+users whose name, email or phone changed in Clerk are updated.
+
+By default only users changed since the last run are read. Clerk lists
+users newest-updated first (order_by=-updated_at) and the walk stops at the
+stored watermark, so a quiet day costs one or two requests. Deleted Clerk
+users never show up in that listing, so every CLERK_RECONCILE_DAYS (or with
+--full) the run lists every user instead and reports clients whose clerk_id
+no longer exists in Clerk. Those rows are reported, not deleted.
+
+Usage:
+    python add_clerk_users_to_system.py            # changes since the watermark
+    python add_clerk_users_to_system.py --full     # every user + deletion check
+    python add_clerk_users_to_system.py --plan     # print the changes, write nothing
+
+Requirements:
+    - CLERK_SECRET_KEY in .env file
+    - SUPABASE_URL and SUPABASE_ANON_KEY in .env file
+    - CLERK_SYNC_CURSOR_FILE (default clerk_sync_cursor.json) for the watermark
+"""
+
+import argparse
+import json
 import os
-import requests
+import sys
+import time
 from supabase import create_client, Client
 import re
-from typing import Optional, Dict, Any
+from typing import Optional
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 
+import http_cache
+import profiling
+import resilience
+import sync_diff
+import sync_metrics
+from api_endpoints import clerk_api_base
+from sync_records import ClerkUser
+
 # Load environment variables from .env file
 load_dotenv()
 
+PAGE_LIMIT = 100
+WRITE_CHUNK_SIZE = 500
+LOOKUP_CHUNK_SIZE = 200
+PROFILE_FIELDS = ('name', 'email', 'phone')
+DEFAULT_RECONCILE_DAYS = 7
+
 def normalize_phone_number(phone: str) -> Optional[str]:
     """Normalize phone number to E.164 format"""
     if not phone:
@@ -39,8 +80,49 @@ def get_supabase_client() -> Client:
     
     return create_client(url, key)
 
-def fetch_all_clerk_users() -> list:
-    """Fetch all users from Clerk with pagination"""
+# ------------------------------------------------------------------
+#  Watermark
+# ------------------------------------------------------------------
+def cursor_path() -> str:
+    return os.getenv('CLERK_SYNC_CURSOR_FILE', 'clerk_sync_cursor.json')
+
+def load_cursor() -> Optional[dict]:
+    try:
+        with open(cursor_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_cursor(cursor: dict):
+    tmp = cursor_path() + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cursor, f)
+    os.replace(tmp, cursor_path())
+
+def advance_cursor(cursor: Optional[dict], users: list) -> dict:
+    """Moves the watermark to the newest updated_at; ids at that millisecond are kept to skip them next time."""
+    cursor = dict(cursor or {'updated_at': 0, 'user_ids': []})
+    stamped = [u for u in users if u.updated_at]
+    if not stamped:
+        return cursor
+    newest = max(u.updated_at for u in stamped)
+    if newest < cursor['updated_at']:
+        return cursor
+    seen = {u.id for u in stamped if u.updated_at == newest}
+    if newest == cursor['updated_at']:
+        seen.update(cursor.get('user_ids', []))
+    cursor.update(updated_at=newest, user_ids=sorted(seen))
+    return cursor
+
+def reconcile_due(cursor: Optional[dict]) -> bool:
+    days = float(os.getenv('CLERK_RECONCILE_DAYS', DEFAULT_RECONCILE_DAYS))
+    return not cursor or time.time() - cursor.get('reconciled_at', 0) > days * 86400
+
+# ------------------------------------------------------------------
+#  Fetch
+# ------------------------------------------------------------------
+def iter_clerk_pages(order_by: Optional[str] = None):
+    """Yields pages of raw Clerk users. Raises on an error response, since a short listing would look like deletions."""
     clerk_secret_key = os.getenv('CLERK_SECRET_KEY')
     if not clerk_secret_key:
         raise ValueError("CLERK_SECRET_KEY environment variable is required")
@@ -50,121 +132,180 @@ def fetch_all_clerk_users() -> list:
         'Content-Type': 'application/json'
     }
     
-    all_users = []
     offset = 0
-    limit = 100
-    
-    while True:
-        url = f'https://api.clerk.com/v1/users?limit={limit}&offset={offset}'
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code != 200:
-            print(f"Error fetching users: {response.status_code} - {response.text}")
-            break
-        
-        data = response.json()
-        
-        # Handle different response formats
-        if isinstance(data, list):
-            users = data
-        else:
-            users = data.get('data', [])
-        
-        if not users:
-            break
-        
-        all_users.extend(users)
-        offset += limit
-        
+    session = http_cache.get_session()
+    try:
+        while True:
+            url = f'{clerk_api_base()}/users?limit={PAGE_LIMIT}&offset={offset}'
+            if order_by:
+                url += f'&order_by={order_by}'
+            response = resilience.call('clerk', session.get, url, headers=headers, timeout=30)
+            
+            if response.status_code != 200:
+                raise RuntimeError(f"Error fetching users: {response.status_code} - {response.text}")
+            
+            data = response.json()
+            
+            # Handle different response formats
+            users = data if isinstance(data, list) else data.get('data', [])
+            if not users:
+                break
+            yield users
+            
+            # Check if we've reached the end
+            if len(users) < PAGE_LIMIT:
+                break
+            offset += PAGE_LIMIT
+    finally:
+        if http_cache.describe(session):
+            print(http_cache.describe(session))
+
+def fetch_all_clerk_users() -> list:
+    """Fetch all users from Clerk with pagination, as ClerkUser records"""
+    all_users = []
+    for users in iter_clerk_pages():
+        # Keep only the fields we insert; the raw JSON is dropped with the page
+        all_users.extend(ClerkUser.from_api(u) for u in users)
         print(f"Fetched {len(users)} users (total: {len(all_users)})")
-        
-        # Check if we've reached the end
-        if len(users) < limit:
-            break
-    
     return all_users
 
-def add_clerk_user_to_supabase(supabase: Client, user: Dict[Any, Any]) -> bool:
-    """Add a single Clerk user to Supabase clients table"""
-    try:
-        # Extract user data
-        clerk_id = user.get('id')
-        first_name = user.get('first_name', '')
-        last_name = user.get('last_name', '')
-        name = f"{first_name} {last_name}".strip() or 'Unknown'
-        
-        # Get primary email
-        email_addresses = user.get('email_addresses', [])
-        primary_email = None
-        for email_obj in email_addresses:
-            if email_obj.get('id') == user.get('primary_email_address_id'):
-                primary_email = email_obj.get('email_address')
-                break
-        
-        if not primary_email and email_addresses:
-            primary_email = email_addresses[0].get('email_address')
-        
-        # Get primary phone
-        phone_numbers = user.get('phone_numbers', [])
-        primary_phone = None
-        for phone_obj in phone_numbers:
-            if phone_obj.get('id') == user.get('primary_phone_number_id'):
-                primary_phone = phone_obj.get('phone_number')
+def fetch_changed_clerk_users(cursor: dict) -> list:
+    """Users updated since the watermark, newest first, read until the first older one."""
+    watermark = cursor['updated_at']
+    seen_at_watermark = set(cursor.get('user_ids', []))
+    changed = {}
+    pages = 0
+    for users in iter_clerk_pages(order_by='-updated_at'):
+        pages += 1
+        older = False
+        for raw in users:
+            user = ClerkUser.from_api(raw)
+            updated_at = user.updated_at or 0
+            if updated_at < watermark:
+                older = True
                 break
-        
-        if not primary_phone and phone_numbers:
-            primary_phone = phone_numbers[0].get('phone_number')
-        
-        # Normalize phone number
-        normalized_phone = normalize_phone_number(primary_phone) if primary_phone else None
-        
-        if not primary_email:
-            print(f"Skipping user {clerk_id}: No email address found")
-            return False
-        
-        # Check if user already exists
-        existing_user = supabase.table('clients').select('*').eq('clerk_id', clerk_id).execute()
-        if existing_user.data:
-            print(f"User {primary_email} already exists in database")
-            return False
-        
-        # Convert Clerk timestamp to ISO format
-        created_at = user.get('created_at')
-        if created_at and isinstance(created_at, (int, str)):
-            try:
-                # Clerk timestamps are in milliseconds
-                timestamp_ms = int(created_at)
-                created_at_iso = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).isoformat()
-            except (ValueError, TypeError):
-                created_at_iso = None
-        else:
-            created_at_iso = None
-        
-        # Prepare user data for insertion
-        user_data = {
-            'clerk_id': clerk_id,
-            'name': name,
-            'email': primary_email,
-            'phone': normalized_phone,
-            'created_at': created_at_iso
-        }
-        
-        # Insert user into Supabase
-        result = supabase.table('clients').insert(user_data).execute()
-        
-        if result.data:
-            print(f"Successfully added user: {primary_email}")
-            return True
-        else:
-            print(f"Failed to add user: {primary_email}")
-            return False
-            
+            if updated_at == watermark and user.id in seen_at_watermark:
+                continue
+            # A user updated mid-walk moves to the front and can shift another one onto the next page
+            changed.setdefault(user.id, user)
+        if older:
+            break
+    print(f"Read {pages} page(s) of users ordered by updated_at; {len(changed)} changed since the watermark")
+    return list(changed.values())
+
+# ------------------------------------------------------------------
+#  Plan + apply
+# ------------------------------------------------------------------
+def clerk_created_at_iso(created_at) -> Optional[str]:
+    """Clerk timestamps are in milliseconds"""
+    if not created_at or not isinstance(created_at, (int, str)):
+        return None
+    try:
+        return datetime.fromtimestamp(int(created_at) / 1000, tz=timezone.utc).isoformat()
+    except (ValueError, TypeError):
+        return None
+
+def client_row_for(user: ClerkUser) -> dict:
+    """The clients columns a Clerk user maps to"""
+    return {
+        'clerk_id': user.id,
+        'name': user.name,
+        'email': user.email,
+        'phone': normalize_phone_number(user.phone) if user.phone else None,
+        'created_at': clerk_created_at_iso(user.created_at),
+    }
+
+def load_clients_by_clerk_id(supabase: Client, clerk_ids: Optional[list] = None) -> dict:
+    """{clerk_id: row}, for the given ids or (None) for every client linked to Clerk"""
+    columns = 'id,clerk_id,' + ','.join(PROFILE_FIELDS)
+    if clerk_ids is None:
+        rows = sync_diff.fetch_all_rows(supabase, 'clients', columns,
+                                        lambda q: q.not_.is_('clerk_id', 'null'))
+    else:
+        rows = []
+        for start in range(0, len(clerk_ids), LOOKUP_CHUNK_SIZE):
+            chunk = clerk_ids[start:start + LOOKUP_CHUNK_SIZE]
+            rows.extend(supabase.table('clients').select(columns).in_('clerk_id', chunk).execute().data or [])
+    return {row['clerk_id']: row for row in rows}
+
+def plan_changes(users: list, existing: dict):
+    """
+    Returns (rows to insert, rows to update, users skipped for having no email).
+    Updates only carry values Clerk actually has, so a profile without a phone
+    does not clear a phone that was entered in Supabase.
+    """
+    inserts, updates, skipped = [], [], []
+    for user in users:
+        row = client_row_for(user)
+        if not row['email']:
+            skipped.append(user)
+            continue
+        current = existing.get(user.id)
+        if current is None:
+            inserts.append(row)
+            continue
+        desired = {field: row[field] for field in PROFILE_FIELDS if row[field]}
+        changes = sync_diff.diff_fields(current, desired)
+        if changes:
+            # Every row in the bulk upsert has the same keys
+            updates.append({'id': current['id'], 'clerk_id': user.id,
+                            **{field: current.get(field) for field in PROFILE_FIELDS}, **changes})
+    return inserts, updates, skipped
+
+def write_chunk(write, rows: list, action: str) -> list:
+    """
+    Writes rows in one call; if that fails, one row at a time, so a single bad
+    row does not fail the others. Returns the rows that could not be written.
+    """
+    try:
+        write(rows)
+        return []
     except Exception as e:
-        print(f"Error adding user {user.get('id', 'unknown')}: {str(e)}")
-        return False
+        print(f"Failed to {action} {len(rows)} users in one batch ({str(e)}), retrying one by one")
+    failed = []
+    for row in rows:
+        try:
+            write([row])
+        except Exception as e:
+            print(f"Failed to {action} user {row['email']} ({row['clerk_id']}): {str(e)}")
+            failed.append(row)
+    return failed
+
+def apply_changes(supabase: Client, inserts: list, updates: list) -> list:
+    """Bulk-writes the planned rows in chunks. Returns the rows that failed."""
+    insert = lambda rows: supabase.table('clients').insert(rows).execute()
+    upsert = lambda rows: supabase.table('clients').upsert(rows, on_conflict='id').execute()
+    failed = []
+    for start in range(0, len(inserts), WRITE_CHUNK_SIZE):
+        failed += write_chunk(insert, inserts[start:start + WRITE_CHUNK_SIZE], 'add')
+    for start in range(0, len(updates), WRITE_CHUNK_SIZE):
+        failed += write_chunk(upsert, updates[start:start + WRITE_CHUNK_SIZE], 'update')
+    return failed
 
-def main():
-    """Main function to add all Clerk users to Supabase"""
+def written_users(users: list, failed: list) -> list:
+    """
+    The users the watermark may move past: those older than the oldest failed
+    one, so the next incremental run lists the failed users again.
+    """
+    failed_ids = {row['clerk_id'] for row in failed}
+    if not failed_ids:
+        return users
+    oldest = min(u.updated_at or 0 for u in users if u.id in failed_ids)
+    return [u for u in users if u.updated_at and u.updated_at < oldest]
+
+def find_deleted(existing: dict, clerk_ids: set) -> list:
+    """Client rows whose Clerk user no longer exists"""
+    return [row for clerk_id, row in existing.items() if clerk_id not in clerk_ids]
+
+def main(argv=None):
+    """Main function to sync Clerk users to Supabase"""
+    parser = argparse.ArgumentParser(description="Sync Clerk users into the Supabase clients table")
+    parser.add_argument('--full', action='store_true',
+                        help="list every Clerk user and check for deleted ones, ignoring the watermark")
+    parser.add_argument('--plan', action='store_true', help="print the changes instead of writing them")
+    args = parser.parse_args(argv)
+
+    sync_metrics.install("add_clerk_users_to_system")
     try:
         print("Starting Clerk users sync to Supabase...")
         
@@ -172,34 +313,67 @@ def main():
         supabase = get_supabase_client()
         print("Connected to Supabase")
         
-        # Fetch all Clerk users
-        print("Fetching all users from Clerk...")
-        clerk_users = fetch_all_clerk_users()
+        cursor = load_cursor()
+        full = args.full or reconcile_due(cursor)
+        started = time.time()
+        
+        with sync_metrics.stage("fetch"):
+            if full:
+                print("Fetching all users from Clerk...")
+                clerk_users = fetch_all_clerk_users()
+            else:
+                print(f"Fetching users updated since {datetime.fromtimestamp(cursor['updated_at'] / 1000, tz=timezone.utc).isoformat()}...")
+                clerk_users = fetch_changed_clerk_users(cursor)
         print(f"Found {len(clerk_users)} users in Clerk")
         
-        if not clerk_users:
-            print("No users found in Clerk")
-            return
+        with sync_metrics.stage("match"):
+            if full:
+                existing = load_clients_by_clerk_id(supabase)
+            else:
+                existing = load_clients_by_clerk_id(supabase, [u.id for u in clerk_users])
+            inserts, updates, skipped = plan_changes(clerk_users, existing)
+            # An empty listing is far more likely a wrong key than every user deleted
+            deleted = find_deleted(existing, {u.id for u in clerk_users}) if full and clerk_users else []
         
-        # Add users to Supabase
-        print("Adding users to Supabase...")
-        added_count = 0
-        skipped_count = 0
+        failed = []
+        if args.plan:
+            for row in inserts:
+                print(f"  + {row['email']} ({row['name']})")
+            for row in updates:
+                print(f"  ~ {row['email']} ({row['name']})")
+        else:
+            with sync_metrics.stage("write"):
+                failed = apply_changes(supabase, inserts, updates)
         
-        for user in clerk_users:
-            if add_clerk_user_to_supabase(supabase, user):
-                added_count += 1
-            else:
-                skipped_count += 1
+        if deleted:
+            print(f"\n⚠️  {len(deleted)} clients are linked to Clerk users that no longer exist:")
+            for row in deleted:
+                print(f"  - {row.get('email')} (clerk_id {row['clerk_id']}, client {row['id']})")
         
-        print(f"\nSync completed!")
-        print(f"Added: {added_count} users")
-        print(f"Skipped: {skipped_count} users")
+        print(f"\nSync completed{' (plan only)' if args.plan else ''}!")
+        failed_ids = {row['clerk_id'] for row in failed}
+        print(f"Added: {sum(1 for row in inserts if row['clerk_id'] not in failed_ids)} users")
+        print(f"Updated: {sum(1 for row in updates if row['clerk_id'] not in failed_ids)} users")
+        print(f"Skipped (no email): {len(skipped)} users")
+        if failed:
+            print(f"Failed: {len(failed)} users (listed again on the next run)")
+        if full:
+            print(f"Deleted in Clerk: {len(deleted)} clients")
         print(f"Total processed: {len(clerk_users)} users")
         
+        if not args.plan:
+            cursor = advance_cursor(cursor, written_users(clerk_users, failed))
+            if full:
+                cursor['reconciled_at'] = int(started)
+                cursor['deleted_clerk_ids'] = sorted(row['clerk_id'] for row in deleted)
+            save_cursor(cursor)
+        return 1 if failed else 0
+        
     except Exception as e:
         print(f"Error in main function: {str(e)}")
         raise
+    finally:
+        sync_metrics.write_summary()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(profiling.run("add_clerk_users_to_system", main))
@@ -0,0 +1,35 @@
+"""
+Base URLs for the third-party APIs the sync scripts talk to.
+
+Each one can be overridden from the environment so the scripts can be pointed
+at the local stand-ins under benchmarks/ instead of the real services:
+
+    CLERK_API_BASE     (default https://api.clerk.com/v1)
+    HUBSPOT_API_BASE   (default https://api.hubapi.com)
+    STRIPE_API_BASE    (default https://api.stripe.com)
+    TWILIO_API_BASE    (default https://api.twilio.com)
+
+Supabase is already configured through SUPABASE_URL / VITE_SUPABASE_URL.
+The values are read on every call so they pick up load_dotenv().
+"""
+
+import os
+
+
+def clerk_api_base() -> str:
+    return os.getenv("CLERK_API_BASE", "https://api.clerk.com/v1").rstrip("/")
+
+
+def hubspot_api_base() -> str:
+    return os.getenv("HUBSPOT_API_BASE", "https://api.hubapi.com").rstrip("/")
+
+
+def twilio_api_base() -> str:
+    return os.getenv("TWILIO_API_BASE", "https://api.twilio.com").rstrip("/")
+
+
+def configure_stripe(stripe_module):
+    """Points the Stripe SDK at STRIPE_API_BASE when it is set."""
+    base = os.getenv("STRIPE_API_BASE")
+    if base:
+        stripe_module.api_base = base.rstrip("/")
@@ -1,62 +1,205 @@
+#!/usr/bin/env python3
+"""
+Migration Runner
+
+Applies the files in supabase/migrations in filename order, each as a single
+transactional call to the apply_migration RPC, and records them with a
+SHA-256 checksum in public.applied_migrations. Files that are already recorded
+are skipped; a recorded file whose content has changed is reported and stops
+the run. The run also stops at the first failing file, whose changes are
+rolled back.
+
+On a database without the tracking table, the runner first creates it by
+sending 20250810000000_create_migration_tracking.sql through exec_sql (as
+one string, not split on ';').
+
+Usage:
+    python apply_migration.py               # apply pending migrations
+    python apply_migration.py --dry-run     # list pending migrations
+    python apply_migration.py --baseline    # record the files older than the tracking
+                                            # migration as applied without running them,
+                                            # then apply the rest normally
+    python apply_migration.py --baseline-through 20250808000000
+                                            # same, with an explicit last baselined version
+
+--baseline is for a database that was migrated by hand before tracking
+existed: its old DDL (CREATE TABLE invoices, ...) is not idempotent and must
+not run again, but everything from the tracking migration on (the RPCs and
+the shard lease table) still has to be created.
+
+Requirements:
+    - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file
+    - the exec_sql function, for the one-time bootstrap:
+        CREATE OR REPLACE FUNCTION exec_sql(query TEXT) RETURNS void AS $$
+        BEGIN
+            EXECUTE query;
+        END;
+        $$ LANGUAGE plpgsql;
+"""
+
+import argparse
+import hashlib
 import os
+import sys
+import time
+
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
-def get_supabase_client():
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'supabase', 'migrations')
+TRACKING_MIGRATION = '20250810000000_create_migration_tracking'
+MISSING_RELATION_CODES = ('42P01', 'PGRST205')
+SCHEMA_CACHE_CODES = ('PGRST202', 'PGRST205')
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client"""
     load_dotenv()
-    url = os.getenv("VITE_SUPABASE_URL")
+    url = os.getenv("VITE_SUPABASE_URL") or os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    
+
     if not url or not key:
         raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
-    
+
     return create_client(url, key)
 
-def apply_migration(migration_file):
-    print(f"Applying migration: {migration_file}...")
-    
-    supabase = get_supabase_client()
-    
-    with open(migration_file, 'r') as f:
-        sql_content = f.read()
 
-    # Split statements in case there are multiple
-    sql_statements = [s.strip() for s in sql_content.split(';') if s.strip()]
+def list_migrations(directory: str = MIGRATIONS_DIR) -> list:
+    """Returns [(version, path, sql, checksum)] in filename order."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.sql'):
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, 'r') as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        migrations.append((filename[:-4], path, sql, checksum))
+    return migrations
+
 
-    for stmt in sql_statements:
+def fetch_applied(supabase: Client):
+    """Returns {version: checksum}, or None if the tracking table does not exist yet."""
+    try:
+        rows = supabase.table('applied_migrations').select('version, checksum').execute().data
+    except Exception as e:
+        if getattr(e, 'code', None) in MISSING_RELATION_CODES:
+            return None
+        raise
+    return {row['version']: row['checksum'] for row in rows}
+
+
+def bootstrap_tracking(supabase: Client, migrations: list):
+    """Creates the tracking table and apply_migration function through exec_sql."""
+    tracking = next((m for m in migrations if m[0] == TRACKING_MIGRATION), None)
+    if tracking is None:
+        raise FileNotFoundError(f"{TRACKING_MIGRATION}.sql not found in {MIGRATIONS_DIR}")
+    print(f"🔧 Creating migration tracking ({TRACKING_MIGRATION})...")
+    supabase.rpc('exec_sql', {'query': tracking[2]}).execute()
+
+    # PostgREST reloads its schema cache asynchronously after the NOTIFY
+    for attempt in range(10):
         try:
-            # Supabase Python library doesn't have a direct way to execute arbitrary DDL
-            # The recommended way is to use a custom RPC function `exec_sql`
-            # This function needs to be created in your Supabase SQL editor:
-            # CREATE OR REPLACE FUNCTION exec_sql(query TEXT) RETURNS void AS $$
-            # BEGIN
-            #     EXECUTE query;
-            # END;
-            # $$ LANGUAGE plpgsql;
-            result = supabase.rpc('exec_sql', {'query': stmt}).execute()
-            print(f"  ✅ Success: {stmt[:60]}...")
+            record_migration(supabase, tracking, record_only=True)
+            return
         except Exception as e:
-            print(f"  ❌ Error applying statement: {stmt[:60]}...")
-            print(f"     Error: {e}")
+            if getattr(e, 'code', None) not in SCHEMA_CACHE_CODES or attempt == 9:
+                raise
+            time.sleep(1)
+
 
-    print(f"Migration {migration_file} completed!")
+def record_migration(supabase: Client, migration, record_only: bool = False) -> str:
+    """Runs one file (or only records it) in a single transactional RPC call."""
+    version, _, sql, checksum = migration
+    result = supabase.rpc('apply_migration', {
+        'p_version': version,
+        'p_checksum': checksum,
+        'p_sql': '' if record_only else sql,
+        'p_record_only': record_only,
+    }).execute()
+    return result.data
 
 
+def _version_stamp(version: str) -> str:
+    """The 14-digit timestamp a migration filename starts with."""
+    return version[:14]
 
-def apply_all_new_migrations():
-    print("Checking for new migrations to apply...")
-    # This is a placeholder for a more robust migration tracking system
-    # For now, we'll just apply the latest one we created
-    migrations_dir = os.path.join(os.path.dirname(__file__), 'supabase', 'migrations')
-    
-    # In a real scenario, you'd track applied migrations in a db table
-    # For this script, we'll just apply the one we know is new.
-    new_migration = os.path.join(migrations_dir, '20250808000000_fix_invoices_id_column.sql')
 
-    if os.path.exists(new_migration):
-        apply_migration(new_migration)
-    else:
-        print("No new migration found to apply.")
+def is_baselined(version: str, baseline_through: str) -> bool:
+    """True when the file is covered by the baseline (at or before `baseline_through`)."""
+    return bool(baseline_through) and _version_stamp(version) <= _version_stamp(baseline_through)
+
+
+def default_baseline_through() -> str:
+    """The newest version a bare --baseline covers: everything before the tracking migration."""
+    older = [m[0] for m in list_migrations() if _version_stamp(m[0]) < _version_stamp(TRACKING_MIGRATION)]
+    return _version_stamp(older[-1]) if older else None
+
+
+def apply_pending(supabase: Client, dry_run: bool = False, baseline_through: str = None) -> bool:
+    """
+    Applies every pending migration in order. Pending files at or before
+    `baseline_through` are only recorded. Returns False if the run stopped early.
+    """
+    migrations = list_migrations()
+    applied = fetch_applied(supabase)
+    if applied is None:
+        if dry_run:
+            print(f"  ⏳ {TRACKING_MIGRATION} (tracking table not created yet)")
+            applied = {}
+        else:
+            bootstrap_tracking(supabase, migrations)
+            applied = fetch_applied(supabase)
+
+    pending = []
+    for migration in migrations:
+        version, _, _, checksum = migration
+        if version not in applied:
+            pending.append(migration)
+        elif applied[version] != checksum:
+            print(f"❌ {version} was modified after it was applied (checksum mismatch).")
+            print("   Add a new migration instead of editing an applied one.")
+            return False
+
+    print(f"📊 {len(migrations)} migrations, {len(migrations) - len(pending)} applied, {len(pending)} pending")
+    if dry_run:
+        for version, _, _, _ in pending:
+            note = " (baseline: record only)" if is_baselined(version, baseline_through) else ""
+            print(f"  ⏳ {version}{note}")
+        return True
+
+    for migration in pending:
+        version = migration[0]
+        try:
+            status = record_migration(supabase, migration, record_only=is_baselined(version, baseline_through))
+            print(f"  ✅ {version}: {status}")
+        except Exception as e:
+            print(f"  ❌ {version} failed and was rolled back: {e}")
+            print("     Stopping; later migrations were not applied.")
+            return False
+
+    print("🎉 Database is up to date.")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending Supabase migrations")
+    parser.add_argument("--dry-run", action="store_true", help="list pending migrations without applying them")
+    parser.add_argument("--baseline", action="store_true",
+                        help="record the files older than the tracking migration as applied without "
+                             "running them, then apply the rest (for databases migrated before tracking existed)")
+    parser.add_argument("--baseline-through", metavar="VERSION",
+                        help="like --baseline, but record the files up to and including this version")
+    args = parser.parse_args()
+
+    baseline_through = args.baseline_through or (default_baseline_through() if args.baseline else None)
+    if baseline_through and _version_stamp(baseline_through) >= _version_stamp(TRACKING_MIGRATION):
+        parser.error(f"--baseline-through must be older than {TRACKING_MIGRATION}; "
+                     "later migrations are idempotent and should run")
+
+    supabase = get_supabase_client()
+    return 0 if apply_pending(supabase, dry_run=args.dry_run, baseline_through=baseline_through) else 1
+
 
 if __name__ == "__main__":
-    apply_all_new_migrations()
\ No newline at end of file
+    sys.exit(main())
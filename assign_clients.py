@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Client Assignment
+
+Spreads unassigned clients (employee_id IS NULL) across a set of employees.
+Each client goes to the employee with the lowest current load that still
+has capacity (a min-heap over per-employee client counts). With --affinity,
+clients from the same company email domain or with the same referrer go to
+the employee who already has that domain/referrer, as long as they have room.
+
+Assignments are written as chunked bulk updates, guarded by
+employee_id IS NULL so clients assigned concurrently are not overwritten.
+The per-employee counts are then re-read and checked against the plan.
+
+With --server-side the whole assignment is one call to the
+assign_unassigned_clients RPC (round-robin or weighted); nothing is
+downloaded, at the cost of the capacity/affinity options.
+
+Usage:
+    python assign_clients.py --employees Sid,Andre --exclude-domain heffron.ai
+    python assign_clients.py --employees Sid,Andre --server-side --weight Sid=2
+    python assign_clients.py --employees Sid,Adam --capacity Sid=500 --affinity domain,referral
+    python assign_clients.py --employees Sid --dry-run
+
+Requirements:
+    - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file
+"""
+
+import argparse
+import heapq
+import os
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+import profiling
+
+PAGE_SIZE = 1000        # PostgREST's default max-rows
+UPDATE_CHUNK_SIZE = 200  # ~7.5 KB of uuids per in.(...) filter, well inside URL limits
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "outlook.com", "hotmail.com", "live.com", "yahoo.com",
+    "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "bigpond.com",
+}
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client"""
+    url = os.getenv("VITE_SUPABASE_URL") or os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if not url or not key:
+        raise ValueError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
+
+    return create_client(url, key)
+
+
+# ------------------------------------------------------------------
+#  Reads
+# ------------------------------------------------------------------
+def find_employees(supabase: Client, names: list) -> list:
+    """Resolves names (case-insensitive, substring like the old ilike '%sid%') to employee rows."""
+    rows = supabase.table('employees').select('id, name').execute().data or []
+    employees = []
+    for name in names:
+        matches = [r for r in rows if r['name'].lower() == name.lower()] or \
+                  [r for r in rows if name.lower() in r['name'].lower()]
+        if not matches:
+            raise ValueError(f"No employee found matching '{name}'")
+        if matches[0] not in employees:
+            employees.append(matches[0])
+    return employees
+
+
+def count_per_employee(supabase: Client, employee_ids: list) -> dict:
+    return {
+        emp_id: supabase.table('clients').select('id', count='exact').eq('employee_id', emp_id)
+                        .limit(1).execute().count or 0
+        for emp_id in employee_ids
+    }
+
+
+def iter_clients(make_query):
+    """Keyset pagination on id."""
+    last_id = None
+    while True:
+        query = make_query()
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        page = query.order('id').limit(PAGE_SIZE).execute().data or []
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        last_id = page[-1]['id']
+
+
+def email_domain(email: str) -> str:
+    domain = (email or "").rpartition("@")[2].strip().lower()
+    return "" if domain in FREE_MAIL_DOMAINS else domain
+
+
+def affinity_keys(client: dict, affinity: set) -> list:
+    keys = []
+    if "domain" in affinity:
+        domain = email_domain(client.get('email'))
+        if domain:
+            keys.append(("domain", domain))
+    if "referral" in affinity and (client.get('referred_by') or "").strip():
+        keys.append(("referral", client['referred_by'].strip().lower()))
+    return keys
+
+
+def load_affinity_owners(supabase: Client, employee_ids: list, affinity: set) -> dict:
+    """{(kind, key): employee_id} from clients already assigned to the selected employees."""
+    owners = {}
+    if not affinity:
+        return owners
+    make_query = lambda: supabase.table('clients').select('id, email, referred_by, employee_id') \
+                                 .in_('employee_id', employee_ids)
+    for client in iter_clients(make_query):
+        for key in affinity_keys(client, affinity):
+            owners.setdefault(key, client['employee_id'])
+    return owners
+
+
+# ------------------------------------------------------------------
+#  Planning
+# ------------------------------------------------------------------
+def plan_assignments(clients, loads: dict, capacities: dict, owners: dict, affinity: set) -> dict:
+    """
+    Returns {employee_id: [client ids]}. `loads` is updated in place.
+    Capacity is the maximum total number of clients an employee may hold.
+    """
+    order = {emp_id: i for i, emp_id in enumerate(loads)}
+    heap = [(load, order[emp_id], emp_id) for emp_id, load in loads.items()]
+    heapq.heapify(heap)
+    has_room = lambda emp_id: loads[emp_id] < capacities.get(emp_id, float("inf"))
+
+    plan = {emp_id: [] for emp_id in loads}
+    for client in clients:
+        keys = affinity_keys(client, affinity)
+        target = next((owners[k] for k in keys if owners.get(k) in loads and has_room(owners[k])), None)
+
+        from_heap = False
+        while target is None and heap:
+            load, _, emp_id = heapq.heappop(heap)
+            if load != loads[emp_id]:
+                # Stale entry (an affinity pick raised this employee's load)
+                heapq.heappush(heap, (loads[emp_id], order[emp_id], emp_id))
+            elif has_room(emp_id):
+                target, from_heap = emp_id, True
+            # Full employees drop out of the heap
+
+        if target is None:
+            break  # everyone is at capacity
+
+        plan[target].append(client['id'])
+        loads[target] += 1
+        if from_heap:
+            heapq.heappush(heap, (loads[target], order[target], target))
+        for key in keys:
+            owners.setdefault(key, target)
+    return plan
+
+
+# ------------------------------------------------------------------
+#  Writes
+# ------------------------------------------------------------------
+def apply_plan(supabase: Client, plan: dict) -> dict:
+    """Chunked bulk updates; returns {employee_id: rows actually updated}."""
+    written = {}
+    for emp_id, client_ids in plan.items():
+        written[emp_id] = 0
+        for start in range(0, len(client_ids), UPDATE_CHUNK_SIZE):
+            chunk = client_ids[start:start + UPDATE_CHUNK_SIZE]
+            result = supabase.table('clients').update({'employee_id': emp_id}) \
+                             .in_('id', chunk).is_('employee_id', 'null').execute()
+            written[emp_id] += len(result.data or [])
+    return written
+
+
+def parse_per_employee(specs: list, employees: list, flag: str) -> dict:
+    """['Sid=500'] -> {sid's id: 500}"""
+    by_name = {e['name'].lower(): e['id'] for e in employees}
+    values = {}
+    for spec in specs:
+        name, _, value = spec.partition("=")
+        emp_id = by_name.get(name.strip().lower())
+        if emp_id is None:
+            raise ValueError(f"{flag} names an employee not in --employees: {name}")
+        values[emp_id] = int(value)
+    return values
+
+
+def assign_clients(supabase: Client, names: list, exclude_domains=(), capacity_specs=(),
+                   affinity=frozenset(), dry_run: bool = False) -> dict:
+    employees = find_employees(supabase, names)
+    names_by_id = {e['id']: e['name'] for e in employees}
+    employee_ids = list(names_by_id)
+    capacities = parse_per_employee(list(capacity_specs), employees, "--capacity")
+    print(f"👥 Assigning to: {', '.join(names_by_id.values())}")
+
+    before = count_per_employee(supabase, employee_ids)
+    owners = load_affinity_owners(supabase, employee_ids, affinity)
+
+    def make_query():
+        query = supabase.table('clients').select('id, email, referred_by').is_('employee_id', 'null')
+        for domain in exclude_domains:
+            query = query.not_.ilike('email', f'%{domain}%')
+        return query
+
+    loads = dict(before)
+    plan = plan_assignments(iter_clients(make_query), loads, capacities, owners, affinity)
+    planned = {emp_id: len(ids) for emp_id, ids in plan.items()}
+    total = sum(planned.values())
+    print(f"📋 Planned {total} assignments")
+
+    if dry_run:
+        for emp_id in employee_ids:
+            print(f"  {names_by_id[emp_id]:15} {before[emp_id]:>7} → {before[emp_id] + planned[emp_id]:>7}  (+{planned[emp_id]})")
+        print("  (dry run — nothing was written)")
+        return planned
+
+    written = apply_plan(supabase, plan)
+    after = count_per_employee(supabase, employee_ids)
+
+    print("\n=== Assignment Summary ===")
+    print(f"{'Employee':15} {'Before':>7} {'Planned':>8} {'Written':>8} {'After':>7}")
+    ok = True
+    for emp_id in employee_ids:
+        expected = before[emp_id] + written[emp_id]
+        mark = "✅" if after[emp_id] == expected and written[emp_id] == planned[emp_id] else "⚠️ "
+        ok = ok and mark == "✅"
+        print(f"{names_by_id[emp_id]:15} {before[emp_id]:>7} {planned[emp_id]:>8} {written[emp_id]:>8} {after[emp_id]:>7} {mark}")
+
+    if ok:
+        print(f"\n✅ SUCCESS: {sum(written.values())} clients assigned and verified.")
+    else:
+        print("\n⚠️  WARNING: counts differ from the plan (clients assigned or removed concurrently?)")
+    return written
+
+
+def assign_server_side(supabase: Client, names: list, exclude_domains=(), weight_specs=()) -> dict:
+    """
+    One call to the assign_unassigned_clients RPC: the database picks and
+    updates the clients itself, round-robin or weighted, so no ids travel.
+    """
+    employees = find_employees(supabase, names)
+    names_by_id = {e['id']: e['name'] for e in employees}
+    weights = parse_per_employee(list(weight_specs), employees, "--weight")
+    print(f"👥 Assigning to: {', '.join(names_by_id.values())} (server-side, "
+          f"{'weighted' if weights else 'round-robin'})")
+
+    result = supabase.rpc('assign_unassigned_clients', {
+        'p_employee_ids': list(names_by_id),
+        'p_weights': [weights.get(emp_id, 1) for emp_id in names_by_id] if weights else None,
+        'p_exclude_domains': list(exclude_domains),
+    }).execute()
+    assigned = {row['employee_id']: row['assigned'] for row in result.data or []}
+
+    print("\n=== Assignment Summary ===")
+    for emp_id, name in names_by_id.items():
+        print(f"{name:15} +{assigned.get(emp_id, 0)}")
+    print(f"\n✅ SUCCESS: {sum(assigned.values())} clients assigned.")
+    return assigned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assign unassigned clients across employees by load and capacity")
+    parser.add_argument("--employees", required=True, help="comma-separated employee names")
+    parser.add_argument("--exclude-domain", action="append", default=[], metavar="DOMAIN",
+                        help="leave clients whose email contains DOMAIN unassigned (repeatable)")
+    parser.add_argument("--capacity", action="append", default=[], metavar="NAME=MAX",
+                        help="maximum total clients for an employee (repeatable; default unlimited)")
+    parser.add_argument("--affinity", default="", help="comma-separated: domain, referral")
+    parser.add_argument("--dry-run", action="store_true", help="print the plan without writing it")
+    parser.add_argument("--server-side", action="store_true",
+                        help="assign in one assign_unassigned_clients RPC call (round-robin, or weighted with --weight)")
+    parser.add_argument("--weight", action="append", default=[], metavar="NAME=N",
+                        help="with --server-side: relative share for an employee (repeatable; default 1)")
+    args = parser.parse_args(argv)
+    if args.server_side and (args.capacity or args.affinity or args.dry_run):
+        parser.error("--server-side does not support --capacity, --affinity or --dry-run")
+    if args.weight and not args.server_side:
+        parser.error("--weight requires --server-side")
+
+    load_dotenv()
+    affinity = {a.strip() for a in args.affinity.split(",") if a.strip()}
+    if affinity - {"domain", "referral"}:
+        parser.error("--affinity accepts domain and/or referral")
+
+    supabase = get_supabase_client()
+    names = [n.strip() for n in args.employees.split(",") if n.strip()]
+    if args.server_side:
+        result = assign_server_side(supabase, names, args.exclude_domain, args.weight)
+    else:
+        result = assign_clients(supabase, names, args.exclude_domain, args.capacity, affinity, args.dry_run)
+    return sum(result.values())
+
+
+if __name__ == "__main__":
+    profiling.run("assign_clients", main)
@@ -0,0 +1,307 @@
+"""
+Stateful fake of Stripe, Clerk, HubSpot and PostgREST for load testing.
+
+Same routes, prefixes and environment variables as standin.py, but writes
+are applied, so a sync job can be run repeatedly against it and see the
+effect of its own earlier writes. On top of the replay stand-in it adds:
+
+    PostgREST   insert, upsert (on_conflict + Prefer: resolution=...), PATCH,
+                DELETE, unique constraints answered with 409 / 23505,
+                Prefer: return=minimal, and the insert_invoice RPC
+    Stripe      customer create, email filter and ending_before on lists
+    Clerk       order_by on /users
+    all         per-service rate limits answered with 429 and Retry-After,
+                in the error format each API uses
+
+The dataset is seeded from fixtures.synthesize(), so the same --seed always
+gives the same starting state.
+
+Usage:
+    python benchmarks/fake_services.py --customers 100000 --print-env
+    python benchmarks/fake_services.py --rate-limit stripe=25,clerk=20 --latency-ms 30 --port 8787
+"""
+
+import argparse
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import fixtures
+from standin import StandIn, Table, UnsupportedFilter, _bad_filter, _filters, serve
+
+UNIQUE_COLUMNS = {
+    "clients": ("id", "clerk_id"),
+    "invoices": ("id", "stripe_invoice_id"),
+    "employees": ("id",),
+}
+
+RATE_LIMIT_BODIES = {
+    "stripe": {"error": {"type": "rate_limit_error", "code": "rate_limit",
+                         "message": "Too many requests hit the API too quickly."}},
+    "clerk": {"errors": [{"code": "too_many_requests", "message": "Too many requests"}]},
+    "hubspot": {"status": "error", "category": "RATE_LIMITS",
+                "message": "You have reached your secondly limit."},
+    "postgrest": {"message": "Too many requests"},
+    "edge": {"error": "Too many requests"},
+}
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with a burst of the same size."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """Returns 0 if the request may proceed, else the seconds until a token is free."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class Conflict(Exception):
+    pass
+
+
+class FakeServices(StandIn):
+    def __init__(self, data: dict, latency_ms: float = 0.0, rate_limits: dict = None):
+        super().__init__(data, latency_ms)
+        self.buckets = {service: TokenBucket(rate) for service, rate in (rate_limits or {}).items()}
+        self.write_lock = threading.RLock()
+        self._clerk_orders = {}
+        for name, table in self.tables.items():
+            table.unique = UNIQUE_COLUMNS.get(name, ("id",))
+
+    # ----- dispatch -----
+    @staticmethod
+    def service_of(path: str) -> str:
+        for prefix, service in (("/stripe/", "stripe"), ("/clerk/", "clerk"), ("/hubspot/", "hubspot"),
+                                ("/rest/v1/", "postgrest"), ("/functions/v1/", "edge")):
+            if path.startswith(prefix):
+                return service
+        return ""
+
+    def handle(self, method: str, path: str, query: dict, body, headers=None):
+        service = self.service_of(path)
+        bucket = self.buckets.get(service)
+        if bucket:
+            wait = bucket.take()
+            if wait:
+                self.count(f"{service} 429")
+                extra = {"Retry-After": max(1, round(wait))}
+                if service == "stripe":
+                    extra["Stripe-Should-Retry"] = "true"
+                return 429, RATE_LIMIT_BODIES[service], extra
+
+        if method == "POST" and path == "/stripe/v1/customers":
+            if self.latency:
+                time.sleep(self.latency)
+            return self.create_stripe_customer(body or {})
+        return super().handle(method, path, query, body, headers)
+
+    # ----- Stripe -----
+    def stripe(self, method: str, path: str, query: dict):
+        if path == "/v1/customers" and (query.get("email") or query.get("ending_before")):
+            self.count("stripe GET /v1/customers")
+            customers = self.data["stripe_customers"]
+            if query.get("email"):
+                customers = [c for c in customers if c.get("email") == query["email"]]
+            if query.get("ending_before"):
+                end = next((i for i, c in enumerate(customers) if c["id"] == query["ending_before"]), 0)
+                limit = int(query.get("limit", 10))
+                page = customers[max(0, end - limit):end]
+                return 200, {"object": "list", "url": path, "data": page, "has_more": end - limit > 0}
+            return self._stripe_list(path, customers, query)
+        return super().stripe(method, path, query)
+
+    def create_stripe_customer(self, form: dict):
+        self.count("stripe POST /v1/customers")
+        with self.write_lock:
+            customer = {
+                "id": f"cus_fake{uuid.uuid4().hex[:14]}",
+                "object": "customer",
+                "email": form.get("email"),
+                "name": form.get("name"),
+                "created": int(time.time()),
+                "metadata": {k[9:-1]: v for k, v in form.items() if k.startswith("metadata[")},
+            }
+            self.data["stripe_customers"].append(customer)
+            self.customer_pos[customer["id"]] = len(self.data["stripe_customers"]) - 1
+        return 200, customer
+
+    # ----- Clerk -----
+    def clerk(self, method: str, path: str, query: dict):
+        order_by = query.get("order_by")
+        if path != "/users" or not order_by:
+            return super().clerk(method, path, query)
+
+        self.count(f"clerk {method} {path}")
+        users = self._clerk_orders.get(order_by)
+        if users is None:
+            field = order_by.lstrip("+-")
+            users = sorted(self.data["clerk_users"], key=lambda u: u.get(field) or 0,
+                           reverse=order_by.startswith("-"))
+            self._clerk_orders[order_by] = users
+        offset, limit = int(query.get("offset", 0)), int(query.get("limit", 10))
+        return 200, users[offset:offset + limit]
+
+    # ----- PostgREST -----
+    def _check_unique(self, table: Table, row: dict, ignore_pk=None):
+        for column in table.unique:
+            value = row.get(column)
+            if value is None:
+                continue
+            existing = table.find(column, value)
+            if existing is not None and existing["id"] != ignore_pk:
+                raise Conflict(f'duplicate key value violates unique constraint "{column}" '
+                               f'(Key ({column})=({value}) already exists.)')
+
+    def _insert(self, name: str, table: Table, row: dict) -> dict:
+        row = dict(row)
+        row.setdefault("id", str(uuid.uuid4()))
+        if name in ("clients", "invoices"):
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        self._check_unique(table, row)
+        table.add(row)
+        return row
+
+    def _upsert(self, name: str, table: Table, row: dict, on_conflict: list, ignore: bool) -> dict:
+        if len(on_conflict) == 1:
+            existing = table.find(on_conflict[0], row.get(on_conflict[0]))
+        else:
+            matches = table.select([(c, [f"eq.{row.get(c)}"]) for c in on_conflict])
+            existing = matches[0] if matches else None
+        if existing is None:
+            return self._insert(name, table, row)
+        if ignore:
+            return None
+        changes = {k: v for k, v in row.items() if k != "id"}
+        self._check_unique(table, {**existing, **changes}, ignore_pk=existing["id"])
+        return table.update(existing["id"], changes)
+
+    @staticmethod
+    def _respond(status: int, rows: list, headers: dict):
+        if "return=minimal" in headers.get("prefer", ""):
+            return status, None
+        return status, rows
+
+    def postgrest(self, method: str, table: str, query: dict, body, headers):
+        if method == "GET" or (table.startswith("rpc/") and table != "rpc/insert_invoice"):
+            return super().postgrest(method, table, query, body, headers)
+
+        if table == "rpc/insert_invoice":
+            self.count("postgrest POST /rpc/insert_invoice")
+            params = body or {}
+            row = {
+                "client_id": params.get("p_client_id"),
+                "stripe_invoice_id": params.get("p_stripe_invoice_id"),
+                "amount_paid": params.get("p_amount_paid"),
+                "created_at": params.get("p_created_at"),
+                "status": params.get("p_status"),
+                "invoice_pdf": params.get("p_invoice_pdf"),
+            }
+            try:
+                with self.write_lock:
+                    self._insert("invoices", self.tables["invoices"], row)
+            except Conflict as e:
+                return 409, {"code": "23505", "message": str(e), "details": None, "hint": None}
+            return 204, None
+
+        self.count(f"postgrest {method} /{table}")
+        rows = self.tables.get(table)
+        if rows is None:
+            return 404, {"code": "42P01", "message": f'relation "public.{table}" does not exist'}
+
+        prefer = headers.get("prefer", "")
+        try:
+            with self.write_lock:
+                if method == "POST":
+                    payload = body if isinstance(body, list) else [body or {}]
+                    on_conflict = query.get("on_conflict")
+                    if on_conflict or "resolution=" in prefer:
+                        columns = (on_conflict or "id").split(",")
+                        ignore = "resolution=ignore-duplicates" in prefer
+                        written = [self._upsert(table, rows, r, columns, ignore) for r in payload]
+                        return self._respond(201, [r for r in written if r is not None], headers)
+                    return self._respond(201, [self._insert(table, rows, r) for r in payload], headers)
+
+                if method == "PATCH":
+                    matched = rows.select(_filters(query))
+                    for row in matched:
+                        self._check_unique(rows, {**row, **(body or {})}, ignore_pk=row["id"])
+                    return self._respond(200, [rows.update(r["id"], body or {}) for r in matched], headers)
+
+                if method == "DELETE":
+                    matched = rows.select(_filters(query))
+                    return self._respond(200, [rows.remove(r["id"]) for r in matched], headers)
+        except Conflict as e:
+            return 409, {"code": "23505", "message": str(e), "details": None, "hint": None}
+        except UnsupportedFilter as e:
+            return 400, _bad_filter(e)
+
+        return 405, {"message": "method not allowed"}
+
+
+def parse_rate_limits(spec: str) -> dict:
+    """'stripe=25,clerk=20' -> {'stripe': 25.0, 'clerk': 20.0}"""
+    limits = {}
+    for part in filter(None, (spec or "").split(",")):
+        service, _, rate = part.partition("=")
+        limits[service.strip()] = float(rate)
+    return limits
+
+
+def env_for(base_url: str) -> dict:
+    return {
+        "STRIPE_API_BASE": f"{base_url}/stripe",
+        "CLERK_API_BASE": f"{base_url}/clerk/v1",
+        "HUBSPOT_API_BASE": f"{base_url}/hubspot",
+        "SUPABASE_URL": base_url,
+        "VITE_SUPABASE_URL": base_url,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stateful fake of Stripe/Clerk/HubSpot/PostgREST")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fixtures", help="start from a saved dataset instead of synthesizing one")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", default="",
+                        help="per-service requests/second, e.g. stripe=25,clerk=20,postgrest=500")
+    parser.add_argument("--print-env", action="store_true", help="print export lines for the scripts")
+    args = parser.parse_args()
+
+    data = fixtures.load(args.fixtures) if args.fixtures else fixtures.synthesize(args.customers, args.seed)
+    fake = FakeServices(data, args.latency_ms, parse_rate_limits(args.rate_limit))
+    server = serve(data, args.host, args.port, standin=fake)
+    host, port = server.server_address[:2]
+    base_url = f"http://{host}:{port}"
+
+    # First line is read by run_benchmarks.py
+    print(base_url, flush=True)
+    if args.print_env:
+        for key, value in env_for(base_url).items():
+            print(f"export {key}={value}")
+        print("export SUPABASE_SERVICE_ROLE_KEY=eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.ZmFrZQ")
+        sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
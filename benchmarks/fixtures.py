@@ -0,0 +1,403 @@
+"""
+Fixture datasets for the benchmark stand-in.
+
+A dataset is a plain dict of lists keyed by service, shaped like the API
+payloads the sync scripts read:
+
+    products, stripe_customers, subscriptions, stripe_invoices  (Stripe)
+    clerk_users                                                 (Clerk)
+    hubspot_contacts                                            (HubSpot CRM)
+    clients, invoices, employees                                (Supabase)
+    agents, calls                                               (Mongo)
+    transcripts                                                 (get-all-transcripts)
+
+The generator is seeded and streams one record at a time, so the same
+(customers, seed) always gives byte-identical output, from 1k up to 1M
+customers. The data is deliberately untidy in the ways production is:
+
+  - emails differ in case between Clerk, Stripe, HubSpot and Supabase;
+  - ~2% of Stripe customers have a duplicate customer with the same email,
+    and a few clients were entered twice by hand;
+  - ~20% of people have no phone, and the rest use mixed formats
+    (+61 4xx, 04xx, +1 (555) ...);
+  - ~15% of Stripe customers never subscribed, ~20% have an older canceled
+    subscription as well as the current one;
+  - company domains are shared by several people, ~45% use free-mail
+    domains and ~1% are internal heffron.ai accounts;
+  - calls per agent are heavy-tailed, with sentiment and tags.
+
+synthesize() builds the dataset in memory for the stand-ins. write_ndjson()
+streams it to one NDJSON file per collection (for the 1M sizes that would
+not fit in memory as dicts), and load() reads either format back.
+
+Usage:
+    python benchmarks/fixtures.py --customers 100000 --out fixtures_100k
+    python benchmarks/fixtures.py --customers 5000 --format json --out fixtures_5k.json
+    python benchmarks/standin.py --fixtures fixtures_100k
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+COLLECTIONS = (
+    "products", "employees", "stripe_customers", "subscriptions", "stripe_invoices",
+    "clerk_users", "hubspot_contacts", "clients", "invoices", "agents", "calls", "transcripts",
+)
+STATUSES = (
+    ("active", 0.62), ("trialing", 0.08), ("past_due", 0.06),
+    ("canceled", 0.18), ("unpaid", 0.02), ("incomplete", 0.04),
+)
+PRODUCTS = (
+    ("prod_Starter0001", "Starter", "price_Starter0001", "Starter Monthly", 4900),
+    ("prod_Growth00001", "Growth", "price_Growth00001", "Growth Monthly", 9900),
+    ("prod_Scale000001", "Scale", "price_Scale000001", "Scale Annual", 99000),
+)
+EMPLOYEES = ("Andre", "Amith", "Adam", "Sid")
+FIRST_NAMES = ("James", "Olivia", "Jack", "Charlotte", "Noah", "Amelia", "William", "Isla", "Oliver",
+               "Mia", "Thomas", "Ava", "Lucas", "Grace", "Henry", "Chloe", "Liam", "Zoe", "Ethan", "Ruby")
+LAST_NAMES = ("Smith", "Jones", "Williams", "Brown", "Wilson", "Taylor", "Nguyen", "Johnson", "Martin",
+              "White", "Anderson", "Walker", "Thompson", "Lee", "Harris", "Ryan", "Robinson", "Kelly")
+FREE_MAIL = (("gmail.com", 0.6), ("outlook.com", 0.12), ("hotmail.com", 0.1),
+             ("yahoo.com", 0.08), ("icloud.com", 0.06), ("bigpond.com", 0.04))
+INTERNAL_DOMAIN = "heffron.ai"
+SENTIMENTS = (("positive", 0.5), ("neutral", 0.35), ("negative", 0.15))
+TAGS = ("booking", "follow-up", "pricing", "complaint", "voicemail", "callback", "new-lead", "support")
+NOW = datetime(2025, 8, 1, tzinfo=timezone.utc)
+
+
+def _weighted(rng: random.Random, choices):
+    roll, acc = rng.random(), 0.0
+    for value, weight in choices:
+        acc += weight
+        if roll <= acc:
+            return value
+    return choices[-1][0]
+
+
+def _ts(dt: datetime) -> int:
+    return int(dt.timestamp())
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128)))
+
+
+def _object_id(rng: random.Random) -> str:
+    return f"{rng.getrandbits(96):024x}"
+
+
+def _recase(rng: random.Random, email: str, probability: float) -> str:
+    """Returns the email with a capitalised local part or domain some of the time."""
+    if rng.random() >= probability:
+        return email
+    local, domain = email.split("@")
+    return f"{local.title()}@{domain}" if rng.random() < 0.7 else f"{local}@{domain.upper()}"
+
+
+def _phone(rng: random.Random):
+    roll = rng.random()
+    if roll < 0.2:
+        return None
+    digits = f"{rng.randint(0, 99999999):08d}"
+    if roll < 0.6:
+        return f"+61 4{digits[:2]} {digits[2:5]} {digits[5:]}"
+    if roll < 0.76:
+        return f"04{digits[:2]} {digits[2:5]} {digits[5:]}"
+    return f"+1 (555) {digits[1:4]}-{digits[4:]}"
+
+
+def _invoice(n: int, k: int, cus_id: str, amount: int, paid_at: datetime) -> dict:
+    inv_id = f"in_{n:010d}{k:04d}"
+    return {
+        "id": inv_id,
+        "object": "invoice",
+        "customer": cus_id,
+        "amount_paid": amount,
+        "created": _ts(paid_at),
+        "status": "paid",
+        "billing_reason": "subscription_create" if k == 0 else "subscription_cycle",
+        "invoice_pdf": f"https://pay.stripe.com/invoice/{inv_id}/pdf",
+        "paid_at": _ts(paid_at),
+        "status_transitions": {"paid_at": _ts(paid_at)},
+    }
+
+
+def _subscription(sub_id: str, cus_id: str, status: str, created: datetime, product, invoices: list) -> dict:
+    pid, _, price_id, nickname, _ = product
+    return {
+        "id": sub_id,
+        "object": "subscription",
+        "customer": cus_id,
+        "status": status,
+        "created": _ts(created),
+        "current_period_start": invoices[-1]["created"] if invoices else _ts(created),
+        "latest_invoice": invoices[-1]["id"] if invoices else None,
+        "items": {"object": "list", "data": [{
+            "object": "subscription_item",
+            "price": {"id": price_id, "object": "price", "nickname": nickname, "product": pid},
+        }]},
+    }
+
+
+def iter_records(customers: int, seed: int = 42):
+    """Yields (collection, record) for a linked dataset of `customers` people."""
+    rng = random.Random(seed)
+    uid = uuid.UUID(int=rng.getrandbits(128))
+    company_domains = max(20, customers // 8)
+
+    for pid, name, _, _, _ in PRODUCTS:
+        yield "products", {"id": pid, "object": "product", "name": name}
+    employees = []
+    for name in EMPLOYEES:
+        employee = {"id": _uuid(rng), "name": name, "email": f"{name.lower()}@{INTERNAL_DOMAIN}"}
+        employees.append(employee)
+        yield "employees", employee
+
+    hubspot_id = 100_000
+    for n in range(customers):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        roll = rng.random()
+        if roll < 0.45:
+            domain = _weighted(rng, FREE_MAIL)
+        elif roll < 0.99:
+            domain = f"company{rng.randrange(company_domains):06d}.com.au"
+        else:
+            domain = INTERNAL_DOMAIN
+        email = f"{first}.{last}{n}@{domain}".lower()
+        created = NOW - timedelta(days=rng.randint(1, 900), seconds=rng.randint(0, 86399))
+        phone = _phone(rng)
+        clerk_id = f"user_{n:023d}"
+        in_clerk = rng.random() < 0.95
+
+        # ----- Stripe -----
+        cus_id = None
+        if rng.random() < 0.85:
+            cus_id = f"cus_{n:014d}"
+            yield "stripe_customers", {
+                "id": cus_id, "object": "customer", "email": _recase(rng, email, 0.15),
+                "name": f"{first} {last}", "phone": phone, "created": _ts(created),
+            }
+            if rng.random() < 0.02:
+                # Created again by hand or by a second checkout; never subscribed
+                yield "stripe_customers", {
+                    "id": f"cus_{n:012d}dp", "object": "customer", "email": _recase(rng, email, 1.0),
+                    "name": f"{first} {last}", "phone": None,
+                    "created": _ts(created + timedelta(days=rng.randint(1, 60))),
+                }
+
+        invoices = []
+        if cus_id and rng.random() < 0.85:
+            product = rng.choice(PRODUCTS)
+            status = _weighted(rng, STATUSES)
+            age_months = max(1, (NOW - created).days // 30)
+            if status == "incomplete":
+                paid_months = 0
+            elif status == "canceled":
+                paid_months = rng.randint(1, min(age_months, 12))
+            else:
+                paid_months = min(age_months, 12)
+            invoices = [_invoice(n, k, cus_id, product[4], created + timedelta(days=30 * k + 1))
+                        for k in range(paid_months)]
+            if rng.random() < 0.2:
+                older = rng.choice(PRODUCTS)
+                yield "subscriptions", _subscription(f"sub_{n:012d}ol", cus_id, "canceled",
+                                                     created - timedelta(days=rng.randint(30, 400)), older, [])
+            yield "subscriptions", _subscription(f"sub_{n:014d}", cus_id, status, created, product, invoices)
+            for inv in invoices:
+                yield "stripe_invoices", inv
+
+        # ----- Clerk -----
+        if in_clerk:
+            yield "clerk_users", {
+                "id": clerk_id,
+                "first_name": first,
+                "last_name": last,
+                "primary_email_address_id": f"idn_e{n:010d}",
+                "email_addresses": [{"id": f"idn_e{n:010d}", "email_address": _recase(rng, email, 0.1)}],
+                "primary_phone_number_id": f"idn_p{n:010d}" if phone else None,
+                "phone_numbers": [{"id": f"idn_p{n:010d}", "phone_number": phone}] if phone else [],
+                "created_at": _ts(created) * 1000,
+                "updated_at": (_ts(created) + rng.randint(0, max(1, _ts(NOW) - _ts(created)))) * 1000,
+            }
+
+        # ----- HubSpot: most people, plus leads that never signed up -----
+        if rng.random() < 0.8:
+            hubspot_id += 1
+            yield "hubspot_contacts", {
+                "id": str(hubspot_id),
+                "properties": {
+                    "email": _recase(rng, email, 0.2),
+                    "phone": phone if rng.random() < 0.7 else None,
+                    "mobilephone": phone if rng.random() < 0.3 else None,
+                    "firstname": first, "lastname": last,
+                },
+                "createdAt": created.isoformat(),
+                "archived": False,
+            }
+        if rng.random() < 0.1:
+            hubspot_id += 1
+            yield "hubspot_contacts", {
+                "id": str(hubspot_id),
+                "properties": {"email": f"lead{n}@{domain}", "phone": _phone(rng), "mobilephone": None,
+                               "firstname": rng.choice(FIRST_NAMES), "lastname": rng.choice(LAST_NAMES)},
+                "createdAt": created.isoformat(),
+                "archived": False,
+            }
+
+        # ----- Supabase: two thirds of Clerk users already have a client row -----
+        using_platform = rng.random() < 0.35
+        if in_clerk and n % 3:
+            client_id = str(uuid.UUID(int=(uid.int + n) % 2 ** 128))
+            client = {
+                "id": client_id,
+                "clerk_id": clerk_id,
+                "name": f"{first} {last}",
+                "email": _recase(rng, email, 0.05),
+                "phone": phone,
+                "stripe_customer_id": cus_id if cus_id and rng.random() > 0.1 else None,
+                "subscription_status": None,
+                "subscription_product": None,
+                "subscription_plan": None,
+                "last_payment_date": None,
+                "is_using_platform": using_platform,
+                "employee_id": rng.choice(employees)["id"] if rng.random() < 0.5 else None,
+                "created_at": created.isoformat(),
+            }
+            yield "clients", client
+            if rng.random() < 0.005:
+                # Entered again by hand: no Clerk link, different case
+                yield "clients", {**client, "id": _uuid(rng), "clerk_id": None,
+                                  "email": _recase(rng, email, 1.0), "stripe_customer_id": None,
+                                  "employee_id": None}
+            # Half of the paid invoices were synced by an earlier run.
+            for inv in invoices[: len(invoices) // 2]:
+                yield "invoices", {
+                    "id": _uuid(rng),
+                    "client_id": client_id,
+                    "stripe_invoice_id": inv["id"],
+                    "amount_paid": inv["amount_paid"] / 100.0,
+                    "created_at": datetime.fromtimestamp(inv["created"], tz=timezone.utc).isoformat(),
+                    "status": "paid",
+                    "invoice_pdf": inv["invoice_pdf"],
+                }
+
+        # ----- Mongo: platform users own agents that make calls -----
+        if using_platform:
+            for _ in range(int(rng.paretovariate(3)) + (rng.random() < 0.3)):
+                agent_id = _object_id(rng)
+                yield "agents", {
+                    "_id": agent_id,
+                    "name": f"{first}'s agent",
+                    "created_by": email,
+                    "email": _recase(rng, email, 0.1),
+                    "created_at": created.isoformat(),
+                }
+                # Heavy tail: most agents make a handful of calls, a few make hundreds
+                for _ in range(min(500, int(rng.paretovariate(1.2) * 3) - 2)):
+                    start = NOW - timedelta(days=rng.randint(0, 59), seconds=rng.randint(0, 86399))
+                    duration = int(rng.lognormvariate(4.5, 0.9))
+                    call = {
+                        "_id": _object_id(rng),
+                        "agent_id": agent_id,
+                        "start_time": start.isoformat(),
+                        "end_time": (start + timedelta(seconds=duration)).isoformat(),
+                        "duration": duration,
+                        "sentiment": _weighted(rng, SENTIMENTS),
+                        "tags": rng.sample(TAGS, rng.randint(0, 3)),
+                        "call_summary": "Synthetic call",
+                    }
+                    yield "calls", call
+                    if start >= NOW - timedelta(days=30):
+                        yield "transcripts", {
+                            "_id": call["_id"],
+                            "agent_id": agent_id,
+                            "agent_email": email,
+                            "start_time": call["start_time"],
+                            "sentiment": call["sentiment"],
+                            "tags": call["tags"],
+                            "call_summary": call["call_summary"],
+                        }
+
+
+def synthesize(customers: int, seed: int = 42) -> dict:
+    """Builds a linked dataset for `customers` people in memory."""
+    data = {name: [] for name in COLLECTIONS}
+    for name, record in iter_records(customers, seed):
+        data[name].append(record)
+    return data
+
+
+def write_ndjson(customers: int, seed: int, directory: str, compress: bool = False) -> dict:
+    """Streams the dataset to <directory>/<collection>.ndjson[.gz]; returns record counts."""
+    os.makedirs(directory, exist_ok=True)
+    suffix = ".ndjson.gz" if compress else ".ndjson"
+    opener = gzip.open if compress else open
+    files = {name: opener(os.path.join(directory, name + suffix), "wt") for name in COLLECTIONS}
+    counts = dict.fromkeys(COLLECTIONS, 0)
+    try:
+        for name, record in iter_records(customers, seed):
+            files[name].write(json.dumps(record, separators=(",", ":")) + "\n")
+            counts[name] += 1
+    finally:
+        for f in files.values():
+            f.close()
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump({"customers": customers, "seed": seed, "counts": counts}, f, indent=2)
+    return counts
+
+
+def save(data: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def load(path: str) -> dict:
+    """Reads a dataset saved with save() (a .json file) or write_ndjson() (a directory)."""
+    if not os.path.isdir(path):
+        with open(path) as f:
+            data = json.load(f)
+        for name in COLLECTIONS:
+            data.setdefault(name, [])
+        return data
+
+    data = {}
+    for name in COLLECTIONS:
+        for suffix, opener in ((".ndjson", open), (".ndjson.gz", gzip.open)):
+            file_path = os.path.join(path, name + suffix)
+            if os.path.exists(file_path):
+                with opener(file_path, "rt") as f:
+                    data[name] = [json.loads(line) for line in f if line.strip()]
+                break
+        else:
+            data[name] = []
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic dataset")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", required=True, help="directory (ndjson) or file (json)")
+    parser.add_argument("--format", choices=("ndjson", "json"), default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="gzip the ndjson files")
+    args = parser.parse_args()
+
+    if args.format == "json":
+        data = synthesize(args.customers, args.seed)
+        save(data, args.out)
+        counts = {name: len(rows) for name, rows in data.items()}
+    else:
+        counts = write_ndjson(args.customers, args.seed, args.out, args.gzip)
+
+    print(f"✅ {args.customers} customers (seed {args.seed}) written to {args.out}")
+    for name, count in counts.items():
+        print(f"  {name:18} {count:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,551 @@
+"""
+Local HTTP stand-in for Stripe, Clerk, HubSpot, PostgREST and the
+get-all-transcripts edge function.
+
+Serves a fixture dataset (see fixtures.py) on one port, with each service
+mounted under its own prefix:
+
+    STRIPE_API_BASE   = http://127.0.0.1:<port>/stripe
+    CLERK_API_BASE    = http://127.0.0.1:<port>/clerk/v1
+    HUBSPOT_API_BASE  = http://127.0.0.1:<port>/hubspot
+    SUPABASE_URL      = http://127.0.0.1:<port>            (/rest/v1, /functions/v1)
+
+Responses are replayed from the dataset; writes are acknowledged but not
+applied, so repeated benchmark runs see identical data (fake_services.py is
+the stateful variant). Every request can be delayed by a fixed latency. Call
+counts per route are served from GET /__stats and cleared with POST /__reset.
+
+Usage:
+    python benchmarks/standin.py --customers 10000 --latency-ms 20
+    python benchmarks/standin.py --fixtures recorded.json --port 8787
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import fixtures
+
+
+def _flat_query(query: str) -> dict:
+    """parse_qs, with single values unwrapped and Stripe's expand[0]=... collected."""
+    params = {}
+    for key, values in parse_qs(query, keep_blank_values=True).items():
+        if key.startswith("expand["):
+            params.setdefault("expand", []).extend(values)
+        else:
+            params[key] = values[0] if len(values) == 1 else values
+    return params
+
+
+def _coerce(value: str):
+    if value == "null":
+        return None
+    if value in ("true", "false"):
+        return value == "true"
+    return value
+
+
+def _text(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+FILTER_OPERATORS = ("eq", "neq", "gt", "gte", "lt", "lte", "is", "in", "like", "ilike")
+
+
+class UnsupportedFilter(ValueError):
+    """A filter the stand-in cannot evaluate; answered with 400 like PostgREST's parse errors."""
+
+
+def _operator(column: str, expr: str):
+    """Splits a filter expression into (negate, op, raw)."""
+    negate = expr.startswith("not.")
+    if negate:
+        expr = expr[4:]
+    op, _, raw = expr.partition(".")
+    if op not in FILTER_OPERATORS:
+        raise UnsupportedFilter(f'unsupported filter "{column}={expr}"')
+    return negate, op, raw
+
+
+def _compare(value, raw: str) -> int:
+    """Orders a column value against a filter literal: numerically for numbers, else as text."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            other = float(raw)
+        except ValueError:
+            raise UnsupportedFilter(f'invalid number "{raw}"')
+        return (value > other) - (value < other)
+    text = _text(value)
+    return (text > raw) - (text < raw)
+
+
+def _like_pattern(raw: str) -> str:
+    """Translates a LIKE pattern (% or *, _, and backslash escapes) to a regex."""
+    parts = []
+    chars = iter(raw)
+    for char in chars:
+        if char == "\\":
+            parts.append(re.escape(next(chars, "\\")))
+        elif char in "%*":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return "".join(parts)
+
+
+def _matches(row: dict, column: str, expr: str) -> bool:
+    """Evaluates one PostgREST filter (eq, neq, gt, gte, lt, lte, is, in, like, ilike, with optional not.)."""
+    negate, op, raw = _operator(column, expr)
+    value = row.get(column)
+
+    if op == "eq":
+        result = value is not None and _text(value) == raw
+    elif op == "neq":
+        result = value is not None and _text(value) != raw
+    elif op == "is":
+        result = value is _coerce(raw) if raw in ("null", "true", "false") else False
+    elif op == "in":
+        options = [v.strip('"') for v in raw.strip("()").split(",") if v]
+        result = value is not None and _text(value) in options
+    elif op in ("like", "ilike"):
+        pattern = _like_pattern(raw)
+        flags = re.IGNORECASE if op == "ilike" else 0
+        result = value is not None and re.fullmatch(pattern, str(value), flags | re.DOTALL) is not None
+    else:
+        # NULL never compares, in either direction
+        if value is None:
+            return False
+        order = _compare(value, raw)
+        result = {"gt": order > 0, "gte": order >= 0, "lt": order < 0, "lte": order <= 0}[op]
+    return not result if negate else result
+
+
+def _bad_filter(error: UnsupportedFilter) -> dict:
+    return {"code": "PGRST100", "message": str(error), "details": None, "hint": None}
+
+
+def _project(rows, select: str):
+    if not select or select.strip() == "*":
+        return rows
+    columns = [c.strip() for c in select.split(",") if c.strip()]
+    return [{c: r.get(c) for c in columns} for r in rows]
+
+
+def _sort(rows, order: str):
+    """Applies a PostgREST order= clause such as created_at.desc.nullslast,id."""
+    for clause in reversed([c for c in (order or "").split(",") if c]):
+        column, *mods = clause.split(".")
+        desc = "desc" in mods
+        nulls_first = "nullsfirst" in mods or ("nullslast" not in mods and desc)
+        present = [r for r in rows if r.get(column) is not None]
+        missing = [r for r in rows if r.get(column) is None]
+        present.sort(key=lambda r: r[column], reverse=desc)
+        rows = missing + present if nulls_first else present + missing
+    return rows
+
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+SUPABASE_TABLES = ("clients", "invoices", "employees")
+INDEXED_COLUMNS = ("id", "email", "clerk_id", "stripe_customer_id", "stripe_invoice_id",
+                   "client_id", "employee_id")
+
+
+def _filters(query: dict):
+    """Splits PostgREST query params into [(column, [expr, ...]), ...]."""
+    return [
+        (column, expr if isinstance(expr, list) else [expr])
+        for column, expr in query.items()
+        if column not in RESERVED_PARAMS
+    ]
+
+
+class Table:
+    """Rows keyed by id, with hash indexes so eq/in lookups do not scan the table."""
+
+    def __init__(self, rows, unique=("id",)):
+        self.rows = {}
+        self.unique = unique
+        self.indexes = {col: defaultdict(set) for col in INDEXED_COLUMNS}
+        self._seq = {}
+        for row in rows:
+            self.add(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row: dict):
+        pk = row["id"]
+        self.rows[pk] = row
+        self._seq.setdefault(pk, len(self._seq))
+        for column, index in self.indexes.items():
+            if row.get(column) is not None:
+                index[_text(row[column])].add(pk)
+
+    def remove(self, pk):
+        row = self.rows.pop(pk)
+        self._seq.pop(pk, None)
+        for column, index in self.indexes.items():
+            if row.get(column) is not None:
+                index[_text(row[column])].discard(pk)
+        return row
+
+    def update(self, pk, changes: dict) -> dict:
+        """Applies `changes` to one row in place of the old version, keeping its position."""
+        seq = self._seq[pk]
+        row = {**self.remove(pk), **changes}
+        self._seq[pk] = seq
+        self.add(row)
+        return row
+
+    def find(self, column: str, value):
+        """Returns the first row whose `column` equals `value`, via the index when there is one."""
+        if column in self.indexes:
+            pks = self.indexes[column].get(_text(value))
+            return self.rows[min(pks, key=self._seq.get)] if pks else None
+        return next((r for r in self.rows.values() if r.get(column) == value), None)
+
+    def select(self, filters) -> list:
+        """Rows matching every filter; raises UnsupportedFilter before scanning anything."""
+        for column, exprs in filters:
+            for expr in exprs:
+                _operator(column, expr)
+        candidates = None
+        for column, exprs in filters:
+            if column not in self.indexes:
+                continue
+            for expr in exprs:
+                if expr.startswith("eq."):
+                    pks = self.indexes[column].get(expr[3:], set())
+                elif expr.startswith("in."):
+                    pks = set()
+                    for v in expr[3:].strip("()").split(","):
+                        pks |= self.indexes[column].get(v.strip('"'), set())
+                else:
+                    continue
+                candidates = pks if candidates is None else candidates & pks
+
+        if candidates is None:
+            rows = self.rows.values()
+        else:
+            rows = [self.rows[pk] for pk in sorted(candidates, key=self._seq.get)]
+        return [r for r in rows if all(_matches(r, c, e) for c, exprs in filters for e in exprs)]
+
+
+class StandIn:
+    """Routes requests against a dataset and counts them per route."""
+
+    def __init__(self, data: dict, latency_ms: float = 0.0):
+        self.data = data
+        self.latency = latency_ms / 1000.0
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self._index()
+
+    def sizes(self) -> dict:
+        sizes = {k: len(v) for k, v in self.data.items()}
+        sizes.update({name: len(table) for name, table in self.tables.items()})
+        return sizes
+
+    def _index(self):
+        d = self.data
+        self.tables = {name: Table(d.get(name, [])) for name in SUPABASE_TABLES}
+        self.products = {p["id"]: p for p in d["products"]}
+        self.subs_by_customer = defaultdict(list)
+        for s in d["subscriptions"]:
+            self.subs_by_customer[s["customer"]].append(s)
+        self.invoices_by_customer = defaultdict(list)
+        self.invoices_by_id = {}
+        for inv in d["stripe_invoices"]:
+            self.invoices_by_customer[inv["customer"]].append(inv)
+            self.invoices_by_id[inv["id"]] = inv
+        for invs in self.invoices_by_customer.values():
+            invs.sort(key=lambda i: i["created"], reverse=True)
+        self.customer_pos = {c["id"]: i for i, c in enumerate(d["stripe_customers"])}
+
+    def count(self, route: str):
+        with self.lock:
+            self.calls[route] += 1
+
+    # ----- dispatch -----
+    def handle(self, method: str, path: str, query: dict, body, headers=None):
+        """Returns (status, payload) or (status, payload, extra_headers)."""
+        if self.latency:
+            time.sleep(self.latency)
+        if path.startswith("/stripe/"):
+            return self.stripe(method, path[len("/stripe"):], query)
+        if path.startswith("/clerk/v1/"):
+            return self.clerk(method, path[len("/clerk/v1"):], query)
+        if path.startswith("/hubspot/"):
+            return self.hubspot(method, path[len("/hubspot"):], body, query)
+        if path.startswith("/rest/v1/"):
+            return self.postgrest(method, path[len("/rest/v1/"):], query, body, headers or {})
+        if path.startswith("/functions/v1/"):
+            return self.edge(path[len("/functions/v1/"):], body)
+        return 404, {"error": f"no route for {path}"}
+
+    # ----- Stripe -----
+    def _stripe_list(self, url: str, items, query: dict):
+        limit = int(query.get("limit", 10))
+        start = 0
+        after = query.get("starting_after")
+        if after:
+            start = next((i + 1 for i, it in enumerate(items) if it["id"] == after), len(items))
+        page = items[start:start + limit]
+        return 200, {"object": "list", "url": url, "data": page, "has_more": start + limit < len(items)}
+
+    def stripe(self, method: str, path: str, query: dict):
+        if path == "/v1/customers":
+            self.count("stripe GET /v1/customers")
+            after = query.get("starting_after")
+            limit = int(query.get("limit", 10))
+            start = self.customer_pos.get(after, -1) + 1 if after else 0
+            customers = self.data["stripe_customers"]
+            page = customers[start:start + limit]
+            return 200, {"object": "list", "url": path, "data": page,
+                         "has_more": start + limit < len(customers)}
+
+        if path == "/v1/subscriptions":
+            self.count("stripe GET /v1/subscriptions")
+            customer = query.get("customer")
+            subs = self.subs_by_customer.get(customer, []) if customer else self.data["subscriptions"]
+            status, result = self._stripe_list(path, subs, query)
+            if "data.latest_invoice" in query.get("expand", []):
+                result["data"] = [
+                    {**s, "latest_invoice": self.invoices_by_id.get(s["latest_invoice"])}
+                    for s in result["data"]
+                ]
+            return status, result
+
+        if path == "/v1/invoices":
+            self.count("stripe GET /v1/invoices")
+            invs = self.invoices_by_customer.get(query.get("customer"), [])
+            if query.get("status"):
+                invs = [i for i in invs if i["status"] == query["status"]]
+            return self._stripe_list(path, invs, query)
+
+        m = re.fullmatch(r"/v1/(products|invoices)/([^/]+)", path)
+        if m:
+            kind, obj_id = m.groups()
+            self.count(f"stripe GET /v1/{kind}/{{id}}")
+            obj = (self.products if kind == "products" else self.invoices_by_id).get(obj_id)
+            if obj is None:
+                return 404, {"error": {"type": "invalid_request_error", "message": f"No such {kind[:-1]}: '{obj_id}'"}}
+            return 200, obj
+
+        self.count(f"stripe {method} {path}")
+        return 404, {"error": {"type": "invalid_request_error", "message": f"Unrecognized request URL ({path})"}}
+
+    # ----- Clerk -----
+    def clerk(self, method: str, path: str, query: dict):
+        self.count(f"clerk {method} {path}")
+        if path != "/users":
+            return 404, {"errors": [{"message": "not found"}]}
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", 10))
+        users = self.data["clerk_users"]
+        order_by = query.get("order_by")
+        if order_by:
+            field = order_by.lstrip("+-")
+            users = sorted(users, key=lambda u: u.get(field) or 0, reverse=order_by.startswith("-"))
+        return 200, users[offset:offset + limit]
+
+    # ----- HubSpot -----
+    def hubspot(self, method: str, path: str, body, query: dict = None):
+        self.count(f"hubspot {method} {path}")
+        if method == "GET" and path == "/crm/v3/objects/contacts":
+            return self._hubspot_list(query or {})
+        m = re.fullmatch(r"/crm/v3/objects/contacts/batch/(create|upsert)", path)
+        if not m or method != "POST":
+            return 404, {"status": "error", "message": "not found"}
+        inputs = (body or {}).get("inputs", [])
+        results = [{"id": str(10_000_000 + i), "properties": inp.get("properties", {})}
+                   for i, inp in enumerate(inputs)]
+        return (201 if m.group(1) == "create" else 200), {"status": "COMPLETE", "results": results}
+
+    def _hubspot_list(self, query: dict):
+        contacts = self.data.get("hubspot_contacts", [])
+        start = int(query.get("after", 0))
+        limit = min(int(query.get("limit", 10)), 100)
+        wanted = set((query.get("properties") or "").split(",")) - {""}
+        page = [
+            {**c, "properties": {k: v for k, v in c["properties"].items() if not wanted or k in wanted}}
+            for c in contacts[start:start + limit]
+        ]
+        result = {"results": page}
+        if start + limit < len(contacts):
+            result["paging"] = {"next": {"after": str(start + limit)}}
+        return 200, result
+
+    # ----- PostgREST -----
+    def _read(self, table: Table, query: dict, headers):
+        matched = _sort(table.select(_filters(query)), query.get("order"))
+        total = len(matched)
+        offset = int(query.get("offset", 0))
+        if "limit" in query:
+            matched = matched[offset:offset + int(query["limit"])]
+        elif offset:
+            matched = matched[offset:]
+
+        extra = {}
+        if "count=exact" in headers.get("prefer", ""):
+            last = offset + len(matched) - 1
+            extra["Content-Range"] = f"{offset}-{last}/{total}" if matched else f"*/{total}"
+        return 200, _project(matched, query.get("select")), extra
+
+    def postgrest(self, method: str, table: str, query: dict, body, headers):
+        if table.startswith("rpc/"):
+            self.count(f"postgrest POST /rpc/{table[4:]}")
+            return 200, None
+
+        self.count(f"postgrest {method} /{table}")
+        rows = self.tables.get(table)
+        if rows is None:
+            return 404, {"code": "42P01", "message": f'relation "public.{table}" does not exist'}
+
+        try:
+            if method == "GET":
+                return self._read(rows, query, headers)
+            if method == "PATCH":
+                return 200, [{**r, **(body or {})} for r in rows.select(_filters(query))]
+            if method == "POST":
+                payload = body if isinstance(body, list) else [body]
+                return 201, payload
+            if method == "DELETE":
+                return 200, rows.select(_filters(query))
+        except UnsupportedFilter as e:
+            return 400, _bad_filter(e)
+        return 405, {"message": "method not allowed"}
+
+    # ----- Edge functions -----
+    def edge(self, name: str, body):
+        self.count(f"edge POST /{name}")
+        if name != "get-all-transcripts":
+            return 404, {"error": f"function {name} not found"}
+        body = body or {}
+        page, limit = int(body.get("page", 1)), int(body.get("limit", 10))
+        transcripts = self.data["transcripts"]
+        if body.get("since"):
+            transcripts = [t for t in transcripts if t["start_time"] >= body["since"]]
+        if body.get("keyset"):
+            return 200, self._transcripts_keyset(transcripts, body, limit)
+        items = transcripts[(page - 1) * limit: page * limit]
+        total = len(transcripts)
+        return 200, {
+            "transcripts": items,
+            "totalCount": total,
+            "currentPage": page,
+            "totalPages": -(-total // limit),
+            "hasNextPage": page * limit < total,
+            "hasPreviousPage": page > 1,
+        }
+
+
+    def _transcripts_keyset(self, transcripts: list, body: dict, limit: int) -> dict:
+        ordered = sorted(transcripts, key=lambda t: (t["start_time"], t["_id"]), reverse=True)
+        if body.get("before_start_time"):
+            before = (body["before_start_time"], body.get("before_id") or "")
+            ordered = [t for t in ordered if (t["start_time"], t["_id"]) < before]
+        page = ordered[:limit]
+        result = {
+            "transcripts": page,
+            "hasNextPage": len(ordered) > limit,
+            "nextCursor": ({"before_start_time": page[-1]["start_time"], "before_id": page[-1]["_id"]}
+                           if len(ordered) > limit else None),
+        }
+        if body.get("include_count"):
+            result["totalCount"] = len(transcripts)
+        return result
+
+
+def make_handler(standin: StandIn):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; with Nagle on, the body
+        # of every keep-alive response waits for the client's delayed ACK (~40 ms)
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload, headers=None):
+            raw = b"" if payload is None else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, str(value))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def _dispatch(self):
+            parts = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else None
+            except ValueError:
+                body = _flat_query(raw.decode())
+
+            if parts.path == "/__stats":
+                with standin.lock:
+                    return self._send(200, {
+                        "calls": dict(standin.calls),
+                        "total": sum(standin.calls.values()),
+                        "sizes": standin.sizes(),
+                    })
+            if parts.path == "/__reset":
+                with standin.lock:
+                    standin.calls.clear()
+                return self._send(200, {"ok": True})
+
+            result = standin.handle(self.command, parts.path, _flat_query(parts.query), body,
+                                    {k.lower(): v for k, v in self.headers.items()})
+            self._send(*result)
+
+        do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _dispatch
+
+    return Handler
+
+
+def serve(data: dict, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+          standin: StandIn = None) -> ThreadingHTTPServer:
+    standin = standin or StandIn(data, latency_ms)
+    server = ThreadingHTTPServer((host, port), make_handler(standin))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fixture dataset as Stripe/Clerk/HubSpot/Supabase")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fixtures", help="replay a saved dataset instead of synthesizing one")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    data = fixtures.load(args.fixtures) if args.fixtures else fixtures.synthesize(args.customers, args.seed)
+    server = serve(data, args.host, args.port, args.latency_ms)
+    host, port = server.server_address[:2]
+    # First line is read by run_benchmarks.py
+    print(f"http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
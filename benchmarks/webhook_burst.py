@@ -0,0 +1,164 @@
+"""
+Bursty webhook load for webhook_ingest.py.
+
+Builds a billing-cycle style burst from the fixture dataset: for a sample of
+customers, several customer.subscription.updated events, an
+invoice.payment_succeeded, and Clerk user.updated events for their users,
+plus a share of redelivered duplicates. Every event is signed the way
+Stripe and svix sign them and POSTed concurrently to the ingest service.
+
+The script then reads the Supabase calls from the fake's /__stats and
+compares them with what the per-event edge functions make for the same
+events (1 PostgREST call per subscription event, 4 per paid invoice, 1 per
+Clerk event).
+
+Run the fake and the service with the same seed and secrets:
+
+    python benchmarks/fake_services.py --customers 10000 --print-env   # export what it prints
+    STRIPE_WEBHOOK_SIGNING_SECRET=whsec_test CLERK_WEBHOOK_SECRET=whsec_dGVzdA== \\
+        python webhook_ingest.py --port 8790
+    python benchmarks/webhook_burst.py --ingest http://127.0.0.1:8790 \\
+        --stats http://127.0.0.1:<fake port> --customers 10000 --events 5000
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import fixtures
+
+EDGE_POSTGREST_CALLS = {"subscription": 1, "invoice": 4, "clerk": 1}
+
+
+def sign_stripe(body: bytes, secret: str) -> dict:
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return {"Stripe-Signature": f"t={timestamp},v1={signature}"}
+
+
+def sign_svix(body: bytes, msg_id: str, secret: str) -> dict:
+    timestamp = str(int(time.time()))
+    key = base64.b64decode(secret[len("whsec_"):] if secret.startswith("whsec_") else secret)
+    signature = base64.b64encode(
+        hmac.new(key, f"{msg_id}.{timestamp}.".encode() + body, hashlib.sha256).digest()
+    ).decode()
+    return {"svix-id": msg_id, "svix-timestamp": timestamp, "svix-signature": f"v1,{signature}"}
+
+
+def build_events(data: dict, count: int, seed: int, duplicates: float):
+    """[(kind, path, event_id, payload)], roughly `count` long, in send order."""
+    rng = random.Random(seed)
+    subs_by_customer = {}
+    for sub in data["subscriptions"]:
+        subs_by_customer.setdefault(sub["customer"], []).append(sub)
+    invoices_by_customer = {}
+    for inv in data["stripe_invoices"]:
+        invoices_by_customer.setdefault(inv["customer"], []).append(inv)
+    users_by_email = {u["email_addresses"][0]["email_address"].lower(): u
+                      for u in data["clerk_users"] if u.get("email_addresses")}
+
+    now = int(time.time())
+    events = []
+    customers = [c for c in data["stripe_customers"] if c["id"] in subs_by_customer]
+    rng.shuffle(customers)
+    for customer in customers:
+        if len(events) >= count:
+            break
+        sub = rng.choice(subs_by_customer[customer["id"]])
+        for n, status in enumerate(rng.sample(["past_due", "active", "active", "trialing"], rng.randint(1, 3))):
+            event_id = f"evt_{len(events):014d}"
+            events.append(("subscription", "/stripe", event_id, {
+                "id": event_id, "object": "event", "type": "customer.subscription.updated",
+                "created": now + n, "data": {"object": {**sub, "status": status}},
+            }))
+        invoices = invoices_by_customer.get(customer["id"])
+        if invoices:
+            event_id = f"evt_{len(events):014d}"
+            invoice = max(invoices, key=lambda inv: inv["created"])
+            events.append(("invoice", "/stripe", event_id, {
+                "id": event_id, "object": "event", "type": "invoice.payment_succeeded",
+                "created": now + 3, "data": {"object": invoice},
+            }))
+        user = users_by_email.get((customer.get("email") or "").lower())
+        if user:
+            for n in range(rng.randint(1, 2)):
+                msg_id = f"msg_{len(events):014d}"
+                events.append(("clerk", "/clerk", msg_id, {
+                    "type": "user.updated", "object": "event",
+                    "data": {**user, "last_name": user["last_name"] + "-" * n, "updated_at": (now + n) * 1000},
+                }))
+
+    redelivered = rng.sample(events, int(len(events) * duplicates))
+    events.extend(redelivered)
+    rng.shuffle(events)
+    return events
+
+
+def post(base: str, kind: str, path: str, event_id: str, payload: dict, secrets: dict) -> int:
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json"}
+    if path == "/stripe":
+        headers.update(sign_stripe(body, secrets["stripe"]))
+    else:
+        headers.update(sign_svix(body, event_id, secrets["clerk"]))
+    request = urllib.request.Request(base + path, data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def fetch_stats(base: str) -> dict:
+    with urllib.request.urlopen(base + "/__stats", timeout=30) as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a signed webhook burst to webhook_ingest.py")
+    parser.add_argument("--ingest", default="http://127.0.0.1:8790")
+    parser.add_argument("--stats", required=True, help="base URL of the stand-in or fake the service writes to")
+    parser.add_argument("--customers", type=int, default=1000, help="same dataset size as the fake")
+    parser.add_argument("--seed", type=int, default=42, help="same seed as the fake")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--duplicates", type=float, default=0.05, help="share of events delivered twice")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stripe-secret", default="whsec_test")
+    parser.add_argument("--clerk-secret", default="whsec_dGVzdA==")
+    args = parser.parse_args()
+
+    data = fixtures.synthesize(args.customers, args.seed)
+    events = build_events(data, args.events, args.seed, args.duplicates)
+    secrets = {"stripe": args.stripe_secret, "clerk": args.clerk_secret}
+
+    before = fetch_stats(args.stats)["calls"]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = Counter(pool.map(lambda e: post(args.ingest, *e, secrets), events))
+    elapsed = time.perf_counter() - started
+    after = fetch_stats(args.stats)["calls"]
+
+    delta = {route: n - before.get(route, 0) for route, n in after.items() if n != before.get(route, 0)}
+    postgrest = sum(n for route, n in delta.items() if route.startswith("postgrest"))
+    stripe_calls = sum(n for route, n in delta.items() if route.startswith("stripe"))
+    edge_estimate = sum(EDGE_POSTGREST_CALLS[kind] for kind, *_ in events)
+
+    print(f"Sent {len(events)} events in {elapsed:.1f}s ({len(events) / elapsed:.0f}/s), responses {dict(statuses)}")
+    print(f"PostgREST calls: {postgrest} (per-event edge functions: ~{edge_estimate})")
+    print(f"Stripe calls:    {stripe_calls}")
+    for route, n in sorted(delta.items(), key=lambda kv: -kv[1]):
+        print(f"  {n:7d}  {route}")
+    return 0 if set(statuses) <= {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
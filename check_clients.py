@@ -1,7 +1,11 @@
+import argparse
 import os
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from client_stats import fetch_client_stats, stripe_linked_counts
+import profiling
+
 def get_supabase_client():
     load_dotenv()
     url = os.getenv("VITE_SUPABASE_URL")
@@ -12,10 +16,23 @@ def get_supabase_client():
     
     return create_client(url, key)
 
-def check_clients_subscription_data():
+def check_clients_subscription_data(list_clients: bool = False):
     """Check clients table for subscription information"""
     supabase = get_supabase_client()
     
+    if not list_clients:
+        # Counts only: one client_stats call instead of downloading every row
+        stats = fetch_client_stats(supabase)
+        clients_with_stripe, clients_without_stripe = stripe_linked_counts(stats)
+        print(f"Found {stats['total']} clients.")
+        print("\nBy subscription status:")
+        for status, n in sorted(stats['by_subscription_status'].items(), key=lambda kv: -kv[1]):
+            print(f"  {status}: {n}")
+        print("\nSummary:")
+        print(f"Clients with Stripe data: {clients_with_stripe}")
+        print(f"Clients without Stripe data: {clients_without_stripe}")
+        return
+    
     try:
         # Get all clients with their subscription data
         result = supabase.table('clients').select(
@@ -46,7 +63,7 @@ def check_clients_subscription_data():
                     
                 print("-" * 100)
             
-            print(f"\nSummary:")
+            print("\nSummary:")
             print(f"Clients with Stripe data: {clients_with_stripe}")
             print(f"Clients without Stripe data: {clients_without_stripe}")
             
@@ -56,5 +73,11 @@ def check_clients_subscription_data():
     except Exception as e:
         print(f"Error querying clients: {e}")
 
+def main():
+    parser = argparse.ArgumentParser(description="Check clients table for subscription information")
+    parser.add_argument("--list", action="store_true", help="print every client's subscription columns")
+    args = parser.parse_args()
+    check_clients_subscription_data(list_clients=args.list)
+
 if __name__ == "__main__":
-    check_clients_subscription_data()
\ No newline at end of file
+    profiling.run("check_clients", main)
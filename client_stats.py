@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Client Stats Report
+
+Grouped client counts from the client_stats RPC in a single call: by
+employee, subscription status, platform usage and Stripe link, plus how many
+unassigned clients are outside the excluded domains. Used by
+verify_sid_assignments.py, verify_platform_users.py and check_clients.py
+instead of count queries or full-table downloads.
+
+Usage:
+    python client_stats.py
+    python client_stats.py --exclude-domain heffron.ai --json
+
+Requirements:
+    - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file
+"""
+
+import argparse
+import json
+import os
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+import profiling
+
+DIMENSIONS = ("by_employee", "by_subscription_status", "by_platform_usage", "by_stripe_link", "assignable")
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client"""
+    url = os.getenv("VITE_SUPABASE_URL") or os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if not url or not key:
+        raise ValueError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
+
+    return create_client(url, key)
+
+
+def fetch_client_stats(supabase: Client, exclude_domains=()) -> dict:
+    """
+    Returns the client_stats payload with every dimension present (empty
+    groups are omitted by the database):
+        {"total": n, "by_employee": {...}, ..., "employees": {id: name}}
+    """
+    stats = supabase.rpc('client_stats', {'p_exclude_domains': list(exclude_domains)}).execute().data or {}
+    stats.setdefault("total", 0)
+    stats.setdefault("employees", {})
+    for dimension in DIMENSIONS:
+        stats.setdefault(dimension, {})
+    return stats
+
+
+def employee_count(stats: dict, employee_id: str) -> int:
+    return stats["by_employee"].get(employee_id, 0)
+
+
+def unassigned_count(stats: dict) -> int:
+    return stats["by_employee"].get("unassigned", 0)
+
+
+def assignable_count(stats: dict) -> int:
+    """Unassigned clients outside the excluded domains."""
+    return stats["assignable"].get("true", 0)
+
+
+def platform_users_count(stats: dict) -> int:
+    return stats["by_platform_usage"].get("true", 0)
+
+
+def stripe_linked_counts(stats: dict):
+    """Returns (linked, unlinked)."""
+    return stats["by_stripe_link"].get("linked", 0), stats["by_stripe_link"].get("unlinked", 0)
+
+
+def print_report(stats: dict):
+    total = stats["total"]
+    pct = lambda n: f"{n / total * 100:5.1f}%" if total else "    —"
+
+    print(f"📊 Clients: {total}")
+
+    print("\n👥 By employee")
+    names = stats["employees"]
+    for employee_id, n in sorted(stats["by_employee"].items(), key=lambda kv: -kv[1]):
+        label = "Unassigned" if employee_id == "unassigned" else names.get(employee_id, employee_id)
+        print(f"  {label:25} {n:>7}  {pct(n)}")
+    print(f"  {'Assignable (unassigned, not excluded)':25} {assignable_count(stats):>7}")
+
+    print("\n💳 By subscription status")
+    for status, n in sorted(stats["by_subscription_status"].items(), key=lambda kv: -kv[1]):
+        print(f"  {status:25} {n:>7}  {pct(n)}")
+
+    print("\n🖥️  Platform usage")
+    active = platform_users_count(stats)
+    print(f"  {'Using platform':25} {active:>7}  {pct(active)}")
+    print(f"  {'Not using platform':25} {total - active:>7}  {pct(total - active)}")
+
+    print("\n🔗 Stripe")
+    linked, unlinked = stripe_linked_counts(stats)
+    print(f"  {'Linked':25} {linked:>7}  {pct(linked)}")
+    print(f"  {'Not linked':25} {unlinked:>7}  {pct(unlinked)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grouped client counts in one query")
+    parser.add_argument("--exclude-domain", action="append", default=[], metavar="DOMAIN",
+                        help="domains left out of the 'assignable' count (repeatable)")
+    parser.add_argument("--json", action="store_true", help="print the raw stats as JSON")
+    args = parser.parse_args()
+
+    load_dotenv()
+    stats = fetch_client_stats(get_supabase_client(), args.exclude_domain)
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print_report(stats)
+
+
+if __name__ == "__main__":
+    profiling.run("client_stats", main)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Stripe vs Supabase Drift Audit
+
+Checks how far the clients subscription columns have drifted from Stripe
+without re-syncing anything:
+
+  1. Stripe: every subscription (100 per call, latest invoice expanded) and
+     the product names (one list call) give the expected columns per customer,
+     chosen the same way as sync_stripe_data.py.
+  2. Both sides are bucketed by a hash of the Stripe customer id and a
+     digest is computed per bucket; Supabase computes its digests in the
+     subscription_bucket_digests RPC, so only the digests are transferred.
+  3. Only buckets whose digests differ are fetched (subscription_bucket_rows)
+     and compared field by field.
+
+Reports the mismatched fields with counts, Stripe subscribers with no linked
+client, and clients whose subscription columns are set but whose customer has
+no subscription in Stripe. Exits 1 when drift is found, so it can be run
+hourly from a scheduler and alert on failure.
+
+Usage:
+    python drift_audit.py
+    python drift_audit.py --buckets 4096 --json drift.json
+
+Requirements:
+    - STRIPE_SECRET_KEY in .env file
+    - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+
+import stripe
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+import profiling
+import resilience
+import sync_metrics
+from api_endpoints import configure_stripe
+
+FIELDS = ("subscription_status", "subscription_product", "subscription_plan", "last_payment_date")
+ACTIVE_STATUSES = ("active", "trialing", "past_due")
+DEFAULT_BUCKETS = 1024
+ROWS_CHUNK = 200  # buckets per subscription_bucket_rows call
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client"""
+    url = os.getenv("VITE_SUPABASE_URL") or os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if not url or not key:
+        raise ValueError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
+
+    return create_client(url, key)
+
+
+# ------------------------------------------------------------------
+#  Hashing (must match the SQL in 20250813000000_create_subscription_digest_functions.sql)
+# ------------------------------------------------------------------
+def bucket_of(customer_id: str, buckets: int) -> int:
+    return int(hashlib.md5(customer_id.encode()).hexdigest()[:8], 16) % buckets
+
+
+def row_line(customer_id: str, values: dict) -> str:
+    """customer_id|status|product|plan|YYYY-MM-DD, NULLs as empty strings."""
+    return "|".join([customer_id] + [str(values.get(f) or "") for f in FIELDS])
+
+
+def bucket_digests(lines_by_bucket: dict) -> dict:
+    return {
+        bucket: hashlib.md5("\n".join(sorted(lines, key=lambda l: l.encode())).encode()).hexdigest()
+        for bucket, lines in lines_by_bucket.items()
+    }
+
+
+# ------------------------------------------------------------------
+#  Stripe side
+# ------------------------------------------------------------------
+def list_all(list_fn, **params):
+    """
+    Yields every object of a Stripe list, one page per call through the stripe
+    breaker. An unavailable Stripe raises rather than ending the list early, so
+    the audit never reports drift from a partial listing.
+    """
+    starting_after = None
+    while True:
+        page = resilience.call("stripe", list_fn, limit=100, starting_after=starting_after, **params)
+        yield from page.data
+        if not page.has_more or not page.data:
+            return
+        starting_after = page.data[-1].id
+
+
+def fetch_stripe_expected() -> dict:
+    """{customer_id: {field: value}} for every customer with a subscription."""
+    product_names = {p.id: p.name for p in list_all(stripe.Product.list)}
+
+    by_customer = {}
+    for sub in list_all(stripe.Subscription.list, status="all", expand=["data.latest_invoice"]):
+        by_customer.setdefault(sub.customer, []).append(sub)
+
+    expected = {}
+    for customer_id, subs in by_customer.items():
+        subs.sort(key=lambda s: s.created, reverse=True)
+        active = [s for s in subs if s.status in ACTIVE_STATUSES]
+        sub = active[0] if active else subs[0]
+
+        values = {"subscription_status": sub.status}
+        items = sub["items"]["data"]
+        if items:
+            price = items[0]["price"]
+            values["subscription_plan"] = price["nickname"] or price["id"]
+            if price["product"]:
+                values["subscription_product"] = product_names.get(price["product"], price["product"])
+        invoice = sub.latest_invoice
+        if invoice and not isinstance(invoice, str):
+            paid_at = (invoice.get("status_transitions") or {}).get("paid_at")
+            if paid_at:
+                values["last_payment_date"] = datetime.fromtimestamp(paid_at, tz=timezone.utc).strftime("%Y-%m-%d")
+        expected[customer_id] = values
+    return expected
+
+
+# ------------------------------------------------------------------
+#  Audit
+# ------------------------------------------------------------------
+def fetch_supabase_digests(supabase: Client, buckets: int) -> dict:
+    rows = supabase.rpc('subscription_bucket_digests', {'p_buckets': buckets}).execute().data or []
+    return {row['bucket']: row['digest'] for row in rows}
+
+
+def fetch_bucket_rows(supabase: Client, buckets: int, bucket_ids: list) -> list:
+    rows = []
+    for start in range(0, len(bucket_ids), ROWS_CHUNK):
+        chunk = bucket_ids[start:start + ROWS_CHUNK]
+        rows.extend(supabase.rpc('subscription_bucket_rows',
+                                 {'p_buckets': buckets, 'p_bucket_ids': chunk}).execute().data or [])
+    return rows
+
+
+def compare_rows(expected: dict, rows: list, bucket_ids: set, buckets: int) -> dict:
+    """Field-level comparison of the rows in the differing buckets."""
+    mismatches = []
+    field_counts = Counter()
+    linked = Counter()
+    stale = []
+    for row in rows:
+        customer_id = row['stripe_customer_id']
+        linked[customer_id] += 1
+        want = expected.get(customer_id)
+        have = {f: row.get(f) for f in FIELDS}
+        if want is None:
+            if any(have.values()):
+                stale.append({"customer": customer_id, "email": row.get('email'), "supabase": have})
+            continue
+        for field in FIELDS:
+            if str(have[field] or "") != str(want.get(field) or ""):
+                field_counts[field] += 1
+                mismatches.append({
+                    "customer": customer_id, "email": row.get('email'), "field": field,
+                    "supabase": have[field], "stripe": want.get(field),
+                })
+
+    missing = sorted(c for c in expected if bucket_of(c, buckets) in bucket_ids and c not in linked)
+    return {
+        "mismatches": mismatches,
+        "mismatched_fields": dict(field_counts),
+        "clients_with_mismatches": len({m["customer"] for m in mismatches}),
+        "missing_in_supabase": missing,
+        "no_subscription_in_stripe": stale,
+        "duplicate_links": sorted(c for c, n in linked.items() if n > 1),
+    }
+
+
+def audit(supabase: Client, buckets: int = DEFAULT_BUCKETS) -> dict:
+    with sync_metrics.stage("stripe"):
+        expected = fetch_stripe_expected()
+
+    with sync_metrics.stage("digests"):
+        lines = {}
+        for customer_id, values in expected.items():
+            lines.setdefault(bucket_of(customer_id, buckets), []).append(row_line(customer_id, values))
+        stripe_digests = bucket_digests(lines)
+        supabase_digests = fetch_supabase_digests(supabase, buckets)
+
+    differing = sorted(b for b in set(stripe_digests) | set(supabase_digests)
+                       if stripe_digests.get(b) != supabase_digests.get(b))
+    print(f"🔎 {len(expected)} Stripe subscribers in {len(stripe_digests)} buckets; "
+          f"{len(differing)} of {buckets} buckets differ")
+
+    with sync_metrics.stage("drill_down"):
+        rows = fetch_bucket_rows(supabase, buckets, differing) if differing else []
+        result = compare_rows(expected, rows, set(differing), buckets)
+
+    result.update(buckets=buckets, buckets_differing=len(differing),
+                  stripe_subscribers=len(expected), rows_compared=len(rows))
+    return result
+
+
+def has_drift(result: dict) -> bool:
+    return bool(result["mismatches"] or result["missing_in_supabase"]
+                or result["no_subscription_in_stripe"] or result["duplicate_links"])
+
+
+def print_report(result: dict, limit: int = 50):
+    print("\n=== Drift Report ===")
+    print(f"Buckets differing: {result['buckets_differing']} / {result['buckets']} "
+          f"({result['rows_compared']} client rows compared)")
+    if result["mismatched_fields"]:
+        print(f"\n⚠️  {result['clients_with_mismatches']} clients with mismatched fields:")
+        for field, n in sorted(result["mismatched_fields"].items(), key=lambda kv: -kv[1]):
+            print(f"  {field:22} {n:>6}")
+        print()
+        for m in result["mismatches"][:limit]:
+            print(f"  {m['email'] or m['customer']:35} {m['field']:22} {m['supabase'] or '—'} → {m['stripe'] or '—'}")
+        if len(result["mismatches"]) > limit:
+            print(f"  ... {len(result['mismatches']) - limit} more")
+    if result["missing_in_supabase"]:
+        print(f"\n⚠️  {len(result['missing_in_supabase'])} Stripe subscribers with no linked client")
+    if result["no_subscription_in_stripe"]:
+        print(f"\n⚠️  {len(result['no_subscription_in_stripe'])} clients with subscription data "
+              f"but no subscription in Stripe")
+    if result["duplicate_links"]:
+        print(f"\n⚠️  {len(result['duplicate_links'])} Stripe customers linked to more than one client")
+    if not has_drift(result):
+        print("\n✅ No drift: Supabase matches Stripe.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect drift between Stripe and the clients subscription columns")
+    parser.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS, help="number of hash buckets")
+    parser.add_argument("--json", help="also write the full result to this file")
+    args = parser.parse_args()
+
+    load_dotenv()
+    sync_metrics.install("drift_audit")
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    configure_stripe(stripe)
+
+    try:
+        result = audit(get_supabase_client(), args.buckets)
+        print_report(result)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(result, f, indent=2, default=str)
+            print(f"\nResults written to {args.json}")
+    finally:
+        sync_metrics.write_summary()
+
+    return 1 if has_drift(result) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(profiling.run("drift_audit", main))
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Columnar Export
+
+Streams the clients, invoices and employees tables into partitioned Parquet
+(or Arrow IPC) files for analysis, plus a daily snapshot of the activity
+fields. Rows are read from PostgREST one page at a time and written as
+record batches, so memory stays at one page regardless of table size.
+
+Layout (hive-style partitions, readable by pyarrow.dataset, DuckDB, Polars):
+
+    exports/clients/created_month=2025-08/part-20250812T040000.parquet
+    exports/invoices/created_month=2025-08/part-20250812T040000.parquet
+    exports/employees/created_month=2025-07/part-20250812T040000.parquet
+    exports/activity/snapshot_date=2025-08-12/part-20250812T040000.parquet
+    exports/_state.json          # created_at watermark per table
+
+Each run appends only rows created after the table's watermark; --full
+ignores the watermarks and re-exports everything into a fresh directory.
+Rows are never rewritten in place, so columns that change after creation
+(subscription fields, employee_id) are current as of the run that exported
+the row; the activity snapshot captures is_using_platform/last_contact daily.
+add_clerk_users_to_system.py backdates clients.created_at to the Clerk
+signup time, so run with --full after a backfill like that.
+
+Usage:
+    python export_parquet.py
+    python export_parquet.py --tables invoices --out /data/exports
+    python export_parquet.py --format arrow --full
+
+Requirements:
+    - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file
+    - pip install pyarrow
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed when the export actually runs
+    pa = pq = None
+
+import profiling
+import sync_metrics
+
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+
+def _schemas():
+    """Arrow schemas matching the Supabase tables (see supabase/migrations and types.ts)."""
+    ts = pa.timestamp("us", tz="UTC")
+    return {
+        "clients": pa.schema([
+            ("id", pa.string()),
+            ("clerk_id", pa.string()),
+            ("name", pa.string()),
+            ("email", pa.string()),
+            ("company", pa.string()),
+            ("phone", pa.string()),
+            ("priority", pa.string()),
+            ("is_using_platform", pa.bool_()),
+            ("referred_by", pa.string()),
+            ("last_contact", ts),
+            ("employee_id", pa.string()),
+            ("created_at", ts),
+            ("notes", pa.string()),
+            ("commission_approved", pa.bool_()),
+            ("is_upsell_opportunity", pa.bool_()),
+            ("stripe_customer_id", pa.string()),
+            ("subscription_status", pa.dictionary(pa.int16(), pa.string())),
+            ("subscription_product", pa.dictionary(pa.int16(), pa.string())),
+            ("subscription_plan", pa.dictionary(pa.int16(), pa.string())),
+            ("last_payment_date", pa.date32()),
+        ]),
+        "invoices": pa.schema([
+            ("id", pa.string()),
+            ("client_id", pa.string()),
+            ("stripe_invoice_id", pa.string()),
+            ("amount_paid", pa.decimal128(10, 2)),
+            ("created_at", ts),
+            ("status", pa.dictionary(pa.int16(), pa.string())),
+            ("invoice_pdf", pa.string()),
+        ]),
+        "employees": pa.schema([
+            ("id", pa.string()),
+            ("name", pa.string()),
+            ("created_at", ts),
+        ]),
+        "activity": pa.schema([
+            ("id", pa.string()),
+            ("email", pa.string()),
+            ("employee_id", pa.string()),
+            ("is_using_platform", pa.bool_()),
+            ("last_contact", ts),
+        ]),
+    }
+
+
+INCREMENTAL_TABLES = ("clients", "invoices", "employees")
+TABLES = INCREMENTAL_TABLES + ("activity",)
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client"""
+    url = os.getenv("VITE_SUPABASE_URL") or os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if not url or not key:
+        raise ValueError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
+
+    return create_client(url, key)
+
+
+# ------------------------------------------------------------------
+#  Conversion
+# ------------------------------------------------------------------
+def _parse_timestamp(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
+
+
+def _parse_date(value):
+    return date.fromisoformat(value[:10]) if value else None
+
+
+def _parse_decimal(value):
+    return Decimal(str(value)).quantize(Decimal("0.01")) if value is not None else None
+
+
+def to_batch(rows: list, schema) -> "pa.RecordBatch":
+    """Converts PostgREST JSON rows to a record batch with the table's schema."""
+    columns = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_timestamp(field.type):
+            values = [_parse_timestamp(v) for v in values]
+        elif pa.types.is_date(field.type):
+            values = [_parse_date(v) for v in values]
+        elif pa.types.is_decimal(field.type):
+            values = [_parse_decimal(v) for v in values]
+        if pa.types.is_dictionary(field.type):
+            columns.append(pa.array(values, pa.string()).dictionary_encode().cast(field.type))
+        else:
+            columns.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+# ------------------------------------------------------------------
+#  Writers
+# ------------------------------------------------------------------
+class PartitionedWriter:
+    """Keeps one open file per partition directory for the duration of a run."""
+
+    def __init__(self, root: str, schema, fmt: str, run_id: str):
+        self.root = root
+        self.schema = schema
+        self.fmt = fmt
+        self.run_id = run_id
+        self.writers = {}
+        self.rows = 0
+
+    def _open(self, partition: str):
+        directory = os.path.join(self.root, partition)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{self.run_id}.{self.fmt}")
+        if self.fmt == "parquet":
+            return pq.ParquetWriter(path, self.schema, compression="zstd")
+        return pa.ipc.new_file(path, self.schema)
+
+    def write(self, partition: str, batch):
+        writer = self.writers.get(partition)
+        if writer is None:
+            writer = self.writers[partition] = self._open(partition)
+        if self.fmt == "parquet":
+            writer.write_batch(batch)
+        else:
+            writer.write(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
+
+def _month_partition(row: dict) -> str:
+    created = row.get("created_at")
+    return f"created_month={created[:7]}" if created else "created_month=unknown"
+
+
+# ------------------------------------------------------------------
+#  Export
+# ------------------------------------------------------------------
+def load_state(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, "_state.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(out_dir: str, state: dict):
+    path = os.path.join(out_dir, "_state.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def iter_pages(supabase: Client, table: str, columns: list, since: str = None):
+    """Yields pages ordered by (created_at, id), starting after the watermark."""
+    start = 0
+    while True:
+        query = supabase.table(table).select(",".join(columns))
+        if since:
+            query = query.gt("created_at", since)
+        page = (query.order("created_at", nullsfirst=True).order("id")
+                .range(start, start + PAGE_SIZE - 1).execute().data or [])
+        if page:
+            yield page
+        if len(page) < PAGE_SIZE:
+            return
+        start += PAGE_SIZE
+
+
+def export_table(supabase: Client, table: str, out_dir: str, fmt: str, run_id: str, since: str = None):
+    """Appends rows created after `since`; returns (rows, new watermark)."""
+    schema = _schemas()[table]
+    writer = PartitionedWriter(os.path.join(out_dir, table), schema, fmt, run_id)
+    watermark = since
+    try:
+        for page in iter_pages(supabase, table, schema.names, since):
+            by_partition = {}
+            for row in page:
+                by_partition.setdefault(_month_partition(row), []).append(row)
+            for partition, rows in by_partition.items():
+                writer.write(partition, to_batch(rows, schema))
+            last = page[-1].get("created_at")
+            if last and (watermark is None or _parse_timestamp(last) > _parse_timestamp(watermark)):
+                watermark = last
+    finally:
+        writer.close()
+    return writer.rows, watermark
+
+
+def export_activity(supabase: Client, out_dir: str, fmt: str, run_id: str) -> int:
+    """Writes today's snapshot of the activity fields for every client."""
+    schema = _schemas()["activity"]
+    writer = PartitionedWriter(os.path.join(out_dir, "activity"), schema, fmt, run_id)
+    partition = f"snapshot_date={datetime.now(timezone.utc).date().isoformat()}"
+    start = 0
+    try:
+        while True:
+            page = (supabase.table("clients").select(",".join(schema.names)).order("id")
+                    .range(start, start + PAGE_SIZE - 1).execute().data or [])
+            if page:
+                writer.write(partition, to_batch(page, schema))
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+    finally:
+        writer.close()
+    return writer.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Supabase tables to partitioned Parquet/Arrow files")
+    parser.add_argument("--out", default=os.getenv("EXPORT_DIR", "exports"), help="output directory")
+    parser.add_argument("--tables", default=",".join(TABLES), help=f"comma-separated subset of {', '.join(TABLES)}")
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--full", action="store_true", help="ignore the watermarks and export every row")
+    args = parser.parse_args()
+
+    if pa is None:
+        print("❌ pyarrow is not installed. Run: pip install pyarrow")
+        return 1
+
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+    unknown = set(tables) - set(TABLES)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+
+    load_dotenv()
+    sync_metrics.install("export_parquet")
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    out_dir = os.path.join(args.out, f"full-{run_id}") if args.full else args.out
+    os.makedirs(out_dir, exist_ok=True)
+
+    print(f"🚀 Exporting {', '.join(tables)} to {out_dir} ({args.format})...")
+    try:
+        supabase = get_supabase_client()
+        state = {} if args.full else load_state(out_dir)
+
+        for table in tables:
+            with sync_metrics.stage(table):
+                if table == "activity":
+                    rows = export_activity(supabase, out_dir, args.format, run_id)
+                else:
+                    rows, watermark = export_table(supabase, table, out_dir, args.format, run_id, state.get(table))
+                    if watermark:
+                        state[table] = watermark
+                        save_state(out_dir, state)
+            print(f"  ✅ {table}: {rows} rows")
+
+        print("🎉 Export complete!")
+    except Exception as e:
+        print(f"❌ Export failed: {e}")
+        raise
+    finally:
+        sync_metrics.write_summary()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(profiling.run("export_parquet", main))
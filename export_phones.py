@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Phone List Export
+
+Streams client rows from Supabase page by page (keyset on id), normalises
+phone numbers to E.164, drops duplicates and writes them as CSV, NDJSON or the
+legacy comma-separated .txt, optionally gzipped. Only the current page and
+the set of seen dedupe keys (8-byte digests) are held in memory.
+
+Replaces save_unassigned_phones.py, save_filtered_phones.py,
+get_unassigned_phones_only.py and filter_heffron_emails.py, which are now
+presets of this command.
+
+Usage:
+    python export_phones.py --unassigned --out unassigned.csv
+    python export_phones.py --unassigned --exclude-domain heffron.ai --format txt --out -
+    python export_phones.py --columns phone,name,email --filter is_using_platform=eq.true --out active.ndjson.gz
+    python export_phones.py --format csv --dedupe-on email --out clients.csv.gz
+
+Requirements:
+    - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+import profiling
+
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+DEFAULT_COUNTRY_CODE = "61"
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client"""
+    url = os.getenv("VITE_SUPABASE_URL") or os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if not url or not key:
+        raise ValueError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
+
+    return create_client(url, key)
+
+
+# ------------------------------------------------------------------
+#  Normalisation
+# ------------------------------------------------------------------
+def normalise_phone(raw: str, country_code: str = DEFAULT_COUNTRY_CODE) -> str:
+    """
+    Returns the number in E.164 form, or "" if it is too short to be one.
+        "0414 123 456"     -> "+61414123456"   (national, default country)
+        "0061 414 123 456" -> "+61414123456"
+        "+1 (555) 123-4567" -> "+15551234567"
+    """
+    if not raw:
+        return ""
+    raw = raw.strip()
+    digits = re.sub(r"\D", "", raw)
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    return f"+{digits}" if 8 <= len(digits) <= 15 else ""
+
+
+def _digest(value: str) -> bytes:
+    return hashlib.blake2b(value.encode(), digest_size=8).digest()
+
+
+# ------------------------------------------------------------------
+#  Source
+# ------------------------------------------------------------------
+def build_query(supabase: Client, columns: list, unassigned: bool, exclude_domains: list, filters: list):
+    query = supabase.table("clients").select(",".join(sorted(set(columns) | {"id"})))
+    if unassigned:
+        query = query.is_("employee_id", "null")
+    for domain in exclude_domains:
+        query = query.not_.ilike("email", f"%{domain}%")
+    for column, operator, value in filters:
+        query = query.filter(column, operator, value)
+    return query
+
+
+def iter_rows(make_query, page_size: int = PAGE_SIZE):
+    """Keyset pagination on id: each page costs the same however deep the export goes."""
+    last_id = None
+    while True:
+        query = make_query()
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = query.order("id").limit(page_size).execute().data or []
+        yield from page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]["id"]
+
+
+def parse_filter(spec: str):
+    """'is_using_platform=eq.true' -> ('is_using_platform', 'eq', 'true')"""
+    column, sep, rest = spec.partition("=")
+    operator, dot, value = rest.partition(".")
+    if not sep or not dot:
+        raise argparse.ArgumentTypeError(f"expected column=operator.value, got {spec!r}")
+    return column.strip(), operator, value
+
+
+# ------------------------------------------------------------------
+#  Sinks
+# ------------------------------------------------------------------
+def open_output(path: str, compress: bool):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="", write_through=True)
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+class Writer:
+    def __init__(self, out, fmt: str, columns: list):
+        self.out = out
+        self.fmt = fmt
+        self.columns = columns
+        self.count = 0
+        if fmt == "csv":
+            self.csv = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+            self.csv.writeheader()
+
+    def write(self, row: dict):
+        if self.fmt == "csv":
+            self.csv.writerow(row)
+        elif self.fmt == "ndjson":
+            self.out.write(json.dumps({c: row.get(c) for c in self.columns}) + "\n")
+        else:
+            # Legacy format: one comma-separated line of the first column
+            self.out.write(("," if self.count else "") + str(row.get(self.columns[0]) or ""))
+        self.count += 1
+
+
+def export(supabase: Client, out, fmt: str, columns: list, unassigned: bool = False,
+           exclude_domains=(), filters=(), dedupe_on: str = "phone",
+           country_code: str = DEFAULT_COUNTRY_CODE) -> dict:
+    """
+    Streams matching rows to `out`. Rows without a valid phone (when phone is
+    exported or deduplicated on) or without a dedupe key are skipped.
+    Returns counts of written/duplicate/skipped rows.
+    """
+    fetch_columns = list(columns)
+    if dedupe_on != "none" and dedupe_on not in fetch_columns:
+        fetch_columns.append(dedupe_on)
+
+    writer = Writer(out, fmt, columns)
+    seen = set()
+    stats = {"written": 0, "duplicates": 0, "skipped": 0}
+    make_query = lambda: build_query(supabase, fetch_columns, unassigned, list(exclude_domains), list(filters))
+
+    for row in iter_rows(make_query):
+        if "phone" in fetch_columns:
+            row["phone"] = normalise_phone(row.get("phone"), country_code)
+            if not row["phone"]:
+                stats["skipped"] += 1
+                continue
+        if row.get("email"):
+            row["email"] = row["email"].strip().lower()
+
+        if dedupe_on != "none":
+            key = row.get(dedupe_on)
+            if not key:
+                stats["skipped"] += 1
+                continue
+            digest = _digest(str(key))
+            if digest in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(digest)
+
+        writer.write(row)
+        stats["written"] += 1
+    return stats
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Stream client phone lists from Supabase to CSV/NDJSON/txt")
+    parser.add_argument("--out", default="-", help="output file, or - for stdout (.gz implies --gzip)")
+    parser.add_argument("--format", choices=("csv", "ndjson", "txt"), help="default: from the file extension, else csv")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("--columns", default="phone", help="comma-separated clients columns to write")
+    parser.add_argument("--unassigned", action="store_true", help="only clients with no employee_id")
+    parser.add_argument("--exclude-domain", action="append", default=[], metavar="DOMAIN",
+                        help="skip emails containing DOMAIN (repeatable)")
+    parser.add_argument("--filter", action="append", default=[], type=parse_filter, metavar="COL=OP.VALUE",
+                        help="extra PostgREST filter, e.g. is_using_platform=eq.true (repeatable)")
+    parser.add_argument("--dedupe-on", default="phone", help="column to deduplicate on, or 'none'")
+    parser.add_argument("--country-code", default=os.getenv("PHONE_DEFAULT_COUNTRY_CODE", DEFAULT_COUNTRY_CODE),
+                        help="country code for national numbers starting with 0")
+    args = parser.parse_args(argv)
+
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()]
+    fmt = args.format
+    if fmt is None:
+        stem = args.out[:-3] if args.out.endswith(".gz") else args.out
+        fmt = next((f for f in ("csv", "ndjson", "txt") if stem.endswith("." + f)), "csv")
+    compress = args.gzip or args.out.endswith(".gz")
+
+    supabase = get_supabase_client()
+    out = open_output(args.out, compress)
+    try:
+        stats = export(supabase, out, fmt, columns, args.unassigned, args.exclude_domain,
+                       args.filter, args.dedupe_on, args.country_code)
+    finally:
+        if args.out == "-":
+            out.write("\n" if fmt == "txt" else "")
+            out.detach()
+        else:
+            out.close()
+
+    # Progress goes to stderr so --out - stays clean
+    target = "stdout" if args.out == "-" else f"'{args.out}'"
+    print(f"✅ Wrote {stats['written']} rows to {target} "
+          f"({stats['duplicates']} duplicates, {stats['skipped']} skipped)", file=sys.stderr)
+    return stats
+
+
+if __name__ == "__main__":
+    profiling.run("export_phones", main)
@@ -18,6 +18,8 @@ import stripe
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from api_endpoints import configure_stripe
+
 
 def get_supabase_client() -> Client:
     """Initialize Supabase client"""
@@ -87,6 +89,7 @@ def main():
     
     # Initialize Stripe
     stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    configure_stripe(stripe)
     if not stripe.api_key:
         raise ValueError("Missing STRIPE_SECRET_KEY environment variable")
     
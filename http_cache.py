@@ -0,0 +1,190 @@
+"""
+On-disk cache for the Clerk and HubSpot list reads.
+
+The comparison and report scripts download every Clerk user and HubSpot
+contact each time they run. With HTTP_CACHE_DIR set, get_session() returns a
+requests session that keeps GET responses in a SQLite file in that directory:
+
+  - a response younger than HTTP_CACHE_TTL seconds is returned without
+    touching the network;
+  - an older one is revalidated with If-None-Match / If-Modified-Since when
+    the API sent an ETag or Last-Modified, and reused on 304 Not Modified;
+  - the least recently used responses are evicted once the cache is larger
+    than HTTP_CACHE_MAX_MB.
+
+Entries are keyed by method, URL with its sorted query parameters, and a hash
+of the Authorization header, so different API keys never share responses.
+Only 200 responses are stored, and never ones marked Cache-Control: no-store.
+
+Without HTTP_CACHE_DIR, get_session() returns a plain requests.Session.
+
+    HTTP_CACHE_DIR      (unset = no caching)
+    HTTP_CACHE_TTL      seconds a response is served without revalidation (default 900)
+    HTTP_CACHE_MAX_MB   size bound of the cache file's entries (default 200)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_TTL = 900
+DEFAULT_MAX_MB = 200
+
+# Describe the wire format, not the decoded body we store
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "connection")
+
+
+def cache_key(method: str, url: str, headers) -> str:
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    canonical = urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+    auth = hashlib.sha256((headers.get("Authorization") or "").encode()).hexdigest()[:16]
+    return hashlib.sha256(f"{method} {canonical} {auth}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed store of response bodies and validators with LRU eviction."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "http_cache.sqlite")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    headers TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def get(self, key: str):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT url, status, headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row:
+                with self.db:
+                    self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        if not row:
+            return None
+        url, status, headers, body, etag, last_modified, stored_at = row
+        return {"url": url, "status": status, "headers": json.loads(headers), "body": body,
+                "etag": etag, "last_modified": last_modified, "stored_at": stored_at}
+
+    def put(self, key: str, resp: requests.Response):
+        headers = {k: v for k, v in resp.headers.items() if k.lower() not in _DROPPED_HEADERS}
+        body = resp.content or b""
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, resp.url, resp.status_code, json.dumps(headers), body,
+                 resp.headers.get("ETag"), resp.headers.get("Last-Modified"), now, now, len(body)))
+            self._evict()
+
+    def touch(self, key: str):
+        """Marks a revalidated entry fresh again."""
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM responses")
+
+
+def _from_cache(entry: dict, request) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = entry["status"]
+    resp.headers = CaseInsensitiveDict(entry["headers"])
+    resp._content = entry["body"]
+    resp.encoding = get_encoding_from_headers(resp.headers)
+    resp.url = entry["url"]
+    resp.request = request
+    resp.reason = "OK"
+    resp.from_cache = True
+    return resp
+
+
+class CachingSession(requests.Session):
+    """requests.Session that serves GETs from a ResponseCache."""
+
+    def __init__(self, cache: ResponseCache, ttl: float):
+        super().__init__()
+        self.cache = cache
+        self.ttl = ttl
+        self.hits = 0
+        self.revalidated = 0
+
+    def send(self, request, **kwargs):
+        if request.method != "GET" or kwargs.get("stream"):
+            return super().send(request, **kwargs)
+
+        key = cache_key(request.method, request.url, request.headers)
+        entry = self.cache.get(key)
+        if entry and time.time() - entry["stored_at"] < self.ttl:
+            self.hits += 1
+            return _from_cache(entry, request)
+
+        if entry:
+            if entry["etag"]:
+                request.headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request.headers["If-Modified-Since"] = entry["last_modified"]
+
+        resp = super().send(request, **kwargs)
+        if resp.status_code == 304 and entry:
+            self.cache.touch(key)
+            self.revalidated += 1
+            return _from_cache(entry, request)
+        if resp.status_code == 200 and "no-store" not in resp.headers.get("Cache-Control", ""):
+            self.cache.put(key, resp)
+        return resp
+
+
+def get_session() -> requests.Session:
+    """A caching session when HTTP_CACHE_DIR is set, otherwise a plain one."""
+    directory = os.getenv("HTTP_CACHE_DIR")
+    if not directory:
+        return requests.Session()
+    ttl = float(os.getenv("HTTP_CACHE_TTL", DEFAULT_TTL))
+    max_bytes = int(float(os.getenv("HTTP_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+    return CachingSession(ResponseCache(directory, max_bytes), ttl)
+
+
+def describe(session: requests.Session) -> str:
+    """One-line cache summary for the end of a run, or "" when not caching."""
+    if not isinstance(session, CachingSession):
+        return ""
+    return f"📦 HTTP cache: {session.hits} fresh hits, {session.revalidated} revalidated (304)"
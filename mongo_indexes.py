@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Mongo Index Bootstrap
+
+Declares the indexes the edge functions' hot queries need on the calls and
+agents collections, creates the missing ones (existing indexes with the same
+keys are left alone, so it is safe to run on every deploy) and then runs
+`explain` with executionStats for each hot query, flagging collection scans
+and in-memory sorts:
+
+    check-user-activity   agents.findOne({$or: [{created_by}, {email}]})
+                          calls.countDocuments({agent_id, start_time >= 30 days ago})
+    get-all-transcripts   calls sorted by start_time (and _id in keyset mode),
+                          filtered by agent_id, start_time, sentiment or tags
+    get-user-transcripts  calls.find({agent_id})
+
+When indexes are missing, the queries are explained before and after they
+are created, so the report shows what each index buys.
+
+For a local stand-in, start a throwaway mongod and load the synthetic
+agents/calls from benchmarks/fixtures.py into it:
+
+    docker run -d --rm -p 27017:27017 mongo:7
+    python mongo_indexes.py --uri mongodb://localhost:27017 --seed-fixtures 20000
+
+Usage:
+    python mongo_indexes.py                 # create missing indexes, explain hot queries
+    python mongo_indexes.py --check         # report only; exit 1 on a missing index or COLLSCAN
+    python mongo_indexes.py --json
+
+Requirements:
+    - MONGO_URI in .env file (same value as the edge functions), or --uri
+    - pip install pymongo
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+try:
+    from bson import ObjectId
+    from pymongo import ASCENDING, DESCENDING, MongoClient
+except ImportError:  # only needed when the tool actually runs
+    MongoClient = ObjectId = None
+    ASCENDING, DESCENDING = 1, -1
+
+import profiling
+
+DB_NAME = "db"  # the edge functions use client.db("db")
+SEED_CHUNK_SIZE = 5000
+
+# collection: [(name, keys)]. Sort keys end in _id so get-all-transcripts'
+# keyset cursor (start_time, _id) is an index range with no in-memory sort.
+INDEXES = {
+    "calls": [
+        ("agent_id_start_time", [("agent_id", ASCENDING), ("start_time", DESCENDING), ("_id", DESCENDING)]),
+        ("start_time", [("start_time", DESCENDING), ("_id", DESCENDING)]),
+        ("sentiment_start_time", [("sentiment", ASCENDING), ("start_time", DESCENDING), ("_id", DESCENDING)]),
+        ("tags_start_time", [("tags", ASCENDING), ("start_time", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "agents": [
+        ("created_by", [("created_by", ASCENDING)]),
+        ("email", [("email", ASCENDING)]),
+    ],
+}
+
+
+# ------------------------------------------------------------------
+#  Indexes
+# ------------------------------------------------------------------
+def _key_of(keys) -> tuple:
+    return tuple((field, int(direction)) for field, direction in keys)
+
+
+def index_status(db) -> list:
+    """[(collection, name, keys, existing index name or None)] for every declared index."""
+    status = []
+    for collection, declared in INDEXES.items():
+        existing = {_key_of(info["key"].items()): info["name"] for info in db[collection].list_indexes()}
+        for name, keys in declared:
+            status.append((collection, name, keys, existing.get(_key_of(keys))))
+    return status
+
+
+def apply_indexes(db, status: list) -> list:
+    """Creates the missing indexes; returns their names. Existing indexes are never dropped."""
+    created = []
+    for collection, name, keys, existing in status:
+        if existing:
+            continue
+        names = {info["name"] for info in db[collection].list_indexes()}
+        if name in names:
+            # Same name, different keys: leave it to a person to decide
+            print(f"  ⚠️  {collection}.{name} exists with other keys; not replacing it")
+            continue
+        print(f"  ➕ {collection}.{name} {dict(keys)}")
+        db[collection].create_index(keys, name=name)
+        created.append(f"{collection}.{name}")
+    return created
+
+
+# ------------------------------------------------------------------
+#  Hot queries
+# ------------------------------------------------------------------
+def sample_values(db) -> dict:
+    """An agent with recent calls, its owner email and the 30-day cutoff, for realistic query shapes."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+    call = db.calls.find_one({}, sort=[("start_time", DESCENDING), ("_id", DESCENDING)])
+    agent = db.agents.find_one({"_id": call["agent_id"]}) if call else db.agents.find_one({})
+    return {
+        "since": cutoff,
+        "agent_id": agent["_id"] if agent else None,
+        "email": (agent.get("created_by") or agent.get("email")) if agent else "nobody@example.com",
+        "cursor": call,
+        "sentiment": (call or {}).get("sentiment") or "positive",
+        "tag": ((call or {}).get("tags") or ["pricing"])[0],
+    }
+
+
+def _transcripts_pipeline(match: dict, limit: int = 11) -> list:
+    return [{"$match": match}, {"$sort": {"start_time": -1, "_id": -1}}, {"$limit": limit}]
+
+
+def hot_queries(sample: dict) -> list:
+    """[(name, collection, explain command)] mirroring the edge functions' queries."""
+    agent_id, since = sample["agent_id"], sample["since"]
+    queries = [
+        ("activity: agent by owner", "agents", {
+            "find": "agents", "filter": {"$or": [{"created_by": sample["email"]}, {"email": sample["email"]}]},
+            "limit": 1,
+        }),
+        ("activity: recent call count", "calls", {
+            "count": "calls", "query": {"agent_id": agent_id, "start_time": {"$gte": since}},
+        }),
+        ("transcripts: latest page", "calls", {
+            "aggregate": "calls", "pipeline": _transcripts_pipeline({}), "cursor": {},
+        }),
+        ("transcripts: since cutoff", "calls", {
+            "aggregate": "calls", "pipeline": _transcripts_pipeline({"start_time": {"$gte": since}}), "cursor": {},
+        }),
+        ("transcripts: one agent", "calls", {
+            "aggregate": "calls", "pipeline": _transcripts_pipeline({"agent_id": agent_id}), "cursor": {},
+        }),
+        ("transcripts: sentiment", "calls", {
+            "aggregate": "calls", "pipeline": _transcripts_pipeline({"sentiment": sample["sentiment"]}), "cursor": {},
+        }),
+        ("transcripts: tag", "calls", {
+            "aggregate": "calls", "pipeline": _transcripts_pipeline({"tags": {"$in": [sample["tag"]]}}), "cursor": {},
+        }),
+        ("user transcripts: all for agent", "calls", {
+            "find": "calls", "filter": {"agent_id": agent_id},
+        }),
+    ]
+    cursor = sample["cursor"]
+    if cursor:
+        after = {"$or": [
+            {"start_time": {"$lt": cursor["start_time"]}},
+            {"start_time": cursor["start_time"], "_id": {"$lt": cursor["_id"]}},
+        ]}
+        queries.append(("transcripts: keyset next page", "calls", {
+            "aggregate": "calls", "pipeline": _transcripts_pipeline({"$and": [after]}), "cursor": {},
+        }))
+    return queries
+
+
+def _planner_sections(explain: dict) -> list:
+    """The queryPlanner/executionStats pairs in a find, count or aggregate explain."""
+    if "queryPlanner" in explain:
+        return [explain]
+    sections = []
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            sections.append(stage["$cursor"])
+    for shard in (explain.get("shards") or {}).values():
+        sections.extend(_planner_sections(shard))
+    return sections
+
+
+def _stages(plan: dict) -> list:
+    """Stage names in a (classic or SBE) plan tree, outermost first."""
+    if not plan:
+        return []
+    plan = plan.get("queryPlan", plan)
+    names = [plan.get("stage")] if plan.get("stage") else []
+    children = plan.get("inputStages") or ([plan["inputStage"]] if "inputStage" in plan else [])
+    for child in children:
+        names.extend(_stages(child))
+    return names
+
+
+def explain_query(db, name: str, collection: str, command: dict) -> dict:
+    explain = db.command("explain", command, verbosity="executionStats")
+    stages, docs, keys, returned, millis = [], 0, 0, 0, 0
+    for section in _planner_sections(explain):
+        stages.extend(_stages(section["queryPlanner"].get("winningPlan")))
+        stats = section.get("executionStats") or {}
+        docs += stats.get("totalDocsExamined", 0)
+        keys += stats.get("totalKeysExamined", 0)
+        returned += stats.get("nReturned", 0)
+        millis = max(millis, stats.get("executionTimeMillis", 0))
+    # An aggregate's $sort that the planner could not push into the index shows up as its own stage
+    blocking_sort = "SORT" in stages or any("$sort" in stage for stage in explain.get("stages", []))
+    return {
+        "query": name,
+        "collection": collection,
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "blocking_sort": blocking_sort,
+        "keys_examined": keys,
+        "docs_examined": docs,
+        "returned": returned,
+        "ms": millis,
+    }
+
+
+def explain_all(db) -> list:
+    sample = sample_values(db)
+    return [explain_query(db, *query) for query in hot_queries(sample)]
+
+
+def print_report(title: str, results: list):
+    print(f"\n📊 {title}")
+    print(f"  {'query':34} {'plan':34} {'keys':>8} {'docs':>8} {'ret':>6} {'ms':>5}")
+    for r in results:
+        flag = "❌" if r["collscan"] else ("⚠️ " if r["blocking_sort"] else "✅")
+        plan = " > ".join(r["stages"])[:34]
+        print(f"{flag} {r['query']:34} {plan:34} {r['keys_examined']:>8} {r['docs_examined']:>8} "
+              f"{r['returned']:>6} {r['ms']:>5}")
+
+
+# ------------------------------------------------------------------
+#  Local stand-in data
+# ------------------------------------------------------------------
+def seed_fixtures(db, customers: int, seed: int):
+    """Loads fixtures.py agents and calls into empty collections, with ObjectId ids like production."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+    import fixtures
+
+    for collection in ("agents", "calls"):
+        if db[collection].estimated_document_count():
+            raise ValueError(f"{db.name}.{collection} is not empty; --seed-fixtures only fills an empty stand-in")
+
+    batches = {"agents": [], "calls": []}
+    totals = {"agents": 0, "calls": 0}
+
+    def flush(collection):
+        if batches[collection]:
+            db[collection].insert_many(batches[collection], ordered=False)
+            totals[collection] += len(batches[collection])
+            batches[collection] = []
+
+    for collection, record in fixtures.iter_records(customers, seed):
+        if collection not in batches:
+            continue
+        doc = dict(record, _id=ObjectId(record["_id"]))
+        if collection == "calls":
+            doc["agent_id"] = ObjectId(record["agent_id"])
+        batches[collection].append(doc)
+        if len(batches[collection]) >= SEED_CHUNK_SIZE:
+            flush(collection)
+    for collection in batches:
+        flush(collection)
+    print(f"🌱 Seeded {totals['agents']} agents and {totals['calls']} calls into {db.name}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create the calls/agents indexes and explain the hot queries")
+    parser.add_argument("--uri", help="MongoDB URI (default: MONGO_URI)")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--check", action="store_true", help="create nothing; exit 1 on a missing index or COLLSCAN")
+    parser.add_argument("--no-explain", action="store_true", help="only create/check the indexes")
+    parser.add_argument("--seed-fixtures", type=int, metavar="CUSTOMERS",
+                        help="first load synthetic agents/calls for this many customers (empty database only)")
+    parser.add_argument("--seed", type=int, default=42, help="fixture seed")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if MongoClient is None:
+        print("❌ pymongo is not installed. Run: pip install pymongo")
+        return 1
+
+    load_dotenv()
+    uri = args.uri or os.getenv("MONGO_URI")
+    if not uri:
+        print("❌ Set MONGO_URI in .env or pass --uri")
+        return 1
+
+    db = MongoClient(uri)[args.db]
+    if args.seed_fixtures:
+        seed_fixtures(db, args.seed_fixtures, args.seed)
+
+    status = index_status(db)
+    missing = [f"{c}.{n}" for c, n, _, existing in status if not existing]
+    report = {"indexes": [{"collection": c, "name": n, "keys": dict(k), "existing": e} for c, n, k, e in status]}
+
+    if not args.json:
+        print("🔎 Indexes:")
+        for collection, name, keys, existing in status:
+            state = f"✅ present as {existing}" if existing else "❌ missing"
+            print(f"  {collection}.{name:22} {state}")
+
+    if missing and not args.check and not args.no_explain:
+        report["before"] = explain_all(db)
+    if not args.check:
+        report["created"] = apply_indexes(db, status)
+        missing = [m for m in missing if m not in report["created"]]
+    if not args.no_explain:
+        report["after"] = explain_all(db)
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        if "before" in report:
+            print_report("Before creating the missing indexes", report["before"])
+        if "after" in report:
+            print_report("Hot queries" + (" with the new indexes" if "before" in report else ""), report["after"])
+
+    collscans = [r["query"] for r in report.get("after", []) if r["collscan"]]
+    if collscans and not args.json:
+        print(f"\n❌ Collection scans: {', '.join(collscans)}")
+    if args.check and missing and not args.json:
+        print(f"\n❌ Missing indexes: {', '.join(missing)}")
+    return 1 if collscans or (args.check and missing) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(profiling.run("mongo_indexes", main))
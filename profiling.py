@@ -0,0 +1,126 @@
+"""
+--profile switch for the sync and report scripts.
+
+Entry points call their main() through profiling.run():
+
+    if __name__ == "__main__":
+        profiling.run("sync_stripe_data", main)
+
+Without --profile on the command line this just calls main(). With it (the
+flag is removed from sys.argv before main() parses its own arguments) the
+run happens under cProfile, tracemalloc and a stack sampler, and three files
+are written next to the run metrics in SYNC_METRICS_DIR:
+
+    <job>-<timestamp>.prof        raw cProfile stats (snakeviz, pstats)
+    <job>-<timestamp>-hotspots.txt functions by cumulative and own time,
+                                   plus the largest allocation sites
+    <job>-<timestamp>.folded      sampled stacks in collapsed format, for
+                                   flamegraph.pl or speedscope
+
+Per-stage peak memory is added to the run metrics summary by sync_metrics
+while tracemalloc is tracing.
+
+    SYNC_PROFILE_INTERVAL   stack sampling interval in seconds (default 0.005)
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 10
+
+
+class StackSampler:
+    """Samples the calling thread's stack on an interval into collapsed-stack counts."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _hotspot_report(profiler: cProfile.Profile, snapshot) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs()
+    out.write("=== By cumulative time ===\n")
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    out.write("\n=== By own time ===\n")
+    stats.sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+
+    out.write(f"\n=== Largest live allocations at exit (top {TOP_ALLOCATIONS}) ===\n")
+    for stat in snapshot.statistics("traceback")[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[-1]
+        out.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  "
+                  f"{os.path.basename(frame.filename)}:{frame.lineno}\n")
+    return out.getvalue()
+
+
+def run(job: str, main, *args, **kwargs):
+    """Calls main(*args, **kwargs), profiled when --profile is on the command line."""
+    if "--profile" not in sys.argv[1:]:
+        return main(*args, **kwargs)
+    sys.argv = [sys.argv[0]] + [a for a in sys.argv[1:] if a != "--profile"]
+
+    directory = os.getenv("SYNC_METRICS_DIR", "run_metrics")
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    base = os.path.join(directory, f"{job}-{stamp}")
+
+    sampler = StackSampler(float(os.getenv("SYNC_PROFILE_INTERVAL", 0.005)))
+    profiler = cProfile.Profile()
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    sampler.start()
+    profiler.enable()
+    try:
+        return main(*args, **kwargs)
+    finally:
+        profiler.disable()
+        sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        profiler.dump_stats(base + ".prof")
+        with open(base + "-hotspots.txt", "w") as f:
+            f.write(f"{job} profiled at {stamp}; peak traced memory {peak / 2**20:.1f} MiB\n\n")
+            f.write(_hotspot_report(profiler, snapshot))
+        sampler.write(base + ".folded")
+
+        print(f"\n🔬 Profile for {job}: peak traced memory {peak / 2**20:.1f} MiB")
+        print(f"  {base}-hotspots.txt")
+        print(f"  {base}.folded  ({sum(sampler.counts.values())} samples)")
+        print(f"  {base}.prof")
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Call Recordings Archive
+
+Bulk-downloads Twilio call recordings into a local archive. The
+get-call-recordings and proxy-audio edge functions stream one recording per
+request through Supabase. This tool instead lists recordings straight from
+Twilio and downloads them with a pool of workers:
+
+  - --since/--until list every recording in the date range. That is one
+    Twilio list request per 1000 recordings.
+  - --agent walks that agent's calls through get-all-transcripts
+    (transcripts_client.py) and lists the recordings of each call SID.
+  - Downloads go to <out>/.partial first. An interrupted file is resumed
+    with an HTTP Range request instead of starting over.
+  - Each finished file is hashed with sha256 and filed as
+    <out>/YYYY/MM/DD/<recording sid>.mp3. A recording whose content matches
+    a file already in the archive is recorded against that file and not
+    stored again.
+  - <out>/manifest.jsonl gets one line per archived recording and is
+    appended as files complete. A rerun skips every recording already in
+    the manifest whose file is present, so a killed job is restarted by
+    running the same command.
+  - --max-rate caps the combined download rate across all workers, e.g.
+    20M for 20 MB/s.
+
+Usage:
+    python recordings_archive.py --since 2025-07-01 --until 2025-07-31
+    python recordings_archive.py --agent owner@example.com --since 2025-07-01 --workers 16 --max-rate 20M
+    python recordings_archive.py --since 2025-07-01 --list    # print what would be fetched
+
+Requirements:
+    - TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN in .env file (same as the edge functions)
+    - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file (for --agent)
+    - RECORDINGS_ARCHIVE_DIR (default ./recordings) for the archive
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+import profiling
+import resilience
+import sync_metrics
+import transcripts_client
+from api_endpoints import twilio_api_base
+
+LIST_PAGE_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+MANIFEST = "manifest.jsonl"
+PARTIAL_DIR = ".partial"
+MAX_ATTEMPTS = 5
+# The fields UserAnalytics.tsx looks in for a call's Twilio SID
+CALL_SID_FIELDS = ("call_sid", "twilio_call_sid", "sid", "call_id", "external_id", "telephony_id")
+CALL_SID = re.compile(r"^CA[0-9a-f]{32}$")
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client"""
+    url = os.getenv("VITE_SUPABASE_URL") or os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if not url or not key:
+        raise ValueError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
+
+    return create_client(url, key)
+
+
+def parse_rate(value: str) -> float:
+    """'500K', '20M', '1.5G' or plain bytes per second."""
+    if not value:
+        return 0.0
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    value = value.strip().upper().rstrip("B")
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+class RateLimiter:
+    """Token bucket shared by all workers; one second of burst."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, n: int):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+# ------------------------------------------------------------------
+#  Manifest
+# ------------------------------------------------------------------
+class Manifest:
+    """Append-only JSONL of archived recordings; the last line per sid wins."""
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.path = os.path.join(out_dir, MANIFEST)
+        self.by_sid = {}
+        self.by_hash = {}
+        self.lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, entry: dict):
+        self.by_sid[entry["sid"]] = entry
+        self.by_hash.setdefault(entry["sha256"], entry["path"])
+
+    def has(self, sid: str) -> bool:
+        entry = self.by_sid.get(sid)
+        return bool(entry) and os.path.exists(os.path.join(self.out_dir, entry["path"]))
+
+    def path_for_hash(self, sha256: str):
+        with self.lock:
+            path = self.by_hash.get(sha256)
+        return path if path and os.path.exists(os.path.join(self.out_dir, path)) else None
+
+    def add(self, entry: dict):
+        with self.lock:
+            self._index(entry)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+# ------------------------------------------------------------------
+#  Listing
+# ------------------------------------------------------------------
+def twilio_auth():
+    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+    if not account_sid or not auth_token:
+        raise ValueError("TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN environment variables are required")
+    return account_sid, auth_token
+
+
+def _list_recordings(session, account_sid: str, params: dict):
+    url = f"{twilio_api_base()}/2010-04-01/Accounts/{account_sid}/Recordings.json"
+    params = {**params, "PageSize": LIST_PAGE_SIZE}
+    while url:
+        response = resilience.call("twilio", session.get, url, params=params, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        yield from data.get("recordings", [])
+        next_uri = data.get("next_page_uri")
+        # next_page_uri already carries the filters and the page token
+        url, params = (f"{twilio_api_base()}{next_uri}", None) if next_uri else (None, None)
+
+
+def recordings_in_range(session, account_sid: str, since: str, until: str = None):
+    """Every recording created on or after `since` and on or before `until` (YYYY-MM-DD)."""
+    params = {"DateCreated>": since}
+    if until:
+        params["DateCreated<"] = until
+    yield from _list_recordings(session, account_sid, params)
+
+
+def call_sid_of(transcript: dict):
+    for field in CALL_SID_FIELDS:
+        value = transcript.get(field)
+        if isinstance(value, str) and CALL_SID.match(value):
+            return value
+    return None
+
+
+def recordings_for_agent(session, account_sid: str, supabase: Client, agent_email: str,
+                         since: str = None, until: str = None):
+    """Recordings of the agent's calls, found through get-all-transcripts."""
+    filters = {"userEmail": agent_email}
+    if since:
+        filters["since"] = since
+    no_sid = 0
+    for transcript in transcripts_client.iter_transcripts(supabase, **filters):
+        if until and (transcript.get("start_time") or "")[:10] > until:
+            continue
+        call_sid = call_sid_of(transcript)
+        if not call_sid:
+            no_sid += 1
+            continue
+        yield from _list_recordings(session, account_sid, {"CallSid": call_sid})
+    if no_sid:
+        print(f"  ⚠️  {no_sid} calls had no Twilio call SID")
+
+
+# ------------------------------------------------------------------
+#  Download
+# ------------------------------------------------------------------
+def archive_path(recording: dict) -> str:
+    created = parsedate_to_datetime(recording["date_created"]) if recording.get("date_created") else None
+    created = created or datetime.now(timezone.utc)
+    return os.path.join(created.strftime("%Y"), created.strftime("%m"), created.strftime("%d"),
+                        f"{recording['sid']}.mp3")
+
+
+class Downloader:
+    def __init__(self, out_dir: str, manifest: Manifest, limiter: RateLimiter, account_sid: str, auth_token: str):
+        self.out_dir = out_dir
+        self.manifest = manifest
+        self.limiter = limiter
+        self.account_sid = account_sid
+        self.auth = (account_sid, auth_token)
+        self.local = threading.local()
+        self.counts = {"downloaded": 0, "resumed": 0, "deduplicated": 0, "failed": 0, "bytes": 0}
+        self.counts_lock = threading.Lock()
+        os.makedirs(os.path.join(out_dir, PARTIAL_DIR), exist_ok=True)
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            self.local.session.auth = self.auth
+        return self.local.session
+
+    def _count(self, key: str, n: int = 1):
+        with self.counts_lock:
+            self.counts[key] += n
+
+    def _fetch(self, url: str, partial: str) -> bool:
+        """Downloads into `partial`, resuming from its current size. Returns True when the file is complete."""
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        response = resilience.call("twilio", self._session().get, url, headers=headers, stream=True, timeout=60)
+        with response:
+            if response.status_code == 416:
+                # Nothing left past our offset: the partial file already holds everything
+                return True
+            response.raise_for_status()
+            if offset and response.status_code == 206:
+                self._count("resumed")
+                mode = "ab"
+            else:
+                offset, mode = 0, "wb"
+            expected = response.headers.get("Content-Length")
+            received = 0
+            with open(partial, mode) as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    self.limiter.consume(len(chunk))
+                    f.write(chunk)
+                    received += len(chunk)
+            self._count("bytes", received)
+            return expected is None or received == int(expected)
+
+    def download(self, recording: dict) -> str:
+        """Archives one recording; returns 'downloaded', 'deduplicated' or 'failed'."""
+        sid = recording["sid"]
+        url = f"{twilio_api_base()}/2010-04-01/Accounts/{self.account_sid}/Recordings/{sid}.mp3"
+        partial = os.path.join(self.out_dir, PARTIAL_DIR, f"{sid}.mp3.part")
+
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                if self._fetch(url, partial):
+                    break
+            except resilience.CircuitOpen:
+                raise
+            except (requests.RequestException, OSError) as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status is not None and 400 <= status < 500 and status not in (408, 429):
+                    print(f"  ❌ {sid}: {e}")
+                    self._count("failed")
+                    return "failed"
+            time.sleep(resilience.backoff(attempt))
+        else:
+            print(f"  ❌ {sid}: incomplete after {MAX_ATTEMPTS} attempts; the partial file is kept for the next run")
+            self._count("failed")
+            return "failed"
+
+        digest = hashlib.sha256()
+        with open(partial, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        size = os.path.getsize(partial)
+
+        existing = self.manifest.path_for_hash(sha256)
+        if existing:
+            os.remove(partial)
+            path, outcome = existing, "deduplicated"
+        else:
+            path, outcome = archive_path(recording), "downloaded"
+            target = os.path.join(self.out_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(partial, target)
+
+        self.manifest.add({
+            "sid": sid,
+            "call_sid": recording.get("call_sid"),
+            "date_created": recording.get("date_created"),
+            "duration": recording.get("duration"),
+            "sha256": sha256,
+            "size": size,
+            "path": path,
+            "archived_at": datetime.now(timezone.utc).isoformat(),
+        })
+        self._count(outcome)
+        return outcome
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download Twilio call recordings into a local archive")
+    parser.add_argument("--since", help="first day (YYYY-MM-DD)")
+    parser.add_argument("--until", help="last day (YYYY-MM-DD), inclusive")
+    parser.add_argument("--agent", help="only this agent's calls (its owner email, as in get-all-transcripts)")
+    parser.add_argument("--out", default=os.getenv("RECORDINGS_ARCHIVE_DIR", "recordings"))
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-rate", help="combined download cap in bytes/s, e.g. 500K or 20M")
+    parser.add_argument("--list", action="store_true", help="print the recordings that would be fetched and exit")
+    args = parser.parse_args(argv)
+
+    if not args.since and not args.agent:
+        parser.error("pass --since (and optionally --until), --agent, or both")
+
+    print("🚀 Archiving call recordings...\n")
+    load_dotenv()
+    sync_metrics.install("recordings_archive")
+
+    try:
+        account_sid, auth_token = twilio_auth()
+        os.makedirs(args.out, exist_ok=True)
+        manifest = Manifest(args.out)
+
+        session = requests.Session()
+        session.auth = (account_sid, auth_token)
+        with sync_metrics.stage("list"):
+            if args.agent:
+                source = recordings_for_agent(session, account_sid, get_supabase_client(), args.agent,
+                                              args.since, args.until)
+            else:
+                source = recordings_in_range(session, account_sid, args.since, args.until)
+            recordings = {r["sid"]: r for r in source}
+
+        pending = [r for sid, r in recordings.items() if not manifest.has(sid)]
+        print(f"📋 {len(recordings)} recordings listed, {len(recordings) - len(pending)} already archived, "
+              f"{len(pending)} to fetch")
+        if args.list:
+            for r in pending:
+                print(f"  {r['sid']}  {r.get('call_sid')}  {r.get('date_created')}  {r.get('duration')}s")
+            return 0
+        if not pending:
+            print("✅ Nothing to do.")
+            return 0
+
+        downloader = Downloader(args.out, manifest, RateLimiter(parse_rate(args.max_rate)), account_sid, auth_token)
+        started = time.perf_counter()
+        with sync_metrics.stage("download"), ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(downloader.download, r) for r in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if done % 50 == 0 or done == len(futures):
+                    elapsed = time.perf_counter() - started
+                    print(f"  {done}/{len(futures)}  {downloader.counts['bytes'] / 2**20:.1f} MiB  "
+                          f"{downloader.counts['bytes'] / 2**20 / max(elapsed, 1e-9):.1f} MiB/s")
+
+        counts = downloader.counts
+        print("\n📊 Archive Results:")
+        print(f"  ✅ Downloaded: {counts['downloaded']} ({counts['resumed']} resumed)")
+        print(f"  🔁 Duplicate content, not stored again: {counts['deduplicated']}")
+        print(f"  ❌ Failed: {counts['failed']}")
+        print(f"  📦 {counts['bytes'] / 2**20:.1f} MiB in {time.perf_counter() - started:.1f}s → {args.out}")
+        return 1 if counts["failed"] else 0
+    except Exception as e:
+        print(f"❌ An unexpected error occurred: {e}")
+        raise
+    finally:
+        sync_metrics.write_summary()
+
+
+if __name__ == "__main__":
+    sys.exit(profiling.run("recordings_archive", main))
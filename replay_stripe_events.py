@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Stripe Events Catch-up Script
+
+Replays the Stripe events the stripe-webhooks function may have missed.
+Pages through stripe.Event.list from a stored cursor, coalesces every
+customer.subscription.* and invoice.payment_succeeded event down to the
+latest state per customer, and applies the result in one batched write per
+table, so recovering from a webhook outage costs O(events) instead of a
+full sync_stripe_data.py rescan.
+
+The cursor (created timestamp + ids of the events seen at that second) is
+kept in STRIPE_EVENTS_CURSOR_FILE. Without a cursor the first run only
+records the current position; run sync_stripe_data.py once for the
+baseline, or pass --since to replay from a date. Stripe keeps events for
+30 days, so an older cursor also needs a full sync.
+
+Usage:
+    python replay_stripe_events.py
+    python replay_stripe_events.py --since 2025-08-01
+    python replay_stripe_events.py --plan    # print the changed rows, write nothing
+
+Requirements:
+    - STRIPE_SECRET_KEY in .env file
+    - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import stripe
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+import profiling
+import resilience
+import sync_diff
+import sync_metrics
+from api_endpoints import configure_stripe
+
+EVENT_TYPES = [
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+    "invoice.payment_succeeded",
+]
+ACTIVE_STATUSES = ("active", "trialing", "past_due")
+EVENT_RETENTION_DAYS = 30
+WRITE_CHUNK_SIZE = 500
+# Up to this many customers (or invoices) rows are looked up by key; beyond
+# it one paged read of the whole table is fewer requests.
+TARGETED_LOOKUP_MAX = 1000
+LOOKUP_CHUNK_SIZE = 200
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client"""
+    url = os.getenv("VITE_SUPABASE_URL") or os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if not url or not key:
+        raise ValueError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
+
+    return create_client(url, key)
+
+
+# ------------------------------------------------------------------
+#  Cursor
+# ------------------------------------------------------------------
+def cursor_path() -> str:
+    return os.getenv("STRIPE_EVENTS_CURSOR_FILE", "stripe_events_cursor.json")
+
+
+def load_cursor() -> dict:
+    try:
+        with open(cursor_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_cursor(cursor: dict):
+    tmp = cursor_path() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cursor, f)
+    os.replace(tmp, cursor_path())
+
+
+def advance_cursor(cursor: dict, events: list) -> dict:
+    """The cursor moves to the newest event; ids at that second are kept to skip them next time."""
+    if not events:
+        return cursor
+    newest = max(e["created"] for e in events)
+    seen = {e["id"] for e in events if e["created"] == newest}
+    if cursor and cursor["created"] == newest:
+        seen.update(cursor.get("event_ids", []))
+    return {"created": newest, "event_ids": sorted(seen)}
+
+
+# ------------------------------------------------------------------
+#  Fetch + coalesce
+# ------------------------------------------------------------------
+def fetch_events(since: int, skip_ids=()) -> list:
+    """
+    All matching events created at or after `since`, oldest first. Each page
+    goes through the stripe breaker; CircuitOpen leaves the cursor where it was.
+    """
+    skip_ids = set(skip_ids)
+    events = []
+    starting_after = None
+    while True:
+        page = resilience.call("stripe", stripe.Event.list, types=EVENT_TYPES, created={"gte": since},
+                               limit=100, starting_after=starting_after)
+        events.extend(event for event in page.data if event["id"] not in skip_ids)
+        if not page.has_more or not page.data:
+            break
+        starting_after = page.data[-1].id
+    # Stripe lists newest first; ties within a second keep list order reversed
+    events.reverse()
+    events.sort(key=lambda e: e["created"])
+    return events
+
+
+def coalesce(events: list):
+    """
+    Folds the events (oldest first) into the latest state per customer.
+    Returns ({customer: {subscription_id: subscription}},
+             {customer: [paid invoices]}).
+    """
+    subscriptions = {}
+    invoices = {}
+    for event in events:
+        obj = event["data"]["object"]
+        customer = obj.get("customer")
+        if not customer:
+            continue
+        if event["type"].startswith("customer.subscription."):
+            subscriptions.setdefault(customer, {})[obj["id"]] = obj
+        else:
+            invoices.setdefault(customer, {})[obj["id"]] = obj
+    return subscriptions, {c: list(by_id.values()) for c, by_id in invoices.items()}
+
+
+def pick_subscription(subs: dict):
+    """Same choice as sync_stripe_data.py: an active one first, else the most recent."""
+    ordered = sorted(subs.values(), key=lambda s: s.get("created") or 0, reverse=True)
+    active = [s for s in ordered if s["status"] in ACTIVE_STATUSES]
+    return (active or ordered)[0]
+
+
+def _paid_at(invoice) -> int:
+    transitions = invoice.get("status_transitions") or {}
+    return transitions.get("paid_at") or invoice["created"]
+
+
+def desired_columns(subscription, paid_invoices: list, product_names: dict) -> dict:
+    """The subscription columns the coalesced state implies for one customer."""
+    data = {}
+    if subscription:
+        data["subscription_status"] = subscription["status"]
+        items = (subscription.get("items") or {}).get("data") or []
+        if items:
+            price = items[0]["price"]
+            data["subscription_plan"] = price.get("nickname") or price["id"]
+            product = price.get("product")
+            if product:
+                data["subscription_product"] = product_names.get(product, product)
+    if paid_invoices:
+        latest = max(_paid_at(inv) for inv in paid_invoices)
+        data["last_payment_date"] = datetime.fromtimestamp(latest, tz=timezone.utc).strftime("%Y-%m-%d")
+    return data
+
+
+def product_names_for(subscriptions: dict, known: dict = None) -> dict:
+    """One Product.retrieve per distinct product, not per event; `known` names are reused and extended."""
+    product_ids = set()
+    for subs in subscriptions.values():
+        for sub in subs.values():
+            for item in (sub.get("items") or {}).get("data") or []:
+                product = item["price"].get("product")
+                if isinstance(product, str):
+                    product_ids.add(product)
+    names = {} if known is None else known
+    for product_id in product_ids - set(names):
+        try:
+            names[product_id] = resilience.call("stripe", stripe.Product.retrieve, product_id).name
+        except resilience.CircuitOpen:
+            raise
+        except Exception as e:
+            print(f"  ⚠️  Could not retrieve product {product_id}: {e}")
+    return names
+
+
+# ------------------------------------------------------------------
+#  Apply
+# ------------------------------------------------------------------
+def select_in(supabase: Client, table: str, columns: str, column: str, values) -> list:
+    """Rows whose `column` is one of `values`, in chunks that keep the URL short."""
+    values = sorted(values)
+    rows = []
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+        rows.extend(supabase.table(table).select(columns).in_(column, chunk).execute().data or [])
+    return rows
+
+
+def _like_literal(value: str) -> str:
+    """Escapes LIKE wildcards so that ilike matches `value` exactly, ignoring case."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def match_clients(supabase: Client, customers: set) -> dict:
+    """
+    Maps Stripe customer ids to client rows: by stripe_customer_id first,
+    then by email (one Customer.retrieve per unlinked customer, as the webhook does).
+    A small set of customers is looked up by key instead of reading every client.
+    """
+    columns = ",".join(("id", "clerk_id", "name", "email", "stripe_customer_id") + sync_diff.SUBSCRIPTION_FIELDS)
+    targeted = len(customers) <= TARGETED_LOOKUP_MAX
+    if targeted:
+        rows = select_in(supabase, "clients", columns, "stripe_customer_id", customers)
+    else:
+        rows = sync_diff.fetch_all_rows(supabase, "clients", columns)
+    by_stripe = {r["stripe_customer_id"]: r for r in rows if r.get("stripe_customer_id")}
+
+    matched = {}
+    emails = {}
+    for customer_id in customers:
+        client = by_stripe.get(customer_id)
+        if client is not None:
+            matched[customer_id] = client
+            continue
+        try:
+            customer = resilience.call("stripe", stripe.Customer.retrieve, customer_id)
+        except resilience.CircuitOpen:
+            raise
+        except Exception as e:
+            print(f"  ⚠️  Could not retrieve customer {customer_id}: {e}")
+            continue
+        if customer.get("deleted") or not customer.get("email"):
+            continue
+        emails[customer_id] = customer["email"]
+
+    if emails:
+        if targeted:
+            # in_ is case-sensitive; the stored address is usually as Stripe has it or lower-case
+            candidates = {e for email in emails.values() for e in (email, email.lower())}
+            rows = select_in(supabase, "clients", columns, "email", candidates)
+        by_email = {r["email"].lower(): r for r in rows if r.get("email")}
+        if targeted:
+            # Any other casing: one ilike per address the batch lookup missed
+            for email in {e.lower() for e in emails.values()} - set(by_email):
+                found = (supabase.table("clients").select(columns)
+                         .ilike("email", _like_literal(email)).limit(1).execute().data or [])
+                if found:
+                    by_email[email] = found[0]
+        for customer_id, email in emails.items():
+            client = by_email.get(email.lower())
+            if client is not None:
+                matched[customer_id] = client
+    return matched
+
+
+def load_invoices(supabase: Client, invoice_ids: set) -> dict:
+    """{stripe_invoice_id: row} for the ids that are already synced."""
+    if len(invoice_ids) > TARGETED_LOOKUP_MAX:
+        return sync_diff.load_invoices(supabase)
+    rows = select_in(supabase, "invoices", "id,stripe_invoice_id", "stripe_invoice_id", invoice_ids)
+    return {row["stripe_invoice_id"]: row for row in rows}
+
+
+def _write_in_chunks(supabase: Client, table: str, rows: list, **upsert_options):
+    for start in range(0, len(rows), WRITE_CHUNK_SIZE):
+        supabase.table(table).upsert(rows[start:start + WRITE_CHUNK_SIZE], **upsert_options).execute()
+
+
+def apply_changes(supabase: Client, client_changes: list, invoice_rows: list):
+    """
+    Writes [(client_id, changes)] as updates of only the changed columns, so a
+    column edited since the clients were loaded keeps its new value; clients
+    with the same changes share one update. (An upsert of just those columns
+    would fail: Postgres checks NOT NULL columns such as clients.name on the
+    proposed insert row before ON CONFLICT applies.) Invoices are one batched
+    upsert.
+    """
+    groups = {}
+    for client_id, changes in client_changes:
+        groups.setdefault(tuple(sorted(changes.items())), []).append(client_id)
+    for changes, ids in groups.items():
+        for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+            supabase.table("clients").update(dict(changes)).in_("id", ids[start:start + LOOKUP_CHUNK_SIZE]).execute()
+    if invoice_rows:
+        _write_in_chunks(supabase, "invoices", invoice_rows,
+                         on_conflict="stripe_invoice_id", ignore_duplicates=True)
+
+
+def replay(supabase: Client, events: list, plan: bool = False, product_names: dict = None) -> dict:
+    """
+    Applies the coalesced events. `product_names` is a {product_id: name}
+    cache that is filled in and can be passed again on the next call.
+    """
+    subscriptions, invoices = coalesce(events)
+    customers = set(subscriptions) | set(invoices)
+    print(f"  {len(events)} events → {len(customers)} customers")
+
+    with sync_metrics.stage("match"):
+        product_names = product_names_for(subscriptions, product_names)
+        clients = match_clients(supabase, customers)
+        invoice_ids = {inv["id"] for paid in invoices.values() for inv in paid}
+        existing_invoices = load_invoices(supabase, invoice_ids) if invoice_ids else {}
+
+    client_changes, invoice_rows, planned = [], [], []
+    for customer_id in sorted(customers):
+        client = clients.get(customer_id)
+        if client is None:
+            continue
+        subs = subscriptions.get(customer_id)
+        paid = invoices.get(customer_id, [])
+        desired = desired_columns(pick_subscription(subs) if subs else None, paid, product_names)
+        desired["stripe_customer_id"] = customer_id
+
+        changes = sync_diff.diff_fields(client, desired)
+        if changes:
+            planned.append((f"{client.get('name')} ({client.get('email')})", client, changes))
+            client_changes.append((client["id"], changes))
+
+        for inv in paid:
+            if inv["id"] in existing_invoices:
+                continue
+            invoice_rows.append({
+                "client_id": client["id"],
+                "stripe_invoice_id": inv["id"],
+                "amount_paid": (inv.get("amount_paid") or 0) / 100.0,
+                "created_at": datetime.fromtimestamp(inv["created"], tz=timezone.utc).isoformat(),
+                "status": inv.get("status") or "paid",
+                "invoice_pdf": inv.get("invoice_pdf"),
+            })
+
+    if plan:
+        sync_diff.print_plan(planned, {"invoices": len(invoice_rows)})
+    else:
+        with sync_metrics.stage("write"):
+            apply_changes(supabase, client_changes, invoice_rows)
+
+    return {
+        "events": len(events),
+        "customers": len(customers),
+        "unmatched": len(customers) - len(clients),
+        "clients_updated": len(client_changes),
+        "invoices_inserted": len(invoice_rows),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay missed Stripe subscription/invoice events into Supabase")
+    parser.add_argument("--since", help="replay from this date (YYYY-MM-DD) instead of the stored cursor")
+    parser.add_argument("--plan", action="store_true", help="print the changed rows instead of writing them")
+    args = parser.parse_args(argv)
+
+    print("🚀 Replaying Stripe events...\n")
+    load_dotenv()
+    sync_metrics.install("replay_stripe_events")
+
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    configure_stripe(stripe)
+
+    try:
+        cursor = load_cursor()
+        if args.since:
+            since = int(datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+            cursor = {"created": since, "event_ids": []}
+        elif cursor is None:
+            save_cursor({"created": int(time.time()), "event_ids": []})
+            print(f"ℹ️  No cursor found; recorded the current position in {cursor_path()}.")
+            print("   Run sync_stripe_data.py for the baseline, or pass --since to replay from a date.")
+            return
+
+        age_days = (time.time() - cursor["created"]) / 86400
+        if age_days > EVENT_RETENTION_DAYS:
+            print(f"⚠️  Cursor is {age_days:.0f} days old; Stripe only keeps {EVENT_RETENTION_DAYS} days of events.")
+            print("   Run sync_stripe_data.py for a full sync, then replay with --since.")
+            return 1
+
+        with sync_metrics.stage("fetch_events"):
+            events = fetch_events(cursor["created"], cursor.get("event_ids", []))
+        if not events:
+            print("✅ No new events.")
+            return
+
+        supabase = get_supabase_client()
+        result = replay(supabase, events, plan=args.plan)
+
+        print("\n📊 Replay Results:")
+        print(f"  📨 Events: {result['events']} for {result['customers']} customers")
+        print(f"  ✅ Clients updated: {result['clients_updated']}")
+        print(f"  🧾 Invoices inserted: {result['invoices_inserted']}")
+        print(f"  ⚠️  No matching client: {result['unmatched']}")
+
+        if not args.plan:
+            save_cursor(advance_cursor(cursor, events))
+            print(f"\n🎉 Cursor advanced to {datetime.fromtimestamp(events[-1]['created'], tz=timezone.utc).isoformat()}")
+    except Exception as e:
+        print(f"❌ An unexpected error occurred: {e}")
+        raise
+    finally:
+        sync_metrics.write_summary()
+
+
+if __name__ == "__main__":
+    sys.exit(profiling.run("replay_stripe_events", main))
@@ -0,0 +1,199 @@
+"""
+Retry and circuit-breaker policy for calls to Stripe, Clerk and HubSpot.
+
+The fetchers used to catch every exception and move on to the next item, so
+an expired key or an outage cost one full timeout per customer. Wrapping each
+read in resilience.call() gives them:
+
+  - bounded exponential backoff with full jitter for transient failures
+    (connection errors, timeouts, 429 and 5xx), for idempotent reads only;
+  - one circuit breaker per source. It opens after FAILURE_THRESHOLD
+    consecutive failed attempts, or straight away on 401/403. While it is
+    open every call raises CircuitOpen without touching the network, so the
+    caller aborts that source within seconds. After COOLDOWN seconds one
+    trial call is let through (half-open); its outcome closes or re-opens it.
+
+Usage:
+    import resilience
+
+    resp = resilience.call("clerk", session.get, url, params=params, timeout=30)
+    subs = resilience.call("stripe", stripe.Subscription.list, customer=cid)
+
+Callers that catch Exception per item must re-raise CircuitOpen so a tripped
+source stops the loop instead of failing every remaining item.
+
+Tuning (environment):
+    RESILIENCE_MAX_RETRIES        retries per idempotent call (default 2)
+    RESILIENCE_FAILURE_THRESHOLD  consecutive failed attempts that trip (default 3)
+    RESILIENCE_COOLDOWN           seconds before a half-open trial (default 60)
+"""
+
+import os
+import random
+import threading
+import time
+
+import sync_metrics
+
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+TRANSIENT = "transient"
+AUTH = "auth"
+PERMANENT = "permanent"
+
+# Exception class names from requests/urllib3 and the Stripe SDK that mean
+# the request never got a usable answer
+_TRANSIENT_ERRORS = {
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "ChunkedEncodingError",
+    "APIConnectionError", "RateLimitError", "TimeoutError", "ConnectionResetError",
+}
+_AUTH_ERRORS = {"AuthenticationError", "PermissionError"}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a source whose breaker is open."""
+
+    def __init__(self, source: str, reason: str):
+        super().__init__(f"{source} circuit open ({reason})")
+        self.source = source
+        self.reason = reason
+
+
+def _status_of(obj):
+    """HTTP status of a response or an HTTP error, if it carries one."""
+    status = getattr(obj, "status_code", None) or getattr(obj, "http_status", None)
+    if status is None and getattr(obj, "response", None) is not None:
+        status = getattr(obj.response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_status(status) -> str:
+    if status in (401, 403):
+        return AUTH
+    if status == 429 or (status is not None and status >= 500):
+        return TRANSIENT
+    return PERMANENT
+
+
+def classify_error(exc: BaseException) -> str:
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & _AUTH_ERRORS:
+        return AUTH
+    status = _status_of(exc)
+    if status is not None:
+        return classify_status(status)
+    if names & _TRANSIENT_ERRORS:
+        return TRANSIENT
+    return PERMANENT
+
+
+class CircuitBreaker:
+    def __init__(self, source: str, threshold: int, cooldown: float):
+        self.source = source
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.reason = ""
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial_running:
+                raise CircuitOpen(self.source, self.reason)
+            self.trial_running = True
+
+    def success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                print(f"✅ {self.source}: circuit closed again")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def failure(self, kind: str, detail: str):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if kind == AUTH or self.failures >= self.threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    print(f"⚠️  {self.source}: circuit open after {self.failures} failure(s): {detail}")
+                self.reason = detail
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(source: str) -> CircuitBreaker:
+    with _breakers_lock:
+        b = _breakers.get(source)
+        if b is None:
+            b = _breakers[source] = CircuitBreaker(
+                source,
+                threshold=int(os.getenv("RESILIENCE_FAILURE_THRESHOLD", 3)),
+                cooldown=float(os.getenv("RESILIENCE_COOLDOWN", 60)),
+            )
+        return b
+
+
+def reset():
+    """Forgets every breaker (for long-running processes between jobs)."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential delay for the given retry (0-based)."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def call(source: str, fn, *args, idempotent: bool = True, endpoint: str = "", **kwargs):
+    """
+    Calls fn(*args, **kwargs) under the source's breaker. Exceptions and
+    responses with a 429/5xx status are retried when idempotent; 401/403
+    trips the breaker at once. Returns fn's result; raises CircuitOpen when
+    the source is (or becomes) unavailable, or the last error otherwise.
+    A final 4xx response is returned to the caller as-is.
+    """
+    b = breaker(source)
+    retries = int(os.getenv("RESILIENCE_MAX_RETRIES", 2)) if idempotent else 0
+    endpoint = endpoint or getattr(fn, "__qualname__", "call")
+
+    for attempt in range(retries + 1):
+        b.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == PERMANENT:
+                # The source answered; the request itself was wrong
+                b.success()
+                raise
+            b.failure(kind, f"{type(e).__name__}: {e}")
+            if kind == AUTH or b.is_open:
+                raise CircuitOpen(source, b.reason) from e
+            if attempt == retries:
+                raise
+        else:
+            kind = classify_status(_status_of(result))
+            if kind == PERMANENT:
+                b.success()
+                return result
+            b.failure(kind, f"HTTP {_status_of(result)}")
+            if kind == AUTH or b.is_open:
+                raise CircuitOpen(source, b.reason)
+            if attempt == retries:
+                return result
+
+        sync_metrics.record_retry(source, endpoint)
+        time.sleep(backoff(attempt))
@@ -1,6 +1,8 @@
 @echo off
 REM Batch script to run the user activity update script
-REM This can be scheduled to run periodically using Windows Task Scheduler
+REM This can be scheduled to run periodically using Windows Task Scheduler.
+REM It goes through scheduler.py so it never overlaps a run already in progress;
+REM to keep every job running from one warm process use: python scheduler.py
 
 echo Starting user activity update...
 echo.
@@ -8,8 +10,8 @@ echo.
 REM Change to the script directory
 cd /d "%~dp0"
 
-REM Run the Python script
-python update_user_activity.py
+REM Run the activity job under its lock
+python scheduler.py --run activity
 
 REM Check if the script ran successfully
 if %ERRORLEVEL% EQU 0 (
@@ -22,4 +24,4 @@ if %ERRORLEVEL% EQU 0 (
 
 echo.
 echo Press any key to exit...
-pause >nul
\ No newline at end of file
+pause >nul
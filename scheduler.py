@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Sync Job Scheduler
+
+Long-running replacement for run_activity_update.bat and the cron entries.
+It runs the activity, Stripe and Clerk jobs in one warm process:
+
+  - each job has an interval (with random jitter so instances and jobs do
+    not fire in lockstep);
+  - the job modules are imported once, and their Supabase clients and HTTP
+    sessions are reused from run to run;
+  - every run holds a per-job file lock, so a job never overlaps with itself,
+    whether the other run is in a second scheduler or a one-off --run;
+  - every run (or skipped run) is appended to run_history.jsonl, and
+    --status prints duration percentiles per job for capacity planning.
+
+Jobs run one at a time; a long job delays the others rather than competing
+with them for the same rate limits.
+
+Usage:
+    python scheduler.py                         # run every job forever
+    python scheduler.py --jobs activity,stripe_events
+    python scheduler.py --run stripe_full       # one locked run, then exit
+    python scheduler.py --status
+
+Requirements:
+    - The .env used by the individual jobs
+    - SCHEDULER_STATE_DIR (default ./scheduler_state) for locks and history
+    - SCHEDULE_<JOB>_INTERVAL (seconds) to override a job's interval
+"""
+
+import argparse
+import functools
+import importlib
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+import profiling
+
+# name: (module, argv for module.main or None when main() takes no arguments, default interval)
+JOBS = {
+    "activity": ("update_user_activity", None, 3600),
+    "stripe_events": ("replay_stripe_events", [], 900),
+    "stripe_full": ("sync_stripe_data", [], 86400),
+    "clerk": ("add_clerk_users_to_system", [], 6 * 3600),
+}
+JITTER = 0.1            # +/- fraction of the interval
+HISTORY_FILE = "run_history.jsonl"
+
+_stop = threading.Event()
+
+
+def state_dir() -> str:
+    directory = os.getenv("SCHEDULER_STATE_DIR", "scheduler_state")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def interval_of(job: str) -> float:
+    return float(os.getenv(f"SCHEDULE_{job.upper()}_INTERVAL", JOBS[job][2]))
+
+
+def jittered(seconds: float) -> float:
+    return seconds * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+# ------------------------------------------------------------------
+#  Lease
+# ------------------------------------------------------------------
+class JobLease:
+    """
+    Non-blocking exclusive lock on scheduler_state/<job>.lock. The OS drops
+    it when the process dies, so a crashed run never leaves a stale lease.
+    """
+
+    def __init__(self, job: str):
+        self.path = os.path.join(state_dir(), f"{job}.lock")
+        self.fh = None
+
+    def acquire(self) -> bool:
+        self.fh = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self.fh.seek(0)
+                msvcrt.locking(self.fh.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.fh.close()
+            self.fh = None
+            return False
+        self.fh.seek(0)
+        self.fh.truncate()
+        self.fh.write(f"{os.getpid()} {datetime.now(timezone.utc).isoformat()}\n")
+        self.fh.flush()
+        return True
+
+    def release(self):
+        if self.fh is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self.fh.seek(0)
+                msvcrt.locking(self.fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            self.fh.close()
+            self.fh = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+# ------------------------------------------------------------------
+#  Jobs
+# ------------------------------------------------------------------
+_modules = {}
+
+
+def load_job(job: str):
+    """Imports the job's module once and keeps its clients warm between runs."""
+    module_name = JOBS[job][0]
+    if module_name not in _modules:
+        module = importlib.import_module(module_name)
+        if hasattr(module, "get_supabase_client"):
+            module.get_supabase_client = functools.lru_cache(maxsize=1)(module.get_supabase_client)
+        _modules[module_name] = module
+    return _modules[module_name]
+
+
+def _warm_shared_sessions():
+    """One HTTP session (and cache connection) for all runs instead of one per fetch."""
+    import http_cache
+    http_cache.get_session = functools.lru_cache(maxsize=1)(http_cache.get_session)
+
+
+def record_run(entry: dict):
+    with open(os.path.join(state_dir(), HISTORY_FILE), "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def run_job(job: str) -> dict:
+    """One run under the job's lease. Returns the history entry."""
+    started = time.time()
+    entry = {"job": job, "started_at": datetime.fromtimestamp(started, tz=timezone.utc).isoformat()}
+
+    with JobLease(job) as acquired:
+        if not acquired:
+            print(f"⏭️  {job}: another run holds the lease, skipping")
+            entry.update(status="skipped", duration_s=0.0)
+            record_run(entry)
+            return entry
+
+        print(f"\n🚀 {job}: starting")
+        t0 = time.perf_counter()
+        try:
+            module = load_job(job)
+            argv = JOBS[job][1]
+            code = module.main() if argv is None else module.main(list(argv))
+            status = "ok" if not code else "failed"
+            error = None if not code else f"exit code {code}"
+        except SystemExit as e:
+            status = "ok" if not e.code else "failed"
+            error = None if not e.code else f"exit code {e.code}"
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+
+        entry.update(status=status, duration_s=round(time.perf_counter() - t0, 3))
+        if error:
+            entry["error"] = error
+        record_run(entry)
+
+    icon = "✅" if entry["status"] == "ok" else "❌"
+    print(f"{icon} {job}: {entry['status']} in {entry['duration_s']:.1f}s" + (f" ({error})" if error else ""))
+    return entry
+
+
+def serve(jobs: list):
+    _warm_shared_sessions()
+    # Spread the first runs out instead of firing everything at start-up
+    next_run = {job: time.time() + random.uniform(0, min(60, interval_of(job) * JITTER)) for job in jobs}
+    print(f"🕒 Scheduling {', '.join(f'{j} every {interval_of(j):.0f}s' for j in jobs)}")
+
+    while not _stop.is_set():
+        job = min(next_run, key=next_run.get)
+        wait = next_run[job] - time.time()
+        if wait > 0:
+            _stop.wait(wait)
+            continue
+        run_job(job)
+        next_run[job] = time.time() + jittered(interval_of(job))
+
+    print("👋 Scheduler stopped")
+
+
+# ------------------------------------------------------------------
+#  History
+# ------------------------------------------------------------------
+def load_history() -> list:
+    path = os.path.join(state_dir(), HISTORY_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def print_status(history: list, last: int = 50):
+    """Per-job run counts and duration percentiles over the last `last` runs."""
+    if not history:
+        print("No runs recorded yet.")
+        return
+    print(f"{'job':15} {'runs':>5} {'failed':>6} {'skipped':>7} {'p50 s':>8} {'p95 s':>8} {'max s':>8}  last run")
+    for job in sorted({e["job"] for e in history}):
+        runs = [e for e in history if e["job"] == job][-last:]
+        durations = [e["duration_s"] for e in runs if e["status"] != "skipped"]
+        failed = sum(e["status"] == "failed" for e in runs)
+        skipped = sum(e["status"] == "skipped" for e in runs)
+        p50, p95, top = ((percentile(durations, 0.5), percentile(durations, 0.95), max(durations))
+                         if durations else (0.0, 0.0, 0.0))
+        print(f"{job:15} {len(runs):>5} {failed:>6} {skipped:>7} {p50:>8.1f} {p95:>8.1f} {top:>8.1f}  "
+              f"{runs[-1]['started_at']} ({runs[-1]['status']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the sync jobs on intervals with per-job locks")
+    parser.add_argument("--jobs", default=",".join(JOBS), help=f"comma-separated subset of {', '.join(JOBS)}")
+    parser.add_argument("--run", choices=sorted(JOBS), help="run one job once under its lease and exit")
+    parser.add_argument("--status", action="store_true", help="print the run-duration history and exit")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+
+    if args.status:
+        print_status(load_history())
+        return 0
+    if args.run:
+        return 0 if run_job(args.run)["status"] != "failed" else 1
+
+    jobs = [j.strip() for j in args.jobs.split(",") if j.strip()]
+    unknown = [j for j in jobs if j not in JOBS]
+    if unknown:
+        parser.error(f"unknown job(s): {', '.join(unknown)}")
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: _stop.set())
+    serve(jobs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(profiling.run("scheduler", main))
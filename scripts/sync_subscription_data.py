@@ -1,10 +1,25 @@
 import os
+import random
+import sys
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from hubspot import HubSpot
 import stripe
-from typing import Dict, Tuple
+from typing import Dict, Iterable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache  # noqa: E402
+import profiling  # noqa: E402
+import resilience  # noqa: E402
+import sync_metrics  # noqa: E402
+from sync_records import NOT_IN_STRIPE, Contact, Invoice, SubscriptionSummary  # noqa: E402
+from api_endpoints import clerk_api_base, configure_stripe, hubspot_api_base  # noqa: E402
+
+HUBSPOT_BATCH_SIZE = 100        # hard limit of the CRM batch endpoints
+HUBSPOT_MAX_WORKERS = 4         # stays well inside the 100 req / 10 s app limit
+HUBSPOT_MAX_RETRIES = 5
 
 # ------------------------------------------------------------------
 #  Helpers
@@ -20,7 +35,7 @@ def normalise_phone(raw: str) -> str:
 # ------------------------------------------------------------------
 #  Clerk
 # ------------------------------------------------------------------
-def fetch_all_clerk_contacts() -> Dict[str, Tuple[str, str]]:
+def fetch_all_clerk_contacts() -> Dict[str, Contact]:
     """
     Returns {email: (email, phone)} for every Clerk user.
     """
@@ -28,12 +43,14 @@ def fetch_all_clerk_contacts() -> Dict[str, Tuple[str, str]]:
     api_key = os.getenv("CLERK_SECRET_KEY")
     headers = {"Authorization": f"Bearer " + api_key, "Content-Type": "application/json"}
 
-    contacts: Dict[str, Tuple[str, str]] = {}
+    contacts: Dict[str, Contact] = {}
     offset, limit = 0, 100
+    session = http_cache.get_session()
 
     while True:
-        resp = requests.get(
-            "https://api.clerk.com/v1/users",
+        resp = resilience.call(
+            "clerk", session.get,
+            f"{clerk_api_base()}/users",
             headers=headers,
             params={"limit": limit, "offset": offset},
             timeout=30,
@@ -59,69 +76,87 @@ def fetch_all_clerk_contacts() -> Dict[str, Tuple[str, str]]:
             phone = normalise_phone((phone_obj or {}).get("phone_number"))
 
             if email:
-                contacts[email] = (email, phone)
+                contacts[email] = Contact(email, phone)
 
         offset += limit
         print(f"  Fetched {len(users)} users (offset → {offset})")
 
     print(f"✅ Found {len(contacts)} Clerk users.")
+    if http_cache.describe(session):
+        print(http_cache.describe(session))
     return contacts
 
 
 # ------------------------------------------------------------------
 #  HubSpot
 # ------------------------------------------------------------------
-def fetch_all_hubspot_contacts() -> Dict[str, Tuple[str, str]]:
+def fetch_all_hubspot_contacts() -> Dict[str, Contact]:
     """
     Returns {email: (email, phone)} for every HubSpot contact.
     """
     print("Fetching contacts from HubSpot...")
-    client = HubSpot(access_token=os.getenv("HUBSPOT_ACCESS_TOKEN"))
+    headers = {"Authorization": f"Bearer {os.getenv('HUBSPOT_ACCESS_TOKEN')}"}
+    params = {"limit": 100, "properties": "email,phone,mobilephone"}
+    session = http_cache.get_session()
 
-    contacts: Dict[str, Tuple[str, str]] = {}
+    contacts: Dict[str, Contact] = {}
     try:
-        for c in client.crm.contacts.get_all(
-            properties=["email", "phone", "mobilephone"]
-        ):
-            email = (c.properties.get("email") or "").lower()
-            phone = normalise_phone(
-                c.properties.get("phone") or c.properties.get("mobilephone") or ""
-            )
-            if email:
-                contacts[email] = (email, phone)
+        # Page through the CRM list endpoint directly so pages can come from the cache
+        while True:
+            resp = resilience.call("hubspot", session.get, f"{hubspot_api_base()}/crm/v3/objects/contacts",
+                                   headers=headers, params=params, timeout=30)
+            resp.raise_for_status()
+            data = resp.json()
+
+            for c in data.get("results", []):
+                props = c.get("properties") or {}
+                email = (props.get("email") or "").lower()
+                phone = normalise_phone(props.get("phone") or props.get("mobilephone") or "")
+                if email:
+                    contacts[email] = Contact(email, phone)
+
+            after = ((data.get("paging") or {}).get("next") or {}).get("after")
+            if not after:
+                break
+            params["after"] = after
     except Exception as e:
         print(f"❌ HubSpot error: {e}")
         return {}
 
     print(f"✅ Found {len(contacts)} HubSpot contacts.")
+    if http_cache.describe(session):
+        print(http_cache.describe(session))
     return contacts
 
 
 # ------------------------------------------------------------------
 #  Stripe
 # ------------------------------------------------------------------
-def fetch_all_stripe_summary() -> Dict[str, Tuple[str, str, str, str, list]]:
+def fetch_all_stripe_summary() -> Dict[str, SubscriptionSummary]:
     """
-    Returns {email: (status, product_name, last_paid_str, plan_nick, invoices)}.
-    If customer not found or has no subs → ("Not in Stripe", "", "", "", []).
+    Returns {email: SubscriptionSummary(status, product_name, last_paid_str, plan_nick, invoices)}.
+    Customers missing from the result are reported as NOT_IN_STRIPE.
     """
     print("Fetching customers from Stripe...")
     stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    configure_stripe(stripe)
 
-    summary: Dict[str, Tuple[str, str, str, str, list]] = {}
+    summary: Dict[str, SubscriptionSummary] = {}
+    product_names: Dict[str, str] = {}
 
     try:
         # We have < 300 customers → one paginated loop is enough
         starting_after = None
         while True:
-            customers = stripe.Customer.list(limit=100, starting_after=starting_after)
+            customers = resilience.call("stripe", stripe.Customer.list, limit=100, starting_after=starting_after)
             for cust in customers.data:
                 email = (cust.email or "").lower()
                 status, product_name, last_paid, plan = "No subscription", "", "", ""
 
                 try:
                     # Get the newest subscription (any status)
-                    subs = stripe.Subscription.list(
+                    subs = resilience.call(
+                        "stripe", stripe.Subscription.list,
                         customer=cust.id,
                         limit=3,          # few per customer is plenty
                         expand=["data.latest_invoice"]
@@ -141,34 +176,37 @@ def fetch_all_stripe_summary() -> Dict[str, Tuple[str, str, str, str, list]]:
                             last_paid = ""
 
                         item = sub["items"]["data"][0]["price"]
-                        # Get product name by fetching the product separately
-                        try:
-                            product = stripe.Product.retrieve(item.get("product"))
-                            product_name = product.get("name", "")
-                        except:
-                            product_name = ""
+                        # Get product name by fetching the product separately (once per product)
+                        product_id = item.get("product")
+                        if product_id not in product_names:
+                            try:
+                                product = resilience.call("stripe", stripe.Product.retrieve, product_id)
+                                product_names[product_id] = product.get("name", "")
+                            except resilience.CircuitOpen:
+                                raise
+                            except Exception:
+                                product_names[product_id] = ""
+                        product_name = product_names[product_id]
                         plan = item.get("nickname") or item.get("id")
 
+                except resilience.CircuitOpen:
+                    raise
                 except Exception as e:
                     print(f"  ⚠️  Error processing customer {email}: {e}")
                     status, product_name, last_paid, plan = "Error", "", "", ""
 
                 invoices = []
                 try:
-                    customer_invoices = stripe.Invoice.list(customer=cust.id, limit=10)
+                    customer_invoices = resilience.call("stripe", stripe.Invoice.list, customer=cust.id, limit=10)
                     for inv in customer_invoices.data:
-                        invoices.append({
-                            'id': inv.id,
-                            'amount_paid': inv.amount_paid / 100.0,
-                            'created': datetime.fromtimestamp(inv.created, tz=timezone.utc).strftime("%Y-%m-%d"),
-                            'status': inv.status,
-                            'invoice_pdf': inv.invoice_pdf
-                        })
+                        invoices.append(Invoice.from_stripe(inv))
+                except resilience.CircuitOpen:
+                    raise
                 except Exception as e:
                     print(f"  ⚠️  Error fetching invoices for {email}: {e}")
 
                 if email:
-                    summary[email] = (status, product_name, last_paid, plan, invoices)
+                    summary[email] = SubscriptionSummary.of(status, product_name, last_paid, plan, invoices)
 
             if not customers.has_more:
                 break
@@ -184,21 +222,150 @@ def fetch_all_stripe_summary() -> Dict[str, Tuple[str, str, str, str, list]]:
     return summary
 
 
+# ------------------------------------------------------------------
+#  HubSpot write-back
+# ------------------------------------------------------------------
+def build_hubspot_contact_inputs(
+    emails: Iterable[str],
+    clerk: Dict[str, Contact],
+    stripe_summary: Dict[str, SubscriptionSummary],
+) -> List[dict]:
+    """
+    Builds one batch input per email, keyed by email so the same list can be
+    sent to both the batch create and the batch upsert endpoint.
+    """
+    status_property = os.getenv("HUBSPOT_STRIPE_STATUS_PROPERTY", "stripe_subscription_status")
+
+    inputs = []
+    for email in sorted(emails):
+        phone = clerk[email].phone if email in clerk else ""
+        status = stripe_summary.get(email, NOT_IN_STRIPE).status
+
+        properties = {"email": email, status_property: status}
+        if phone:
+            properties["phone"] = phone
+        inputs.append({"idProperty": "email", "id": email, "properties": properties})
+    return inputs
+
+
+def _post_hubspot_batch(session: requests.Session, action: str, inputs: List[dict]) -> requests.Response:
+    """
+    POSTs one batch, retrying 429s and 5xx with exponential backoff + jitter.
+    Retry-After is honoured when HubSpot sends it.
+    """
+    url = f"{hubspot_api_base()}/crm/v3/objects/contacts/batch/{action}"
+    if action == "create":
+        body = {"inputs": [{"properties": i["properties"]} for i in inputs]}
+    else:
+        body = {"inputs": inputs}
+
+    attempt = 0
+    while True:
+        retry_after = None
+        try:
+            resp = session.post(url, json=body, timeout=30)
+            if resp.status_code != 429 and resp.status_code < 500:
+                return resp
+            if attempt == HUBSPOT_MAX_RETRIES:
+                return resp
+            retry_after = resp.headers.get("Retry-After")
+        except requests.RequestException:
+            if attempt == HUBSPOT_MAX_RETRIES:
+                raise
+
+        delay = float(retry_after) if retry_after else min(2 ** attempt, 30)
+        time.sleep(delay + random.uniform(0, 0.5))
+        attempt += 1
+        sync_metrics.record_retry("hubspot", f"/crm/v3/objects/contacts/batch/{action}")
+
+
+def _describe_batch_error(error: dict) -> str:
+    """One line for an entry of a batch response's errors array: the input ids it covers and why."""
+    ids = ", ".join(str(i) for i in (error.get("context") or {}).get("ids", [])) or "upsert"
+    return f"{ids}: {error.get('category', 'ERROR')} {error.get('message', '')[:200]}"
+
+
+def _push_hubspot_chunk(session: requests.Session, inputs: List[dict]) -> Tuple[int, int, List[str]]:
+    """
+    Creates a chunk of contacts in one call. Batch create is all-or-nothing, so
+    when HubSpot reports a conflict (someone added a contact by hand since the
+    comparison ran) the whole chunk is re-sent through batch upsert instead.
+
+    Returns (created, upserted, errors).
+    """
+    resp = _post_hubspot_batch(session, "create", inputs)
+    if resp.status_code in (200, 201):
+        return len(resp.json().get("results", [])), 0, []
+
+    if resp.status_code == 409:
+        resp = _post_hubspot_batch(session, "upsert", inputs)
+        if resp.status_code in (200, 201, 207):
+            # 207 Multi-Status: the rows HubSpot rejected are listed under errors
+            data = resp.json()
+            return 0, len(data.get("results", [])), [_describe_batch_error(e) for e in data.get("errors", [])]
+
+    first, last = inputs[0]["id"], inputs[-1]["id"]
+    return 0, 0, [f"{first}…{last}: HTTP {resp.status_code} {resp.text[:200]}"]
+
+
+def push_contacts_to_hubspot(inputs: List[dict]) -> Tuple[int, int, int]:
+    """
+    Pushes contacts to HubSpot in chunks of 100, with a small worker pool.
+    Returns (created, upserted, failed_chunks).
+    """
+    api_key = os.getenv("HUBSPOT_ACCESS_TOKEN")
+    if not api_key:
+        print("❌ No HUBSPOT_ACCESS_TOKEN found.")
+        return 0, 0, 0
+
+    chunks = [inputs[i:i + HUBSPOT_BATCH_SIZE] for i in range(0, len(inputs), HUBSPOT_BATCH_SIZE)]
+    print(f"\n📤 Pushing {len(inputs)} contacts to HubSpot in {len(chunks)} batches...")
+
+    session = requests.Session()
+    session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+
+    created = upserted = failed = 0
+    with ThreadPoolExecutor(max_workers=HUBSPOT_MAX_WORKERS) as pool:
+        futures = [pool.submit(_push_hubspot_chunk, session, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            try:
+                c, u, errors = future.result()
+            except Exception as e:
+                errors, c, u = [str(e)], 0, 0
+            created += c
+            upserted += u
+            for err in errors:
+                failed += 1
+                print(f"  ❌ HubSpot batch failed: {err}")
+
+    print(f"✅ HubSpot write-back: {created} created, {upserted} upserted, {failed} failed batches.")
+    return created, upserted, failed
+
+
 # ------------------------------------------------------------------
 #  Comparison + output
 # ------------------------------------------------------------------
 def main():
     load_dotenv()
+    sync_metrics.install("sync_subscription_data")
+    try:
+        _compare_and_report()
+    finally:
+        sync_metrics.write_summary()
+
 
-    clerk = fetch_all_clerk_contacts()
-    hubspot = fetch_all_hubspot_contacts()
-    stripe_summary = fetch_all_stripe_summary()
+def _compare_and_report():
+    with sync_metrics.stage("fetch"):
+        clerk = fetch_all_clerk_contacts()
+        hubspot = fetch_all_hubspot_contacts()
+        stripe_summary = fetch_all_stripe_summary()
 
     if not clerk or not hubspot:
         print("\nComparison aborted due to an earlier API error.")
         return
 
-    clerk_only = clerk.keys() - hubspot.keys()
+    with sync_metrics.stage("match"):
+        clerk_only = clerk.keys() - hubspot.keys()
 
     print("\n" + "=" * 80)
     print("                           Clerk Only Users")
@@ -211,13 +378,16 @@ def main():
     print(f"\n👤 In Clerk ONLY ({len(clerk_only)})")
     for email in sorted(clerk_only):
         _, phone = clerk[email]
-        status, product, paid, plan, _ = stripe_summary.get(
-            email, ("Not in Stripe", "", "", "", [])
-        )
+        status, product, paid, plan, _ = stripe_summary.get(email, NOT_IN_STRIPE)
         print(f"{email:35} 📞 {phone or '—':12} 💳 {status:10} 🏷️  {product or '—':20} 🗓  {paid or '—':10}  💰  {plan or '—'}")
 
     print("\n" + "=" * 80)
 
+    # ----- Optionally close the gap in HubSpot -----
+    if os.getenv("SYNC_TO_HUBSPOT", "false").lower() == "true" and clerk_only:
+        with sync_metrics.stage("write"):
+            push_contacts_to_hubspot(build_hubspot_contact_inputs(clerk_only, clerk, stripe_summary))
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run("sync_subscription_data", main)
@@ -1,12 +1,21 @@
+import argparse
 import os
-import requests
+import sys
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from hubspot import HubSpot
 import stripe
-from typing import Dict, Tuple, Optional
+from typing import Dict, Iterable, Optional
 from supabase import create_client, Client
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache  # noqa: E402
+import profiling  # noqa: E402
+import resilience  # noqa: E402
+import sync_diff  # noqa: E402
+import sync_metrics  # noqa: E402
+from sync_records import NOT_IN_STRIPE, Contact, Invoice, SubscriptionSummary  # noqa: E402
+from api_endpoints import clerk_api_base, configure_stripe, hubspot_api_base  # noqa: E402
+
 # ------------------------------------------------------------------
 #  Helpers
 # ------------------------------------------------------------------
@@ -32,58 +41,85 @@ def get_supabase_client() -> Client:
     return create_client(url, key)
 
 
-def upsert_invoices(supabase: Client, client_id: str, invoices: list):
-    """Upsert invoices for a client"""
+def upsert_invoices(supabase: Client, client_id: str, invoices: Iterable[Invoice],
+                    existing: Optional[Dict[str, dict]] = None) -> int:
+    """
+    Upsert invoices for a client, keyed on stripe_invoice_id.
+    When `existing` ({stripe_invoice_id: row}) is given, invoices already
+    stored with the same values are skipped. Returns the number written.
+    """
     if not invoices:
-        return
+        return 0
+
+    if existing is not None:
+        invoices, _ = sync_diff.diff_invoices(invoices, existing, lambda inv: inv.id)
 
+    written = 0
     for inv in invoices:
         try:
             supabase.table('invoices').upsert({
-                'id': inv['id'],
+                'stripe_invoice_id': inv.id,
                 'client_id': client_id,
-                'amount_paid': inv['amount_paid'],
-                'created_at': inv['created'],
-                'status': inv['status'],
-                'invoice_pdf': inv['invoice_pdf']
-            }).execute()
+                'amount_paid': inv.amount_paid,
+                'created_at': inv.created,
+                'status': inv.status,
+                'invoice_pdf': inv.invoice_pdf
+            }, on_conflict='stripe_invoice_id').execute()
+            written += 1
         except Exception as e:
             # Check if it's a table not found error
             if 'relation "public.invoices" does not exist' in str(e):
                 print(f"  ⚠️  Invoices table not found, skipping invoice sync for client {client_id}")
-                return  # Exit early if table doesn't exist
+                return written  # Exit early if table doesn't exist
             else:
-                print(f"  ❌ Error upserting invoice {inv['id']} for client {client_id}: {e}")
+                print(f"  ❌ Error upserting invoice {inv.id} for client {client_id}: {e}")
+    return written
+
 
-def update_client_subscription(supabase: Client, email: str, subscription_data: Tuple[str, str, str, str, list]) -> bool:
-    """Update client subscription data in Supabase"""
-    status, product, last_paid, plan, invoices = subscription_data
+def subscription_columns(subscription_data: SubscriptionSummary) -> dict:
+    """Maps a Stripe summary record onto the clients subscription columns"""
+    status, product, last_paid, plan, _ = subscription_data
+    return {
+        'subscription_status': status if status != "Not in Stripe" else None,
+        'subscription_product': product if product else None,
+        'subscription_plan': plan if plan else None,
+        'last_payment_date': last_paid if last_paid else None
+    }
+
+
+def update_client_subscription(supabase: Client, email: str, subscription_data: SubscriptionSummary,
+                               current: Optional[dict] = None,
+                               existing_invoices: Optional[Dict[str, dict]] = None) -> bool:
+    """
+    Update client subscription data in Supabase, writing only the columns that
+    changed. `current` is the client's row from a bulk load; without it the row
+    is looked up by email. Returns True if anything was written.
+    """
+    status, _, _, _, invoices = subscription_data
     
     try:
-        # Find client by email
-        result = supabase.table('clients').select('id').eq('email', email.lower()).execute()
-        
-        if not result.data:
-            print(f"  ⚠️  Client not found for email: {email}")
-            return False
-        
-        client_id = result.data[0]['id']
+        if current is None:
+            # Find client by email
+            columns = ",".join(("id",) + sync_diff.SUBSCRIPTION_FIELDS)
+            result = supabase.table('clients').select(columns).eq('email', email.lower()).execute()
+            
+            if not result.data:
+                print(f"  ⚠️  Client not found for email: {email}")
+                return False
+            current = result.data[0]
         
-        # Update subscription data
-        update_data = {
-            'subscription_status': status if status != "Not in Stripe" else None,
-            'subscription_product': product if product else None,
-            'subscription_plan': plan if plan else None,
-            'last_payment_date': last_paid if last_paid else None
-        }
+        client_id = current['id']
         
-        supabase.table('clients').update(update_data).eq('id', client_id).execute()
-        print(f"  ✅ Updated subscription for {email}: {status}")
+        # Update only the subscription columns that changed
+        changes = sync_diff.diff_fields(current, subscription_columns(subscription_data))
+        if changes:
+            supabase.table('clients').update(changes).eq('id', client_id).execute()
+            print(f"  ✅ Updated subscription for {email}: {status} ({', '.join(changes)})")
 
         # Upsert invoices
-        upsert_invoices(supabase, client_id, invoices)
+        written = upsert_invoices(supabase, client_id, invoices, existing_invoices)
 
-        return True
+        return bool(changes) or written > 0
         
     except Exception as e:
         print(f"  ❌ Error updating {email}: {e}")
@@ -93,7 +129,7 @@ def update_client_subscription(supabase: Client, email: str, subscription_data:
 # ------------------------------------------------------------------
 #  Clerk
 # ------------------------------------------------------------------
-def fetch_all_clerk_contacts() -> Dict[str, Tuple[str, str]]:
+def fetch_all_clerk_contacts() -> Dict[str, Contact]:
     """
     Returns {email: (email, phone)} for every Clerk user.
     """
@@ -101,12 +137,14 @@ def fetch_all_clerk_contacts() -> Dict[str, Tuple[str, str]]:
     api_key = os.getenv("CLERK_SECRET_KEY")
     headers = {"Authorization": f"Bearer " + api_key, "Content-Type": "application/json"}
 
-    contacts: Dict[str, Tuple[str, str]] = {}
+    contacts: Dict[str, Contact] = {}
     offset, limit = 0, 100
+    session = http_cache.get_session()
 
     while True:
-        resp = requests.get(
-            "https://api.clerk.com/v1/users",
+        resp = resilience.call(
+            "clerk", session.get,
+            f"{clerk_api_base()}/users",
             headers=headers,
             params={"limit": limit, "offset": offset},
             timeout=30,
@@ -132,20 +170,22 @@ def fetch_all_clerk_contacts() -> Dict[str, Tuple[str, str]]:
             phone = normalise_phone(phone_obj.get("phone_number", "")) if phone_obj else ""
 
             if email:
-                contacts[email] = (email, phone)
+                contacts[email] = Contact(email, phone)
 
         offset += limit
         if len(users) < limit:
             break
 
     print(f"✅ Fetched {len(contacts)} Clerk users.")
+    if http_cache.describe(session):
+        print(http_cache.describe(session))
     return contacts
 
 
 # ------------------------------------------------------------------
 #  HubSpot
 # ------------------------------------------------------------------
-def fetch_all_hubspot_contacts() -> Dict[str, Tuple[str, str]]:
+def fetch_all_hubspot_contacts() -> Dict[str, Contact]:
     """
     Returns {email: (email, phone)} for every HubSpot contact.
     """
@@ -155,24 +195,38 @@ def fetch_all_hubspot_contacts() -> Dict[str, Tuple[str, str]]:
         print("❌ No HUBSPOT_ACCESS_TOKEN found.")
         return {}
 
+    headers = {"Authorization": f"Bearer {api_key}"}
+    params = {"limit": 100, "properties": "email,phone"}
+    session = http_cache.get_session()
+
     try:
-        client = HubSpot(access_token=api_key)
-        contacts: Dict[str, Tuple[str, str]] = {}
-        
-        # Fetch all contacts
-        all_contacts = client.crm.contacts.get_all(properties=["email", "phone"])
-        
-        for contact in all_contacts:
-            props = contact.properties
-            email = (props.get("email") or "").lower()
-            phone = normalise_phone(props.get("phone") or "")
-            
-            if email:
-                contacts[email] = (email, phone)
-        
+        contacts: Dict[str, Contact] = {}
+
+        # Page through the CRM list endpoint directly so pages can come from the cache
+        while True:
+            resp = resilience.call("hubspot", session.get, f"{hubspot_api_base()}/crm/v3/objects/contacts",
+                                   headers=headers, params=params, timeout=30)
+            resp.raise_for_status()
+            data = resp.json()
+
+            for contact in data.get("results", []):
+                props = contact.get("properties") or {}
+                email = (props.get("email") or "").lower()
+                phone = normalise_phone(props.get("phone") or "")
+
+                if email:
+                    contacts[email] = Contact(email, phone)
+
+            after = ((data.get("paging") or {}).get("next") or {}).get("after")
+            if not after:
+                break
+            params["after"] = after
+
         print(f"✅ Fetched {len(contacts)} HubSpot contacts.")
+        if http_cache.describe(session):
+            print(http_cache.describe(session))
         return contacts
-        
+
     except Exception as e:
         print(f"❌ HubSpot error: {e}")
         return {}
@@ -181,28 +235,31 @@ def fetch_all_hubspot_contacts() -> Dict[str, Tuple[str, str]]:
 # ------------------------------------------------------------------
 #  Stripe
 # ------------------------------------------------------------------
-def fetch_all_stripe_summary() -> Dict[str, Tuple[str, str, str, str, list]]:
+def fetch_all_stripe_summary() -> Dict[str, SubscriptionSummary]:
     """
-    Returns {email: (status, product_name, last_paid_str, plan_nick, invoices)}.
-    If customer not found or has no subs → ("Not in Stripe", "", "", "", []).
+    Returns {email: SubscriptionSummary(status, product_name, last_paid_str, plan_nick, invoices)}.
+    Customers missing from the result are reported as NOT_IN_STRIPE.
     """
     print("Fetching customers from Stripe...")
     stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    configure_stripe(stripe)
 
-    summary: Dict[str, Tuple[str, str, str, str, list]] = {}
+    summary: Dict[str, SubscriptionSummary] = {}
+    product_names: Dict[str, str] = {}
 
     try:
         # We have < 300 customers → one paginated loop is enough
         starting_after = None
         while True:
-            customers = stripe.Customer.list(limit=100, starting_after=starting_after)
+            customers = resilience.call("stripe", stripe.Customer.list, limit=100, starting_after=starting_after)
             for cust in customers.data:
                 email = (cust.email or "").lower()
                 status, product_name, last_paid, plan = "No subscription", "", "", ""
 
                 try:
                     # Get the newest subscription (any status)
-                    subs = stripe.Subscription.list(
+                    subs = resilience.call(
+                        "stripe", stripe.Subscription.list,
                         customer=cust.id,
                         limit=3,          # few per customer is plenty
                         expand=["data.latest_invoice"]
@@ -222,34 +279,37 @@ def fetch_all_stripe_summary() -> Dict[str, Tuple[str, str, str, str, list]]:
                             last_paid = ""
 
                         item = sub["items"]["data"][0]["price"]
-                        # Get product name by fetching the product separately
-                        try:
-                            product = stripe.Product.retrieve(item.get("product"))
-                            product_name = product.get("name", "")
-                        except:
-                            product_name = ""
+                        # Get product name by fetching the product separately (once per product)
+                        product_id = item.get("product")
+                        if product_id not in product_names:
+                            try:
+                                product = resilience.call("stripe", stripe.Product.retrieve, product_id)
+                                product_names[product_id] = product.get("name", "")
+                            except resilience.CircuitOpen:
+                                raise
+                            except Exception:
+                                product_names[product_id] = ""
+                        product_name = product_names[product_id]
                         plan = item.get("nickname") or item.get("id")
 
+                except resilience.CircuitOpen:
+                    raise
                 except Exception as e:
                     print(f"  ⚠️  Error processing customer {email}: {e}")
                     status, product_name, last_paid, plan = "Error", "", "", ""
 
                 invoices = []
                 try:
-                    customer_invoices = stripe.Invoice.list(customer=cust.id, limit=10)
+                    customer_invoices = resilience.call("stripe", stripe.Invoice.list, customer=cust.id, limit=10)
                     for inv in customer_invoices.data:
-                        invoices.append({
-                            'id': inv.id,
-                            'amount_paid': inv.amount_paid / 100.0,
-                            'created': datetime.fromtimestamp(inv.created, tz=timezone.utc).strftime("%Y-%m-%d"),
-                            'status': inv.status,
-                            'invoice_pdf': inv.invoice_pdf
-                        })
+                        invoices.append(Invoice.from_stripe(inv))
+                except resilience.CircuitOpen:
+                    raise
                 except Exception as e:
                     print(f"  ⚠️  Error fetching invoices for {email}: {e}")
 
                 if email:
-                    summary[email] = (status, product_name, last_paid, plan, invoices)
+                    summary[email] = SubscriptionSummary.of(status, product_name, last_paid, plan, invoices)
 
             if not customers.has_more:
                 break
@@ -268,8 +328,12 @@ def fetch_all_stripe_summary() -> Dict[str, Tuple[str, str, str, str, list]]:
 # ------------------------------------------------------------------
 #  Main sync function
 # ------------------------------------------------------------------
-def sync_subscription_data():
-    """Sync subscription data from Stripe to Supabase"""
+def sync_subscription_data(plan: bool = False):
+    """
+    Sync subscription data from Stripe to Supabase. Current rows are loaded in
+    bulk and only changed clients/invoices are written; with plan=True the
+    write-set is printed instead of applied.
+    """
     load_dotenv()
     
     print("🚀 Starting subscription data sync...")
@@ -283,62 +347,105 @@ def sync_subscription_data():
         return
     
     # Fetch data from all sources
-    clerk = fetch_all_clerk_contacts()
-    stripe_summary = fetch_all_stripe_summary()
+    with sync_metrics.stage("fetch"):
+        clerk = fetch_all_clerk_contacts()
+        stripe_summary = fetch_all_stripe_summary()
     
     if not stripe_summary:
         print("❌ No Stripe data available, aborting sync.")
         return
     
-    print(f"\n📊 Syncing subscription data for {len(stripe_summary)} customers...")
+    with sync_metrics.stage("diff"):
+        current = sync_diff.load_clients(supabase, key="email")
+        existing_invoices = sync_diff.load_invoices(supabase)
+
+        pending = []
+        planned_updates = []
+        planned_invoices = 0
+        not_found = unchanged = 0
+        for email, subscription_data in stripe_summary.items():
+            row = current.get(email)
+            if row is None:
+                not_found += 1
+                continue
+            changes = sync_diff.diff_fields(row, subscription_columns(subscription_data))
+            new_invoices, _ = sync_diff.diff_invoices(subscription_data[4], existing_invoices, lambda inv: inv.id)
+            if not changes and not new_invoices:
+                unchanged += 1
+                continue
+            pending.append((email, subscription_data, row))
+            if changes:
+                planned_updates.append((email, row, changes))
+            planned_invoices += len(new_invoices)
+
+    print(f"\n📊 {len(stripe_summary)} Stripe customers: {len(pending)} changed, "
+          f"{unchanged} unchanged, {not_found} without a client row")
+
+    if plan:
+        sync_diff.print_plan(planned_updates, {"invoices": planned_invoices})
+        return
     
     updated_count = 0
-    for email, subscription_data in stripe_summary.items():
-        if update_client_subscription(supabase, email, subscription_data):
-            updated_count += 1
+    with sync_metrics.stage("write"):
+        for email, subscription_data, row in pending:
+            if update_client_subscription(supabase, email, subscription_data,
+                                          current=row, existing_invoices=existing_invoices):
+                updated_count += 1
     
     print(f"\n🎉 Sync complete! Updated {updated_count} client records.")
 
 
 def main():
     """Main function - can be used for both sync and comparison"""
+    parser = argparse.ArgumentParser(description="Compare Clerk/HubSpot/Stripe or sync Stripe data to Supabase")
+    parser.add_argument("--plan", action="store_true",
+                        help="with SYNC_TO_SUPABASE=true: print the changed rows instead of writing them")
+    args = parser.parse_args()
+
     load_dotenv()
     
     # Check if we want to sync to Supabase
     sync_mode = os.getenv("SYNC_TO_SUPABASE", "false").lower() == "true"
     
-    if sync_mode:
-        sync_subscription_data()
-    else:
-        # Original comparison logic
+    sync_metrics.install("sync_to_supabase" if sync_mode else "compare_contacts")
+    try:
+        if sync_mode:
+            sync_subscription_data(plan=args.plan)
+        else:
+            compare_contacts()
+    finally:
+        sync_metrics.write_summary()
+
+
+def compare_contacts():
+    """Original comparison logic: list Clerk users missing from HubSpot"""
+    with sync_metrics.stage("fetch"):
         clerk = fetch_all_clerk_contacts()
         hubspot = fetch_all_hubspot_contacts()
         stripe_summary = fetch_all_stripe_summary()
 
-        if not clerk or not hubspot:
-            print("\nComparison aborted due to an earlier API error.")
-            return
-
-        clerk_only = clerk.keys() - hubspot.keys()
-
-        print("\n" + "=" * 80)
-        print("                           Clerk Only Users")
-        print("=" * 80 + "\n")
-        header = f"{'Email':35} 📞 {'Phone':12} 💳 {'Status':10} 🏷️  {'Product':20} 🗓  {'Last Paid':10}  💰  Plan"
-        print(header)
-        print("-" * len(header))
-
-        # ----- Clerk but not HubSpot -----
-        print(f"\n👤 In Clerk ONLY ({len(clerk_only)})")
-        for email in sorted(clerk_only):
-            _, phone = clerk[email]
-            status, product, paid, plan, _ = stripe_summary.get(
-                email, ("Not in Stripe", "", "", "", [])
-            )
-            print(f"{email:35} 📞 {phone or '—':12} 💳 {status:10} 🏷️  {product or '—':20} 🗓  {paid or '—':10}  💰  {plan or '—'}")
+    if not clerk or not hubspot:
+        print("\nComparison aborted due to an earlier API error.")
+        return
+
+    clerk_only = clerk.keys() - hubspot.keys()
+
+    print("\n" + "=" * 80)
+    print("                           Clerk Only Users")
+    print("=" * 80 + "\n")
+    header = f"{'Email':35} 📞 {'Phone':12} 💳 {'Status':10} 🏷️  {'Product':20} 🗓  {'Last Paid':10}  💰  Plan"
+    print(header)
+    print("-" * len(header))
+
+    # ----- Clerk but not HubSpot -----
+    print(f"\n👤 In Clerk ONLY ({len(clerk_only)})")
+    for email in sorted(clerk_only):
+        _, phone = clerk[email]
+        status, product, paid, plan, _ = stripe_summary.get(email, NOT_IN_STRIPE)
+        print(f"{email:35} 📞 {phone or '—':12} 💳 {status:10} 🏷️  {product or '—':20} 🗓  {paid or '—':10}  💰  {plan or '—'}")
 
-        print("\n" + "=" * 80)
+    print("\n" + "=" * 80)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run("sync_to_supabase", main)
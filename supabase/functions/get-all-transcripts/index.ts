@@ -1,4 +1,4 @@
-import { MongoClient } from "mongodb";
+import { MongoClient, ObjectId } from "mongodb";
 
 // Supabase will automatically set the MONGO_URI environment variable
 // from the secrets you set in your project settings.
@@ -11,6 +11,14 @@ if (!MONGO_URI) {
 const client = new MongoClient(MONGO_URI);
 const connection = client.connect().then(() => console.log("Connected to MongoDB")).catch(err => console.error("Failed to connect to MongoDB", err));
 
+// Keyset mode: { keyset: true, before_start_time, before_id, include_count }
+// returns calls strictly after the cursor in (start_time, _id) descending
+// order, plus nextCursor for the following page. Each page is an index range
+// scan, so walking every call costs O(n) instead of the O(n^2) of $skip.
+// The total is only counted when include_count is true (it defaults to true
+// in page mode, which keeps its old response shape).
+const toId = (id: string) => (ObjectId.isValid(id) ? new ObjectId(id) : id);
+
 const corsHeaders = {
   'Access-Control-Allow-Origin': '*',
   'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
@@ -35,6 +43,9 @@ Deno.serve(async (req) => {
     const date = body.date || 'all';
     const sentiment = body.sentiment || 'all';
     const tag = body.tag || 'all';
+    const since = body.since || null;
+    const keyset = body.keyset === true;
+    const includeCount = body.include_count ?? !keyset;
 
     const db = client.db("db");
     const calls = db.collection("calls");
@@ -52,14 +63,10 @@ Deno.serve(async (req) => {
       }
       if (!agent) {
         console.log(`No agent found for userEmail: ${userEmail}`);
-        return new Response(JSON.stringify({ 
-          transcripts: [], 
-          totalCount: 0, 
-          currentPage: page, 
-          totalPages: 0,
-          hasNextPage: false,
-          hasPreviousPage: false
-        }), {
+        const empty = keyset
+          ? { transcripts: [], hasNextPage: false, nextCursor: null, ...(includeCount ? { totalCount: 0 } : {}) }
+          : { transcripts: [], totalCount: 0, currentPage: page, totalPages: 0, hasNextPage: false, hasPreviousPage: false };
+        return new Response(JSON.stringify(empty), {
           headers: { ...corsHeaders, "Content-Type": "application/json" },
           status: 200,
         });
@@ -83,6 +90,10 @@ Deno.serve(async (req) => {
       }
       query.start_time = { $gte: startDate.toISOString() };
     }
+    // Explicit lower bound (ISO timestamp), e.g. the activity job's 30-day window
+    if (since) {
+      query.start_time = { $gte: since };
+    }
 
     // Sentiment filter (assuming sentiment field exists)
     if (sentiment !== 'all') {
@@ -94,18 +105,8 @@ Deno.serve(async (req) => {
       query.tags = { $in: [tag] };
     }
 
-    // Get total count for pagination
-    const totalCount = await calls.countDocuments(query);
-    const totalPages = Math.ceil(totalCount / limit);
-    const hasNextPage = page < totalPages;
-    const hasPreviousPage = page > 1;
-
-    // Get paginated transcripts enriched with agent info (email/name)
-    const transcripts = await calls.aggregate([
-      { $match: query },
-      { $sort: { start_time: -1 } },
-      { $skip: skip },
-      { $limit: limit },
+    // Enriches a page of calls with agent info (email/name)
+    const withAgents = [
       {
         $lookup: {
           from: 'agents',
@@ -122,7 +123,74 @@ Deno.serve(async (req) => {
         }
       },
       { $project: { agent_docs: 0 } }
-    ]).toArray();
+    ];
+
+    if (keyset) {
+      const match: Record<string, any> = { ...query };
+      if (body.before_start_time) {
+        const after = body.before_id
+          ? [
+              { start_time: { $lt: body.before_start_time } },
+              { start_time: body.before_start_time, _id: { $lt: toId(body.before_id) } },
+            ]
+          : [{ start_time: { $lt: body.before_start_time } }];
+        match.$and = [...(match.$and || []), { $or: after }];
+      }
+
+      // One extra row tells whether there is a next page without counting
+      const rows = await calls.aggregate([
+        { $match: match },
+        { $sort: { start_time: -1, _id: -1 } },
+        { $limit: limit + 1 },
+        ...withAgents,
+      ]).toArray();
+      const hasNextPage = rows.length > limit;
+      const transcripts = rows.slice(0, limit);
+      const last = transcripts[transcripts.length - 1];
+
+      const result: Record<string, any> = {
+        transcripts,
+        hasNextPage,
+        nextCursor: hasNextPage ? { before_start_time: last.start_time, before_id: String(last._id) } : null,
+      };
+      if (includeCount) {
+        result.totalCount = await calls.countDocuments(query);
+      }
+      return new Response(JSON.stringify(result), {
+        headers: { ...corsHeaders, "Content-Type": "application/json" },
+        status: 200,
+      });
+    }
+
+    // Get total count for pagination
+    let totalCount: number | null = null;
+    let totalPages: number | null = null;
+    let hasNextPage: boolean;
+    const hasPreviousPage = page > 1;
+    let transcripts;
+
+    if (includeCount) {
+      totalCount = await calls.countDocuments(query);
+      totalPages = Math.ceil(totalCount / limit);
+      hasNextPage = page < totalPages;
+      transcripts = await calls.aggregate([
+        { $match: query },
+        { $sort: { start_time: -1 } },
+        { $skip: skip },
+        { $limit: limit },
+        ...withAgents,
+      ]).toArray();
+    } else {
+      const rows = await calls.aggregate([
+        { $match: query },
+        { $sort: { start_time: -1 } },
+        { $skip: skip },
+        { $limit: limit + 1 },
+        ...withAgents,
+      ]).toArray();
+      hasNextPage = rows.length > limit;
+      transcripts = rows.slice(0, limit);
+    }
 
     return new Response(JSON.stringify({
       transcripts,
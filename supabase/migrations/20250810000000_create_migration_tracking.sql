@@ -0,0 +1,53 @@
+-- Tracks which migration files have been applied, and with what content
+CREATE TABLE IF NOT EXISTS public.applied_migrations (
+    version TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    execution_ms INTEGER
+);
+
+-- Service role only
+ALTER TABLE public.applied_migrations ENABLE ROW LEVEL SECURITY;
+
+-- Applies one migration file and records it in the same transaction.
+-- The whole file is executed as one string, so function bodies with $$ are
+-- kept intact, and any error rolls back both the DDL and the tracking row.
+-- p_record_only marks a file as applied without running it (baselining).
+CREATE OR REPLACE FUNCTION public.apply_migration(
+    p_version TEXT,
+    p_checksum TEXT,
+    p_sql TEXT,
+    p_record_only BOOLEAN DEFAULT FALSE
+)
+RETURNS TEXT AS $$
+DECLARE
+    v_existing TEXT;
+    v_started TIMESTAMPTZ := clock_timestamp();
+BEGIN
+    -- Serialise concurrent deploys
+    PERFORM pg_advisory_xact_lock(hashtext('public.apply_migration'));
+
+    SELECT checksum INTO v_existing FROM public.applied_migrations WHERE version = p_version;
+    IF FOUND THEN
+        IF v_existing <> p_checksum THEN
+            RAISE EXCEPTION 'migration % was modified after it was applied (checksum % in database, % on disk)',
+                p_version, v_existing, p_checksum;
+        END IF;
+        RETURN 'skipped';
+    END IF;
+
+    IF NOT p_record_only THEN
+        EXECUTE p_sql;
+    END IF;
+
+    INSERT INTO public.applied_migrations (version, checksum, execution_ms)
+    VALUES (p_version, p_checksum, (extract(epoch FROM clock_timestamp() - v_started) * 1000)::INTEGER);
+
+    RETURN CASE WHEN p_record_only THEN 'recorded' ELSE 'applied' END;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.apply_migration(TEXT, TEXT, TEXT, BOOLEAN) FROM PUBLIC, anon, authenticated;
+
+-- Let PostgREST see the new table and function
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,61 @@
+-- Assigns every client with no employee in one statement, spread across the
+-- given employees round-robin, or weighted when p_weights is given
+-- (e.g. weights {2,1} hand out clients A, B, A, A, B, A, ...).
+-- Clients without an email, or whose email contains one of p_exclude_domains,
+-- are left unassigned.
+-- Rows being assigned concurrently are skipped (SKIP LOCKED), never overwritten.
+-- Returns the number of clients assigned to each employee.
+CREATE OR REPLACE FUNCTION public.assign_unassigned_clients(
+    p_employee_ids UUID[],
+    p_weights INTEGER[] DEFAULT NULL,
+    p_exclude_domains TEXT[] DEFAULT '{}'
+)
+RETURNS TABLE (employee_id UUID, assigned BIGINT) AS $$
+    WITH weights AS (
+        -- A NULL p_weights unnests as all NULLs, i.e. weight 1 each
+        SELECT e.emp, GREATEST(COALESCE(e.w, 1), 0) AS w, e.ord
+        FROM unnest(p_employee_ids, p_weights) WITH ORDINALITY AS e(emp, w, ord)
+        WHERE e.emp IS NOT NULL
+    ),
+    slots AS (
+        SELECT w.emp, row_number() OVER (ORDER BY s, w.ord) - 1 AS slot
+        FROM weights w, generate_series(1, w.w) AS s
+    ),
+    total AS (
+        SELECT count(*) AS n FROM slots
+    ),
+    locked AS (
+        SELECT c.id, c.created_at
+        FROM public.clients c
+        WHERE c.employee_id IS NULL
+          -- A NULL email makes the ILIKE below NULL, which NOT EXISTS lets through
+          AND c.email IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM unnest(p_exclude_domains) AS d(domain)
+              WHERE c.email ILIKE '%' || d.domain || '%'
+          )
+        FOR UPDATE SKIP LOCKED
+    ),
+    numbered AS (
+        SELECT l.id, (row_number() OVER (ORDER BY l.created_at NULLS LAST, l.id) - 1) % t.n AS slot
+        FROM locked l, total t
+        WHERE t.n > 0
+    ),
+    updated AS (
+        UPDATE public.clients c
+        SET employee_id = s.emp
+        FROM numbered nb
+        JOIN slots s ON s.slot = nb.slot
+        WHERE c.id = nb.id
+        RETURNING c.employee_id
+    )
+    SELECT w.emp, count(u.employee_id)
+    FROM weights w
+    LEFT JOIN updated u ON u.employee_id = w.emp
+    GROUP BY w.emp, w.ord
+    ORDER BY w.ord;
+$$ LANGUAGE sql VOLATILE SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.assign_unassigned_clients(UUID[], INTEGER[], TEXT[]) FROM PUBLIC, anon, authenticated;
+
+NOTIFY pgrst, 'reload schema';
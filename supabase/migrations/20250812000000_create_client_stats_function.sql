@@ -0,0 +1,59 @@
+-- Grouped client counts for the verification and reporting scripts, in one
+-- scan and one call:
+--   {
+--     "total": 1234,
+--     "by_employee": {"<employee uuid>": 300, "unassigned": 120},
+--     "by_subscription_status": {"active": 410, "canceled": 80, "none": 744},
+--     "by_platform_usage": {"true": 350, "false": 884},
+--     "by_stripe_link": {"linked": 520, "unlinked": 714},
+--     "assignable": {"true": 95, "false": 1139},
+--     "employees": {"<employee uuid>": "Sid", ...}
+--   }
+-- "assignable" counts unassigned clients whose email contains none of
+-- p_exclude_domains (the clients assign_clients.py would pick up).
+CREATE OR REPLACE FUNCTION public.client_stats(p_exclude_domains TEXT[] DEFAULT '{}')
+RETURNS JSONB AS $$
+    WITH c AS (
+        SELECT
+            COALESCE(cl.employee_id::TEXT, 'unassigned') AS employee,
+            COALESCE(cl.subscription_status, 'none') AS subscription_status,
+            COALESCE(cl.is_using_platform, FALSE)::TEXT AS is_using_platform,
+            CASE WHEN cl.stripe_customer_id IS NULL THEN 'unlinked' ELSE 'linked' END AS stripe_link,
+            (cl.employee_id IS NULL AND cl.email IS NOT NULL AND NOT EXISTS (
+                SELECT 1 FROM unnest(p_exclude_domains) AS d(domain)
+                WHERE cl.email ILIKE '%' || d.domain || '%'
+            ))::TEXT AS assignable
+        FROM public.clients cl
+    ),
+    grouped AS (
+        SELECT
+            CASE
+                WHEN GROUPING(employee) = 0 THEN 'by_employee'
+                WHEN GROUPING(subscription_status) = 0 THEN 'by_subscription_status'
+                WHEN GROUPING(is_using_platform) = 0 THEN 'by_platform_usage'
+                WHEN GROUPING(stripe_link) = 0 THEN 'by_stripe_link'
+                WHEN GROUPING(assignable) = 0 THEN 'assignable'
+                ELSE 'total'
+            END AS dimension,
+            COALESCE(employee, subscription_status, is_using_platform, stripe_link, assignable) AS value,
+            count(*) AS n
+        FROM c
+        GROUP BY GROUPING SETS ((employee), (subscription_status), (is_using_platform), (stripe_link), (assignable), ())
+    )
+    SELECT jsonb_object_agg(dimension, counts)
+           || jsonb_build_object('employees',
+                  COALESCE((SELECT jsonb_object_agg(e.id, e.name) FROM public.employees e), '{}'::JSONB))
+    FROM (
+        SELECT dimension,
+               CASE WHEN dimension = 'total' THEN to_jsonb(max(n))
+                    -- Aggregates run for every group before CASE picks a branch;
+                    -- the grand-total group has a NULL value
+                    ELSE jsonb_object_agg(value, n) FILTER (WHERE value IS NOT NULL) END AS counts
+        FROM grouped
+        GROUP BY dimension
+    ) d;
+$$ LANGUAGE sql STABLE SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.client_stats(TEXT[]) FROM PUBLIC, anon, authenticated;
+
+NOTIFY pgrst, 'reload schema';
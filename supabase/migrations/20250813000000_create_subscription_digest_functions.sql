@@ -0,0 +1,51 @@
+-- Bucketed digests of the clients subscription columns, for drift_audit.py.
+-- Clients are bucketed by a hash of stripe_customer_id; the script computes
+-- the same buckets and digests from Stripe and only fetches the rows of
+-- buckets whose digests differ.
+
+-- First 32 bits of md5(customer id), modulo the bucket count.
+-- drift_audit.py: int(md5(id).hexdigest()[:8], 16) % buckets
+CREATE OR REPLACE FUNCTION public.subscription_bucket(p_customer_id TEXT, p_buckets INTEGER)
+RETURNS INTEGER AS $$
+    SELECT (('x' || substr(md5(p_customer_id), 1, 8))::BIT(32)::BIGINT % p_buckets)::INTEGER;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- One row per non-empty bucket. A client contributes the line
+--   customer_id|status|product|plan|YYYY-MM-DD
+-- (NULL as empty) when it is linked to Stripe and has any subscription
+-- column set; the bucket digest is md5 of its lines sorted bytewise and
+-- joined with \n.
+CREATE OR REPLACE FUNCTION public.subscription_bucket_digests(p_buckets INTEGER)
+RETURNS TABLE (bucket INTEGER, clients BIGINT, digest TEXT) AS $$
+    SELECT l.bucket, count(*), md5(string_agg(l.line, E'\n' ORDER BY l.line COLLATE "C"))
+    FROM (
+        SELECT
+            public.subscription_bucket(c.stripe_customer_id, p_buckets) AS bucket,
+            concat_ws('|', c.stripe_customer_id,
+                      COALESCE(c.subscription_status, ''), COALESCE(c.subscription_product, ''),
+                      COALESCE(c.subscription_plan, ''), COALESCE(c.last_payment_date::TEXT, '')) AS line
+        FROM public.clients c
+        WHERE c.stripe_customer_id IS NOT NULL
+          AND (c.subscription_status IS NOT NULL OR c.subscription_product IS NOT NULL
+               OR c.subscription_plan IS NOT NULL OR c.last_payment_date IS NOT NULL)
+    ) l
+    GROUP BY l.bucket;
+$$ LANGUAGE sql STABLE SET search_path = public;
+
+-- The linked clients in the given buckets, for drilling down.
+CREATE OR REPLACE FUNCTION public.subscription_bucket_rows(p_buckets INTEGER, p_bucket_ids INTEGER[])
+RETURNS TABLE (
+    id UUID, name TEXT, email TEXT, stripe_customer_id TEXT,
+    subscription_status TEXT, subscription_product TEXT, subscription_plan TEXT, last_payment_date DATE
+) AS $$
+    SELECT c.id, c.name, c.email, c.stripe_customer_id,
+           c.subscription_status, c.subscription_product, c.subscription_plan, c.last_payment_date
+    FROM public.clients c
+    WHERE c.stripe_customer_id IS NOT NULL
+      AND public.subscription_bucket(c.stripe_customer_id, p_buckets) = ANY (p_bucket_ids);
+$$ LANGUAGE sql STABLE SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.subscription_bucket_digests(INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.subscription_bucket_rows(INTEGER, INTEGER[]) FROM PUBLIC, anon, authenticated;
+
+NOTIFY pgrst, 'reload schema';
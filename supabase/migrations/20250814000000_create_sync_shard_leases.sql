@@ -0,0 +1,130 @@
+-- Leases for the sharded Stripe sync (sync_shards.py).
+-- A run splits clients into p_shards ranges of a 32-bit hash of clients.id;
+-- workers on any machine claim one range at a time. A lease that is not
+-- renewed before lease_expires_at (the worker crashed or hung) can be claimed
+-- again by another worker.
+CREATE TABLE IF NOT EXISTS public.sync_shard_leases (
+    job TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    shard INTEGER NOT NULL,
+    shards INTEGER NOT NULL,
+    owner TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_expires_at TIMESTAMPTZ,
+    started_at TIMESTAMPTZ,
+    completed_at TIMESTAMPTZ,
+    PRIMARY KEY (job, run_id, shard)
+);
+
+-- Service role only
+ALTER TABLE public.sync_shard_leases ENABLE ROW LEVEL SECURITY;
+
+-- First 32 bits of md5(id) as a number in [0, 2^32).
+-- sync_shards.py: int(md5(str(id)).hexdigest()[:8], 16)
+CREATE OR REPLACE FUNCTION public.client_id_hash(p_id UUID)
+RETURNS BIGINT AS $$
+    SELECT ('x' || substr(md5(p_id::TEXT), 1, 8))::BIT(32)::BIGINT;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Claims the lowest unfinished shard of a run whose lease is free or expired,
+-- creating the run's shard rows on first use. Returns NULL when every shard
+-- is completed or leased to a live worker.
+CREATE OR REPLACE FUNCTION public.claim_sync_shard(
+    p_job TEXT,
+    p_run_id TEXT,
+    p_shards INTEGER,
+    p_owner TEXT,
+    p_lease_seconds INTEGER DEFAULT 300
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_shard INTEGER;
+    v_existing INTEGER;
+BEGIN
+    SELECT shards INTO v_existing FROM public.sync_shard_leases
+    WHERE job = p_job AND run_id = p_run_id LIMIT 1;
+    IF FOUND AND v_existing <> p_shards THEN
+        RAISE EXCEPTION 'run % of % was started with % shards, not %', p_run_id, p_job, v_existing, p_shards;
+    END IF;
+
+    INSERT INTO public.sync_shard_leases (job, run_id, shard, shards)
+    SELECT p_job, p_run_id, s, p_shards FROM generate_series(0, p_shards - 1) AS s
+    ON CONFLICT DO NOTHING;
+
+    SELECT shard INTO v_shard
+    FROM public.sync_shard_leases
+    WHERE job = p_job AND run_id = p_run_id
+      AND completed_at IS NULL
+      AND (lease_expires_at IS NULL OR lease_expires_at < now())
+    ORDER BY shard
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED;
+
+    IF v_shard IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    UPDATE public.sync_shard_leases
+    SET owner = p_owner,
+        attempts = attempts + 1,
+        started_at = now(),
+        lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+    WHERE job = p_job AND run_id = p_run_id AND shard = v_shard;
+
+    RETURN v_shard;
+END;
+$$ LANGUAGE plpgsql VOLATILE SET search_path = public;
+
+-- Extends a lease; FALSE means the lease expired and was taken over.
+CREATE OR REPLACE FUNCTION public.renew_sync_shard(
+    p_job TEXT, p_run_id TEXT, p_shard INTEGER, p_owner TEXT, p_lease_seconds INTEGER DEFAULT 300
+)
+RETURNS BOOLEAN AS $$
+    WITH renewed AS (
+        UPDATE public.sync_shard_leases
+        SET lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+        WHERE job = p_job AND run_id = p_run_id AND shard = p_shard
+          AND owner = p_owner AND completed_at IS NULL
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM renewed);
+$$ LANGUAGE sql VOLATILE SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.complete_sync_shard(
+    p_job TEXT, p_run_id TEXT, p_shard INTEGER, p_owner TEXT
+)
+RETURNS BOOLEAN AS $$
+    WITH completed AS (
+        UPDATE public.sync_shard_leases
+        SET completed_at = now(), lease_expires_at = NULL
+        WHERE job = p_job AND run_id = p_run_id AND shard = p_shard AND owner = p_owner
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM completed);
+$$ LANGUAGE sql VOLATILE SET search_path = public;
+
+-- Clients whose id hash falls in shard p_shard of p_shards, in id order after
+-- p_after (keyset paging, since PostgREST caps a response at max-rows).
+CREATE OR REPLACE FUNCTION public.sync_shard_clients(
+    p_shard INTEGER, p_shards INTEGER, p_after UUID DEFAULT NULL, p_limit INTEGER DEFAULT 1000
+)
+RETURNS TABLE (
+    id UUID, name TEXT, email TEXT, stripe_customer_id TEXT,
+    subscription_status TEXT, subscription_product TEXT, subscription_plan TEXT, last_payment_date DATE
+) AS $$
+    SELECT c.id, c.name, c.email, c.stripe_customer_id,
+           c.subscription_status, c.subscription_product, c.subscription_plan, c.last_payment_date
+    FROM public.clients c
+    WHERE public.client_id_hash(c.id) >= (4294967296::NUMERIC * p_shard / p_shards)
+      AND public.client_id_hash(c.id) < (4294967296::NUMERIC * (p_shard + 1) / p_shards)
+      AND (p_after IS NULL OR c.id > p_after)
+    ORDER BY c.id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE SET search_path = public;
+
+REVOKE ALL ON FUNCTION public.claim_sync_shard(TEXT, TEXT, INTEGER, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.renew_sync_shard(TEXT, TEXT, INTEGER, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.complete_sync_shard(TEXT, TEXT, INTEGER, TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.sync_shard_clients(INTEGER, INTEGER, UUID, INTEGER) FROM PUBLIC, anon, authenticated;
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,117 @@
+"""
+Change detection for the Stripe → Supabase sync.
+
+Loads the current subscription columns and synced invoices in bulk, compares
+them with freshly computed values and returns only the rows that would change,
+so unchanged clients and invoices are never rewritten.
+
+Usage:
+    current = sync_diff.load_clients(supabase, key="email")
+    changes = sync_diff.diff_fields(current[email], desired)
+    if changes:
+        ...write only `changes`...
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+SUBSCRIPTION_FIELDS = (
+    "subscription_status",
+    "subscription_product",
+    "subscription_plan",
+    "last_payment_date",
+)
+INVOICE_FIELDS = ("amount_paid", "status", "invoice_pdf")
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+
+def fetch_all_rows(supabase, table: str, columns: str,
+                   apply_filters: Optional[Callable] = None, page_size: int = PAGE_SIZE) -> List[dict]:
+    """Reads a whole table in pages; a single select() is silently capped at max-rows."""
+    rows: List[dict] = []
+    start = 0
+    while True:
+        query = supabase.table(table).select(columns)
+        if apply_filters:
+            query = apply_filters(query)
+        page = query.order("id").range(start, start + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def load_clients(supabase, key: str = "email") -> Dict[str, dict]:
+    """Returns {key: row} with id, email, stripe_customer_id and the subscription columns."""
+    columns = ",".join(("id", "name", "email", "stripe_customer_id") + SUBSCRIPTION_FIELDS)
+    clients: Dict[str, dict] = {}
+    for row in fetch_all_rows(supabase, "clients", columns):
+        value = row.get(key)
+        if value:
+            clients[value.lower() if key == "email" else value] = row
+    return clients
+
+
+def load_invoices(supabase) -> Dict[str, dict]:
+    """Returns {stripe_invoice_id: row} for every synced invoice."""
+    columns = ",".join(("id", "client_id", "stripe_invoice_id") + INVOICE_FIELDS)
+    return {
+        row["stripe_invoice_id"]: row
+        for row in fetch_all_rows(supabase, "invoices", columns,
+                                  lambda q: q.not_.is_("stripe_invoice_id", "null"))
+    }
+
+
+def _normalise(field: str, value):
+    if value in ("", None):
+        return None
+    if field == "last_payment_date":
+        # DATE column: the webhook writes full ISO timestamps, the scripts write YYYY-MM-DD
+        return str(value)[:10]
+    if field == "amount_paid":
+        return round(float(value), 2)
+    return value
+
+
+def diff_fields(current: Optional[dict], desired: dict) -> dict:
+    """Returns the subset of `desired` that differs from `current`."""
+    current = current or {}
+    return {
+        field: value
+        for field, value in desired.items()
+        if _normalise(field, current.get(field)) != _normalise(field, value)
+    }
+
+
+def _field(record, name: str):
+    return record.get(name) if isinstance(record, dict) else getattr(record, name)
+
+
+def diff_invoices(invoices: Iterable, existing: Dict[str, dict],
+                  stripe_id: Callable[[object], str]) -> Tuple[list, int]:
+    """
+    Splits freshly fetched invoices (dicts or sync_records.Invoice) into those
+    that need writing and a count of those already stored with identical values.
+    """
+    pending, unchanged = [], 0
+    for inv in invoices:
+        stored = existing.get(stripe_id(inv))
+        if stored is not None and not diff_fields(
+            {f: stored.get(f) for f in INVOICE_FIELDS},
+            {f: _field(inv, f) for f in INVOICE_FIELDS},
+        ):
+            unchanged += 1
+        else:
+            pending.append(inv)
+    return pending, unchanged
+
+
+def print_plan(updates: List[Tuple[str, dict, dict]], inserts: Dict[str, int] = None):
+    """Prints the write-set: one line per changed field, plus insert counts."""
+    print(f"\n📝 Write plan: {len(updates)} client updates")
+    for label, current, changes in updates:
+        print(f"  ~ {label}")
+        for field, value in changes.items():
+            print(f"      {field}: {(current or {}).get(field) or '—'} → {value or '—'}")
+    for table, count in (inserts or {}).items():
+        print(f"  + {count} new rows in {table}")
+    print("  (plan only — nothing was written)")
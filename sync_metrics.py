@@ -0,0 +1,396 @@
+"""
+Run metrics for the sync scripts.
+
+Wraps every outbound HTTP call (Stripe, Clerk, HubSpot, PostgREST and edge
+functions) and records, per endpoint: call count, latency histogram, bytes in
+and out, 429s, errors and retries. Stages (fetch, match, write, ...) are
+recorded as spans, and calls are attributed to the stage that was open when
+they were made. While tracemalloc is tracing (python <script> --profile, see
+profiling.py) each span also records the peak traced memory inside it.
+
+Usage:
+    import sync_metrics
+
+    sync_metrics.install("sync_stripe_data")
+    with sync_metrics.stage("fetch"):
+        ...
+    sync_metrics.write_summary()
+
+The summary is written to SYNC_METRICS_DIR (default ./run_metrics) as
+<job>-<timestamp>.json plus an OpenMetrics .prom file with the same data.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ID_SEGMENT = re.compile(
+    r"/(?:(?:cus|sub|in|il|prod|price|pi|ch|evt|user|idn)_[A-Za-z0-9]+"
+    r"|(?:CA|RE)[0-9a-f]{32}|[0-9a-fA-F-]{32,36}|\d+)(?=/|$)"
+)
+
+
+def classify_url(url: str) -> Tuple[str, str]:
+    """Maps a URL to (source, endpoint) with ids collapsed to {id}."""
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    path = _ID_SEGMENT.sub("/{id}", parts.path or "/")
+
+    if "/rest/v1/" in path:
+        return "postgrest", path[path.index("/rest/v1/"):]
+    if "/functions/v1/" in path:
+        return "edge", path[path.index("/functions/v1/"):]
+    if host.endswith("stripe.com"):
+        return "stripe", path
+    if host.endswith("clerk.com"):
+        return "clerk", path
+    if host.endswith("hubapi.com"):
+        return "hubspot", path
+    if host.endswith("twilio.com"):
+        return "twilio", path
+    return host or "unknown", path
+
+
+class EndpointStats:
+    __slots__ = ("count", "errors", "rate_limited", "retries", "bytes_in", "bytes_out",
+                 "latency_sum", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, elapsed: float):
+        self.count += 1
+        self.latency_sum += elapsed
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency_sum_s": round(self.latency_sum, 6),
+            "latency_avg_s": round(self.latency_sum / self.count, 6) if self.count else 0.0,
+            "latency_buckets": {
+                **{str(b): n for b, n in zip(LATENCY_BUCKETS, self.buckets)},
+                "+Inf": self.buckets[-1],
+            },
+        }
+
+
+class Metrics:
+    def __init__(self, job: str = "sync"):
+        self.job = job
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.endpoints: Dict[Tuple[str, str], EndpointStats] = {}
+        self.stages: List[dict] = []
+        self._open_stages: List[dict] = []
+
+    # ----- recording -----
+    def _stats(self, source: str, endpoint: str) -> EndpointStats:
+        key = (source, endpoint)
+        stats = self.endpoints.get(key)
+        if stats is None:
+            stats = self.endpoints[key] = EndpointStats()
+        return stats
+
+    def record_call(self, url: str, status: Optional[int], elapsed: float,
+                    bytes_in: int = 0, bytes_out: int = 0):
+        source, endpoint = classify_url(url)
+        with self._lock:
+            stats = self._stats(source, endpoint)
+            stats.observe(elapsed)
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            if status is None or status >= 500:
+                stats.errors += 1
+            elif status == 429:
+                stats.rate_limited += 1
+            if self._open_stages:
+                span = self._open_stages[-1]
+                span["calls"] += 1
+                span["sources"][source] = span["sources"].get(source, 0) + 1
+
+    def record_retry(self, source: str, endpoint: str):
+        with self._lock:
+            self._stats(source, endpoint).retries += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        parent = self._open_stages[-1]["name"] if self._open_stages else None
+        span = {
+            "name": f"{parent}/{name}" if parent else name,
+            "start_s": round(time.perf_counter() - self._t0, 6),
+            "duration_s": None,
+            "calls": 0,
+            "sources": {},
+        }
+        with self._lock:
+            if tracemalloc.is_tracing():
+                # Credit the peak so far to the enclosing stages, then measure this one from here
+                self._fold_peak()
+                tracemalloc.reset_peak()
+                span["peak_mem_bytes"] = tracemalloc.get_traced_memory()[0]
+            self._open_stages.append(span)
+        t0 = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span["duration_s"] = round(time.perf_counter() - t0, 6)
+            with self._lock:
+                if "peak_mem_bytes" in span and tracemalloc.is_tracing():
+                    self._fold_peak()
+                self._open_stages.remove(span)
+                self.stages.append(span)
+
+    def _fold_peak(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        for open_span in self._open_stages:
+            if "peak_mem_bytes" in open_span:
+                open_span["peak_mem_bytes"] = max(open_span["peak_mem_bytes"], peak)
+
+    # ----- output -----
+    def summary(self) -> dict:
+        with self._lock:
+            endpoints = [
+                {"source": s, "endpoint": e, **stats.as_dict()}
+                for (s, e), stats in sorted(self.endpoints.items())
+            ]
+            stages = list(self.stages)
+        return {
+            "job": self.job,
+            "started_at": datetime.fromtimestamp(self.started_at, tz=timezone.utc).isoformat(),
+            "duration_s": round(time.perf_counter() - self._t0, 6),
+            "latency_buckets_s": list(LATENCY_BUCKETS),
+            "stages": stages,
+            "endpoints": endpoints,
+        }
+
+    def to_openmetrics(self) -> str:
+        data = self.summary()
+        job = data["job"]
+        lines = []
+
+        def label(**kv) -> str:
+            return "{" + ",".join(f'{k}="{v}"' for k, v in kv.items()) + "}"
+
+        counters = (
+            ("sync_http_requests", "count", "Outbound HTTP calls."),
+            ("sync_http_errors", "errors", "Calls that failed or returned 5xx."),
+            ("sync_http_rate_limited", "rate_limited", "Calls answered with 429."),
+            ("sync_http_retries", "retries", "Retries issued by the sync scripts."),
+            ("sync_http_response_bytes", "bytes_in", "Response bytes received."),
+            ("sync_http_request_bytes", "bytes_out", "Request bytes sent."),
+        )
+        for name, field, help_text in counters:
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"# HELP {name} {help_text}")
+            for ep in data["endpoints"]:
+                lines.append(f"{name}_total{label(job=job, source=ep['source'], endpoint=ep['endpoint'])} {ep[field]}")
+
+        name = "sync_http_request_duration_seconds"
+        lines.append(f"# TYPE {name} histogram")
+        lines.append(f"# HELP {name} Outbound HTTP call latency.")
+        for ep in data["endpoints"]:
+            base = dict(job=job, source=ep["source"], endpoint=ep["endpoint"])
+            cumulative = 0
+            for le, n in ep["latency_buckets"].items():
+                cumulative += n
+                lines.append(f"{name}_bucket{label(**base, le=le)} {cumulative}")
+            lines.append(f"{name}_sum{label(**base)} {ep['latency_sum_s']}")
+            lines.append(f"{name}_count{label(**base)} {ep['count']}")
+
+        name = "sync_stage_duration_seconds"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"# HELP {name} Wall time spent in each stage of the run.")
+        for span in data["stages"]:
+            lines.append(f"{name}{label(job=job, stage=span['name'])} {span['duration_s']}")
+
+        name = "sync_run_duration_seconds"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{label(job=job)} {data['duration_s']}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started_at, tz=timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        base = os.path.join(directory, f"{self.job}-{stamp}")
+        with open(base + ".json", "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(base + ".prom", "w") as f:
+            f.write(self.to_openmetrics())
+        return base + ".json"
+
+
+# ------------------------------------------------------------------
+#  Transport hooks
+# ------------------------------------------------------------------
+_metrics = Metrics()
+_installed = False
+
+
+def _body_len(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    return 0
+
+
+def _content_length(headers) -> int:
+    try:
+        return int(headers.get("Content-Length") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _patch_requests():
+    """requests covers Clerk, the HubSpot batch calls and Stripe's default client."""
+    try:
+        import requests
+    except ImportError:
+        return
+
+    original = requests.Session.send
+
+    def send(self, request, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            resp = original(self, request, **kwargs)
+        except Exception:
+            _metrics.record_call(request.url, None, time.perf_counter() - t0, 0, _body_len(request.body))
+            raise
+        size = _content_length(resp.headers) if kwargs.get("stream") else len(resp.content or b"")
+        _metrics.record_call(request.url, resp.status_code, time.perf_counter() - t0,
+                             size, _body_len(request.body))
+        return resp
+
+    requests.Session.send = send
+
+
+def _patch_httpx():
+    """httpx covers supabase-py: PostgREST, RPC and edge function calls."""
+    try:
+        import httpx
+    except ImportError:
+        return
+
+    original = httpx.Client.send
+
+    def send(self, request, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            resp = original(self, request, **kwargs)
+        except Exception:
+            _metrics.record_call(str(request.url), None, time.perf_counter() - t0)
+            raise
+        if kwargs.get("stream"):
+            size = _content_length(resp.headers)
+        else:
+            size = len(resp.content or b"")
+        _metrics.record_call(str(request.url), resp.status_code, time.perf_counter() - t0,
+                             size, len(request.content or b""))
+        return resp
+
+    httpx.Client.send = send
+
+
+def _patch_urllib3():
+    """The HubSpot SDK talks to urllib3's PoolManager directly."""
+    try:
+        import urllib3
+    except ImportError:
+        return
+
+    original = urllib3.PoolManager.urlopen
+
+    def urlopen(self, method, url, redirect=True, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            resp = original(self, method, url, redirect=redirect, **kwargs)
+        except Exception:
+            _metrics.record_call(url, None, time.perf_counter() - t0)
+            raise
+        if kwargs.get("preload_content", True):
+            size = len(resp.data or b"")
+        else:
+            size = _content_length(resp.headers)
+        _metrics.record_call(url, resp.status, time.perf_counter() - t0,
+                             size, _body_len(kwargs.get("body")))
+        return resp
+
+    urllib3.PoolManager.urlopen = urlopen
+
+
+def install(job: str) -> Metrics:
+    """Starts a fresh run for `job` and hooks the HTTP transports (once per process)."""
+    global _metrics, _installed
+    _metrics = Metrics(job)
+    if not _installed:
+        _patch_requests()
+        _patch_httpx()
+        _patch_urllib3()
+        _installed = True
+    return _metrics
+
+
+def current() -> Metrics:
+    return _metrics
+
+
+def stage(name: str):
+    return _metrics.stage(name)
+
+
+def record_retry(source: str, endpoint: str):
+    _metrics.record_retry(source, endpoint)
+
+
+def write_summary(directory: Optional[str] = None) -> str:
+    """Writes the run summary and prints a per-source and per-stage breakdown."""
+    directory = directory or os.getenv("SYNC_METRICS_DIR", "run_metrics")
+    data = _metrics.summary()
+
+    by_source: Dict[str, List[float]] = {}
+    for ep in data["endpoints"]:
+        totals = by_source.setdefault(ep["source"], [0, 0.0, 0, 0])
+        totals[0] += ep["count"]
+        totals[1] += ep["latency_sum_s"]
+        totals[2] += ep["rate_limited"]
+        totals[3] += ep["retries"]
+
+    print(f"\n📈 Run metrics for {data['job']} ({data['duration_s']:.1f}s):")
+    for source, (count, seconds, limited, retries) in sorted(by_source.items()):
+        print(f"  {source:10} {count:7d} calls  {seconds:8.1f}s  429s: {limited}  retries: {retries}")
+    for span in data["stages"]:
+        peak = f"  peak {span['peak_mem_bytes'] / 2**20:.1f} MiB" if "peak_mem_bytes" in span else ""
+        print(f"  stage {span['name']:20} {span['duration_s']:8.1f}s  {span['calls']} calls{peak}")
+
+    path = _metrics.write(directory)
+    print(f"  Written to {path}")
+    return path
@@ -0,0 +1,92 @@
+"""
+Compact record types for the in-memory sync datasets.
+
+The sync scripts hold one entry per customer / user for the whole run. Raw
+API payloads (StripeObjects, full Clerk user JSON) are converted to these
+records as soon as they are read and then dropped, so memory stays
+proportional to the fields actually used.
+
+Records are NamedTuples: no per-instance __dict__, and they unpack like the
+plain tuples the scripts used before, e.g.
+    status, product, last_paid, plan, invoices = summary[email]
+
+Low-cardinality strings (statuses, product and plan names, dates) are
+interned so 100k customers share one copy of "active".
+"""
+
+import sys
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional, Tuple
+
+
+def intern(value: Optional[str]) -> str:
+    """Interns a repeated string; None and "" become ""."""
+    return sys.intern(value) if value else ""
+
+
+class Contact(NamedTuple):
+    email: str
+    phone: str
+
+
+class Invoice(NamedTuple):
+    id: str
+    amount_paid: float
+    created: str          # YYYY-MM-DD
+    status: str
+    invoice_pdf: Optional[str]
+
+    @classmethod
+    def from_stripe(cls, inv) -> "Invoice":
+        return cls(
+            inv.id,
+            inv.amount_paid / 100.0,
+            intern(datetime.fromtimestamp(inv.created, tz=timezone.utc).strftime("%Y-%m-%d")),
+            intern(inv.status),
+            inv.invoice_pdf,
+        )
+
+
+class SubscriptionSummary(NamedTuple):
+    status: str
+    product: str
+    last_paid: str        # YYYY-MM-DD or ""
+    plan: str
+    invoices: Tuple[Invoice, ...]
+
+    @classmethod
+    def of(cls, status, product, last_paid, plan, invoices=()) -> "SubscriptionSummary":
+        return cls(intern(status), intern(product), intern(last_paid), intern(plan), tuple(invoices))
+
+
+NOT_IN_STRIPE = SubscriptionSummary.of("Not in Stripe", "", "", "")
+
+
+class ClerkUser(NamedTuple):
+    id: str
+    name: str
+    email: Optional[str]
+    phone: Optional[str]  # primary phone as entered, not normalised
+    created_at: Optional[int]  # milliseconds since the epoch
+    updated_at: Optional[int] = None  # milliseconds since the epoch
+
+    @classmethod
+    def from_api(cls, user: dict) -> "ClerkUser":
+        """Keeps the primary email/phone (falling back to the first one) and nothing else."""
+        first_name = user.get('first_name') or ''
+        last_name = user.get('last_name') or ''
+        return cls(
+            user.get('id'),
+            f"{first_name} {last_name}".strip() or 'Unknown',
+            _primary(user.get('email_addresses') or [], user.get('primary_email_address_id'), 'email_address'),
+            _primary(user.get('phone_numbers') or [], user.get('primary_phone_number_id'), 'phone_number'),
+            user.get('created_at'),
+            user.get('updated_at'),
+        )
+
+
+def _primary(entries: list, primary_id: Optional[str], field: str) -> Optional[str]:
+    for entry in entries:
+        if entry.get('id') == primary_id:
+            return entry.get(field)
+    return entries[0].get(field) if entries else None
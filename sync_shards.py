@@ -0,0 +1,146 @@
+"""
+Sharded execution for the per-client Stripe sync.
+
+Clients are split into `shards` contiguous ranges of a 32-bit hash of
+clients.id. Workers (processes on one machine or on several) claim one range
+at a time through the sync_shard_leases table, sync it, and mark it
+completed. A claimed shard's lease is renewed by a heartbeat thread; if the
+worker dies, the lease runs out and the next claim picks the shard up again.
+
+All workers of one run must use the same job name, run id and shard count.
+Running the same command on another machine adds workers to the run.
+
+Usage:
+    import sync_shards
+
+    def sync_range(shard, clients):
+        ...
+
+    sync_shards.run_worker(supabase, "sync_stripe_data", run_id, shards=32, work=sync_range)
+
+See supabase/migrations/20250814000000_create_sync_shard_leases.sql.
+"""
+
+import hashlib
+import os
+import socket
+import threading
+import uuid
+from typing import Callable, Iterator, List
+
+import sync_metrics
+
+HASH_SPACE = 2 ** 32
+DEFAULT_LEASE_SECONDS = 300
+PAGE_SIZE = 1000
+
+
+def client_hash(client_id: str) -> int:
+    """Same value as public.client_id_hash()."""
+    return int(hashlib.md5(str(client_id).encode()).hexdigest()[:8], 16)
+
+
+def shard_of(client_id: str, shards: int) -> int:
+    return client_hash(client_id) * shards // HASH_SPACE
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def iter_shard_clients(supabase, shard: int, shards: int) -> Iterator[dict]:
+    """Clients in the shard with the columns sync_diff.load_clients() returns."""
+    after = None
+    while True:
+        page = supabase.rpc('sync_shard_clients', {
+            'p_shard': shard, 'p_shards': shards, 'p_after': after, 'p_limit': PAGE_SIZE,
+        }).execute().data or []
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        after = page[-1]['id']
+
+
+class ShardLease:
+    """A claimed shard, renewed in the background until it is released."""
+
+    def __init__(self, supabase, job: str, run_id: str, shard: int, owner: str, lease_seconds: int):
+        self.supabase = supabase
+        self.job = job
+        self.run_id = run_id
+        self.shard = shard
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def _params(self) -> dict:
+        return {'p_job': self.job, 'p_run_id': self.run_id, 'p_shard': self.shard, 'p_owner': self.owner}
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                renewed = self.supabase.rpc('renew_sync_shard', {
+                    **self._params(), 'p_lease_seconds': self.lease_seconds,
+                }).execute().data
+            except Exception as e:
+                print(f"  ⚠️  Could not renew lease on shard {self.shard}: {e}")
+                continue
+            if not renewed:
+                print(f"  ⚠️  Lease on shard {self.shard} was taken over by another worker")
+                self.lost = True
+                return
+
+    def complete(self) -> bool:
+        self._stop.set()
+        self._thread.join()
+        return bool(self.supabase.rpc('complete_sync_shard', self._params()).execute().data)
+
+    def abandon(self):
+        """Stops renewing; the shard becomes claimable once the lease expires."""
+        self._stop.set()
+        self._thread.join()
+
+
+def claim(supabase, job: str, run_id: str, shards: int, owner: str,
+          lease_seconds: int = DEFAULT_LEASE_SECONDS):
+    """Returns a ShardLease, or None when the run has no claimable shard left."""
+    shard = supabase.rpc('claim_sync_shard', {
+        'p_job': job, 'p_run_id': run_id, 'p_shards': shards,
+        'p_owner': owner, 'p_lease_seconds': lease_seconds,
+    }).execute().data
+    if shard is None:
+        return None
+    return ShardLease(supabase, job, run_id, shard, owner, lease_seconds)
+
+
+def run_worker(supabase, job: str, run_id: str, shards: int,
+               work: Callable[[int, List[dict]], None],
+               lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[int]:
+    """
+    Claims and processes shards until none are left; returns the shards this
+    worker completed. A shard whose work raises is abandoned so that another
+    worker retries it after the lease expires.
+    """
+    owner = worker_id()
+    done = []
+    while True:
+        lease = claim(supabase, job, run_id, shards, owner, lease_seconds)
+        if lease is None:
+            return done
+        print(f"\n🧩 {owner}: shard {lease.shard + 1}/{shards} of {job} run {run_id}")
+        try:
+            with sync_metrics.stage(f"shard_{lease.shard}"):
+                work(lease.shard, list(iter_shard_clients(supabase, lease.shard, shards)))
+        except Exception as e:
+            lease.abandon()
+            print(f"  ❌ Shard {lease.shard} failed, leaving it for another worker: {e}")
+            raise
+        if lease.lost:
+            lease.abandon()
+            print(f"  ⚠️  Shard {lease.shard} finished after its lease was taken over; not marking it complete")
+            continue
+        lease.complete()
+        done.append(lease.shard)
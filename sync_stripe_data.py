@@ -7,18 +7,36 @@ in your Supabase database with their subscription information.
 
 Usage:
     python sync_stripe_data.py
+    python sync_stripe_data.py --plan    # print the changed rows, write nothing
+    python sync_stripe_data.py --shards 32 --workers 4    # sharded, see sync_shards.py
+
+With --shards, clients are split into hash ranges of clients.id that workers
+claim through the sync_shard_leases table. Start the same command (same
+--shards and --run-id) on other machines to add workers; shards of a crashed
+worker are picked up again once their lease expires. Without --run-id each
+invocation starts a fresh run and prints its id; pass that id to resume it.
 
 Requirements:
     - STRIPE_SECRET_KEY in .env file
     - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file
 """
 
+import argparse
+import multiprocessing
 import os
+import sys
 import stripe
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+import profiling
+import resilience
+import sync_diff
+import sync_metrics
+import sync_shards
+from api_endpoints import configure_stripe
+
 
 def get_supabase_client() -> Client:
     """Initialize Supabase client"""
@@ -32,13 +50,13 @@ def get_supabase_client() -> Client:
 
 
 def get_clients_from_supabase(supabase: Client):
-    """Fetch all clients from Supabase"""
+    """Fetch all clients from Supabase, with their current subscription columns"""
     print("🔄 Fetching clients from Supabase...")
     try:
-        result = supabase.table('clients').select('id, name, email, stripe_customer_id').execute()
-        if result.data:
-            print(f"✅ Found {len(result.data)} clients in Supabase.")
-            return result.data
+        clients = list(sync_diff.load_clients(supabase, key="id").values())
+        if clients:
+            print(f"✅ Found {len(clients)} clients in Supabase.")
+            return clients
         else:
             print("  ⚠️ No clients found in Supabase.")
             return []
@@ -47,15 +65,22 @@ def get_clients_from_supabase(supabase: Client):
         raise
 
 
-def sync_stripe_data_for_clients(supabase: Client, clients: list):
-    """Update existing clients in Supabase with Stripe subscription data"""
+def sync_stripe_data_for_clients(supabase: Client, clients: list, plan: bool = False):
+    """
+    Update existing clients in Supabase with Stripe subscription data.
+    Only columns that differ from the client row are written; with plan=True
+    the changes are printed instead.
+    """
     print(f"\n🔄 Updating clients with Stripe data...")
     
     updated_count = 0
+    unchanged_count = 0
     not_found_count = 0
     error_count = 0
+    planned = []
     
     stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    configure_stripe(stripe)
 
     for client in clients:
         client_id = client['id']
@@ -70,7 +95,8 @@ def sync_stripe_data_for_clients(supabase: Client, clients: list):
 
         try:
             # Fetch subscription data from Stripe
-            subscriptions = stripe.Subscription.list(customer=stripe_customer_id, limit=10).data
+            subscriptions = resilience.call("stripe", stripe.Subscription.list,
+                                            customer=stripe_customer_id, limit=10).data
 
             if not subscriptions:
                 print(f"  ℹ️  No subscriptions found for {client_name} ({email}) in Stripe.")
@@ -89,8 +115,10 @@ def sync_stripe_data_for_clients(supabase: Client, clients: list):
                 update_data['subscription_plan'] = price['nickname'] or price['id']
                 if price['product']:
                     try:
-                        product = stripe.Product.retrieve(price['product'])
+                        product = resilience.call("stripe", stripe.Product.retrieve, price['product'])
                         update_data['subscription_product'] = product.name
+                    except resilience.CircuitOpen:
+                        raise
                     except Exception as e:
                         print(f"      ⚠️  Could not retrieve product {price['product']}: {e}")
                         update_data['subscription_product'] = price['product']
@@ -98,54 +126,89 @@ def sync_stripe_data_for_clients(supabase: Client, clients: list):
             # Get last payment date
             if sub['latest_invoice']:
                 try:
-                    invoice = stripe.Invoice.retrieve(sub['latest_invoice'])
+                    invoice = resilience.call("stripe", stripe.Invoice.retrieve, sub['latest_invoice'])
                     if invoice.status_transitions and invoice.status_transitions.paid_at:
                         update_data['last_payment_date'] = datetime.fromtimestamp(
                             invoice.status_transitions.paid_at, tz=timezone.utc
                         ).strftime("%Y-%m-%d")
+                except resilience.CircuitOpen:
+                    raise
                 except Exception as e:
                     print(f"      ⚠️  Could not retrieve invoice {sub['latest_invoice']}: {e}")
 
+            # Skip the write when nothing changed
+            changes = sync_diff.diff_fields(client, update_data)
+            if not changes:
+                unchanged_count += 1
+                continue
+            if plan:
+                planned.append((f"{client_name} ({email})", client, changes))
+                continue
+
             # Update client in Supabase
-            supabase.table('clients').update(update_data).eq('id', client_id).execute()
+            supabase.table('clients').update(changes).eq('id', client_id).execute()
             print(f"  ✅ Synced {client_name} ({email}): {update_data.get('subscription_status')}")
             updated_count += 1
 
+        except resilience.CircuitOpen as e:
+            print(f"  ❌ Stopping: {e}")
+            error_count += 1
+            break
         except Exception as e:
             print(f"  ❌ Error syncing data for {client_name} ({email}): {e}")
             error_count += 1
     
+    if plan:
+        sync_diff.print_plan(planned)
+        updated_count = len(planned)
+
     print(f"\n📊 Sync Results:")
     print(f"  ✅ Updated: {updated_count} clients")
+    print(f"  ⏭️  Unchanged: {unchanged_count} clients")
     print(f"  ⚠️  Not found: {not_found_count} emails")
     print(f"  ❌ Errors: {error_count} clients")
     
     return updated_count
 
 
-def sync_invoices(supabase: Client):
-    """Fetch all Stripe invoices and sync them to the Supabase invoices table."""
+def sync_invoices(supabase: Client, plan: bool = False, clients: list = None, existing_invoice_ids: set = None):
+    """
+    Fetch all Stripe invoices and sync them to the Supabase invoices table.
+    Already-synced invoice ids are loaded once up front instead of being
+    checked one query per invoice; with plan=True nothing is inserted.
+    `clients` and `existing_invoice_ids` restrict the run to one shard and
+    reuse a set loaded by the caller.
+    """
     print("\n\n---\n🔄 Syncing Stripe invoices...")
 
     # 1. Get all clients from Supabase to map stripe_customer_id to client_id
-    clients_result = supabase.table('clients').select('id, stripe_customer_id').neq('stripe_customer_id', 'null').execute()
-    if not clients_result.data:
+    if clients is None:
+        clients = sync_diff.fetch_all_rows(supabase, 'clients', 'id, stripe_customer_id',
+                                           lambda q: q.neq('stripe_customer_id', 'null'))
+    clients = [c for c in clients if c.get('stripe_customer_id')]
+    if not clients:
         print("  ⚠️ No clients with Stripe customer IDs found in Supabase.")
         return
 
-    client_map = {client['stripe_customer_id']: client['id'] for client in clients_result.data}
+    client_map = {client['stripe_customer_id']: client['id'] for client in clients}
     print(f"  Found {len(client_map)} clients with Stripe IDs.")
 
+    if existing_invoice_ids is None:
+        existing_invoice_ids = set(sync_diff.load_invoices(supabase))
+    print(f"  Found {len(existing_invoice_ids)} invoices already synced.")
+
     # 2. Fetch invoices from Stripe and upsert to Supabase
     total_invoices_synced = 0
     error_count = 0
     
     stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    configure_stripe(stripe)
 
     for stripe_customer_id, client_id in client_map.items():
         try:
             # Fetch only paid invoices from Stripe to be more efficient
-            invoices = stripe.Invoice.list(
+            invoices = resilience.call(
+                "stripe", stripe.Invoice.list,
                 customer=stripe_customer_id,
                 status='paid',
                 limit=100
@@ -156,12 +219,14 @@ def sync_invoices(supabase: Client):
                  if invoice.billing_reason not in ['subscription_create', 'subscription_cycle']:
                      continue
 
-                 try:
-                     # Check if invoice already exists to prevent duplicates
-                     result = supabase.table('invoices').select('id').eq('stripe_invoice_id', invoice.id).execute()
-                     if result.data:
-                         continue  # Skip if invoice is already synced
+                 # Skip if invoice is already synced
+                 if invoice.id in existing_invoice_ids:
+                     continue
+                 if plan:
+                     total_invoices_synced += 1
+                     continue
 
+                 try:
                      # Call the RPC function to insert the invoice
                      supabase.rpc('insert_invoice', {
                          'p_client_id': client_id,
@@ -173,25 +238,100 @@ def sync_invoices(supabase: Client):
                      }).execute()
                      
                      total_invoices_synced += 1
+                     existing_invoice_ids.add(invoice.id)
 
                  except Exception as e:
                      print(f"    ❌ Error inserting invoice {invoice.id} for {stripe_customer_id}: {e}")
                      error_count += 1
 
+        except resilience.CircuitOpen as e:
+            print(f"  ❌ Stopping: {e}")
+            error_count += 1
+            break
         except Exception as e:
             print(f"  ❌ Error syncing invoices for Stripe customer {stripe_customer_id}: {e}")
             error_count += 1
 
     print("\n📊 Invoice Sync Results:")
-    print(f"  ✅ Synced: {total_invoices_synced} invoices")
+    if plan:
+        print(f"  📝 Would insert: {total_invoices_synced} invoices (plan only)")
+    else:
+        print(f"  ✅ Synced: {total_invoices_synced} invoices")
     print(f"  ❌ Errors: {error_count} clients")
 
-def main():
+def run_shard_worker(shards: int, run_id: str, worker: int = 0):
+    """One worker: claims shards of the run and syncs them until none are left."""
+    load_dotenv()
+    sync_metrics.install(f"sync_stripe_data-worker{worker}")
+    try:
+        supabase = get_supabase_client()
+        existing_invoice_ids = set(sync_diff.load_invoices(supabase))
+
+        def sync_shard(shard: int, clients: list):
+            sync_stripe_data_for_clients(supabase, clients)
+            sync_invoices(supabase, clients=clients, existing_invoice_ids=existing_invoice_ids)
+            # Both loops stop early when Stripe is unavailable; leave the shard unfinished
+            stripe_breaker = resilience.breaker("stripe")
+            if stripe_breaker.is_open:
+                raise resilience.CircuitOpen("stripe", stripe_breaker.reason)
+
+        done = sync_shards.run_worker(supabase, "sync_stripe_data", run_id, shards, sync_shard)
+        if not done:
+            print(f"\n⚠️  Worker {worker} claimed no shards: run {run_id} is already complete or held by other workers.")
+        else:
+            print(f"\n🎉 Worker {worker} finished {len(done)} shard(s) of run {run_id}.")
+    finally:
+        sync_metrics.write_summary()
+
+
+def run_sharded(shards: int, workers: int, run_id: str) -> int:
+    """Runs `workers` shard workers on this machine; returns 1 if any of them failed."""
+    if workers == 1:
+        try:
+            run_shard_worker(shards, run_id)
+        except Exception as e:
+            print(f"❌ Worker failed: {e}; rerun with --run-id {run_id} to finish.")
+            return 1
+        return 0
+    processes = [multiprocessing.Process(target=run_shard_worker, args=(shards, run_id, i))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    failed = sum(1 for process in processes if process.exitcode)
+    if failed:
+        print(f"❌ {failed} of {workers} workers exited with an error; rerun with --run-id {run_id} to finish.")
+        return 1
+    return 0
+
+
+def main(argv=None):
     """Main sync function"""
+    parser = argparse.ArgumentParser(description="Sync Stripe subscription data and invoices to Supabase")
+    parser.add_argument("--plan", action="store_true", help="print the changed rows instead of writing them")
+    parser.add_argument("--shards", type=int, help="split clients into this many hash ranges claimed via leases")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes to start on this machine (with --shards)")
+    parser.add_argument("--run-id",
+                        help="identifies one sharded run across machines; pass it to join or resume a run "
+                             "(default: a new id from the current UTC time)")
+    args = parser.parse_args(argv)
+    if args.shards and args.plan:
+        parser.error("--plan cannot be combined with --shards")
+
+    if args.shards:
+        run_id = args.run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        print(f"🚀 Starting sharded Stripe sync: run {run_id}, {args.shards} shards, {args.workers} worker(s)")
+        if not args.run_id:
+            print(f"   New run; add workers or resume it with --run-id {run_id}")
+        print()
+        return run_sharded(args.shards, args.workers, run_id)
+
     print("🚀 Starting Stripe subscription data sync...\n")
     
     # Load environment variables
     load_dotenv()
+    sync_metrics.install("sync_stripe_data")
     
     try:
         # Initialize Supabase client
@@ -199,15 +339,18 @@ def main():
         print("✅ Connected to Supabase")
         
         # 1. Get clients from our database
-        clients = get_clients_from_supabase(supabase)
+        with sync_metrics.stage("fetch_clients"):
+            clients = get_clients_from_supabase(supabase)
         if not clients:
             return
 
         # 2. Sync subscription data for those clients
-        updated_count = sync_stripe_data_for_clients(supabase, clients)
+        with sync_metrics.stage("sync_subscriptions"):
+            updated_count = sync_stripe_data_for_clients(supabase, clients, plan=args.plan)
 
         # 3. Sync invoices for all clients with a stripe_customer_id
-        sync_invoices(supabase)
+        with sync_metrics.stage("sync_invoices"):
+            sync_invoices(supabase, plan=args.plan)
         
         print(f"\n🎉 Sync complete! Successfully updated {updated_count} client records.")
         print("\n💡 Next steps:")
@@ -221,7 +364,10 @@ def main():
         print("  1. Check your .env file has real API keys (not placeholders)")
         print("  2. Verify your Stripe account has customers")
         print("  3. Ensure your Supabase database is accessible")
+        return 1
+    finally:
+        sync_metrics.write_summary()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(profiling.run("sync_stripe_data", main))
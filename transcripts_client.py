@@ -0,0 +1,67 @@
+"""
+Iterator client for the get-all-transcripts edge function.
+
+Walks every matching call with the function's keyset mode: each request
+passes the (start_time, _id) of the last call it got back, so a page is an
+index range scan and a full traversal costs O(n), where page=N&limit=M
+paging re-skips everything before it on every request. The total count is
+not computed unless asked for.
+
+Usage:
+    import transcripts_client
+
+    for call in transcripts_client.iter_transcripts(supabase, since="2025-07-01T00:00:00Z"):
+        ...
+
+Filters are the function's own body fields: userEmail, search, date, since,
+sentiment and tag.
+"""
+
+import json
+from typing import Iterator, Optional
+
+FUNCTION = "get-all-transcripts"
+PAGE_SIZE = 500
+
+
+class TranscriptsError(Exception):
+    pass
+
+
+def _invoke(supabase, body: dict) -> dict:
+    response = supabase.functions.invoke(FUNCTION, {"body": body})
+    data = response.data if hasattr(response, "data") else response
+    if isinstance(data, bytes):
+        data = json.loads(data.decode("utf-8"))
+    if "error" in data:
+        raise TranscriptsError(f"Edge Function error: {data['error']}")
+    return data
+
+
+def iter_pages(supabase, page_size: int = PAGE_SIZE, include_count: bool = False,
+               **filters) -> Iterator[dict]:
+    """Yields the function's keyset responses: transcripts, hasNextPage, nextCursor (and totalCount)."""
+    cursor = {}
+    while True:
+        data = _invoke(supabase, {
+            **filters, **cursor,
+            "keyset": True, "limit": page_size, "include_count": include_count,
+        })
+        yield data
+        # Only the first page needs to count
+        include_count = False
+        if not data.get("hasNextPage") or not data.get("nextCursor"):
+            return
+        cursor = data["nextCursor"]
+
+
+def iter_transcripts(supabase, page_size: int = PAGE_SIZE, **filters) -> Iterator[dict]:
+    """Yields every call matching `filters`, newest first."""
+    for page in iter_pages(supabase, page_size, **filters):
+        yield from page.get("transcripts", [])
+
+
+def count_transcripts(supabase, **filters) -> Optional[int]:
+    """The number of matching calls, from a one-row page."""
+    page = next(iter_pages(supabase, page_size=1, include_count=True, **filters))
+    return page.get("totalCount")
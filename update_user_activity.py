@@ -18,12 +18,16 @@ Environment variables required:
 """
 
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import logging
 import requests
 
+import profiling
+import sync_metrics
+import transcripts_client
+
 # Load environment variables
 load_dotenv()
 
@@ -48,39 +52,20 @@ def get_users_with_recent_calls(supabase_client):
     """Get list of user emails who have made calls in the last 30 days using Edge Function."""
     try:
         # Calculate date 30 days ago
-        thirty_days_ago = datetime.now() - timedelta(days=30)
+        thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
         
         logger.info(f"Checking for calls since {thirty_days_ago}")
         
-        # Use the existing get-all-transcripts Edge Function to get recent calls
-        # We'll fetch all transcripts and filter by date
-        response = supabase_client.functions.invoke('get-all-transcripts', {
-            'body': {
-                'page': 1,
-                'limit': 10000,  # Large limit to get all recent transcripts
-                'date': '30days'  # Filter for last 30 days
-            }
-        })
-        
-        # Parse the response properly
-        if hasattr(response, 'data'):
-            data = response.data
-        else:
-            data = response
-            
-        if isinstance(data, bytes):
-            import json
-            data = json.loads(data.decode('utf-8'))
-        
-        if 'error' in data:
-            raise Exception(f"Edge Function error: {data['error']}")
-        
-        transcripts = data.get('transcripts', [])
-        logger.info(f"Found {len(transcripts)} transcripts from the last 30 days")
+        # Walk the get-all-transcripts Edge Function page by page (keyset
+        # cursor, no count) instead of one limit: 10000 request
+        transcript_count = 0
         
         # Extract unique user emails from transcripts
         active_users = set()
-        for transcript in transcripts:
+        for transcript in transcripts_client.iter_transcripts(
+            supabase_client, since=thirty_days_ago.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        ):
+            transcript_count += 1
             # The transcript should have agent_email field from the Edge Function
             if 'agent_email' in transcript and transcript['agent_email']:
                 active_users.add(transcript['agent_email'])
@@ -90,6 +75,7 @@ def get_users_with_recent_calls(supabase_client):
             elif 'agent' in transcript and 'created_by' in transcript['agent']:
                 active_users.add(transcript['agent']['created_by'])
         
+        logger.info(f"Found {transcript_count} transcripts from the last 30 days")
         logger.info(f"Found {len(active_users)} unique users with recent activity")
         
         # Log the active users for visibility
@@ -113,11 +99,13 @@ def check_user_activity():
         logger.info("Connected to Supabase")
         
         # Get users with recent calls
-        active_user_emails = get_users_with_recent_calls(supabase_client)
+        with sync_metrics.stage("fetch_calls"):
+            active_user_emails = get_users_with_recent_calls(supabase_client)
         
         # Get all users from Supabase
-        response = supabase_client.table('clients').select('email, is_using_platform').execute()
-        all_users = response.data
+        with sync_metrics.stage("fetch_clients"):
+            response = supabase_client.table('clients').select('email, is_using_platform').execute()
+            all_users = response.data
         
         logger.info(f"Found {len(all_users)} total users in Supabase")
         
@@ -126,23 +114,24 @@ def check_user_activity():
         users_deactivated = 0
         
         # Update each user's status
-        for user in all_users:
-            user_email = user['email']
-            current_status = user.get('is_using_platform', False)
-            should_be_active = user_email in active_user_emails
-            
-            if current_status != should_be_active:
-                # Update the user's status
-                update_response = supabase_client.table('clients').update({
-                    'is_using_platform': should_be_active
-                }).eq('email', user_email).execute()
+        with sync_metrics.stage("write"):
+            for user in all_users:
+                user_email = user['email']
+                current_status = user.get('is_using_platform', False)
+                should_be_active = user_email in active_user_emails
                 
-                if should_be_active:
-                    users_activated += 1
-                    logger.info(f"Activated user: {user_email}")
-                else:
-                    users_deactivated += 1
-                    logger.info(f"Deactivated user: {user_email}")
+                if current_status != should_be_active:
+                    # Update the user's status
+                    update_response = supabase_client.table('clients').update({
+                        'is_using_platform': should_be_active
+                    }).eq('email', user_email).execute()
+                    
+                    if should_be_active:
+                        users_activated += 1
+                        logger.info(f"Activated user: {user_email}")
+                    else:
+                        users_deactivated += 1
+                        logger.info(f"Deactivated user: {user_email}")
         
         # Log summary
         logger.info(f"Update complete:")
@@ -154,11 +143,19 @@ def check_user_activity():
         logger.error(f"Error in check_user_activity: {e}")
         raise
 
-if __name__ == "__main__":
+def main():
+    """Runs one update; returns the process exit code."""
+    sync_metrics.install("update_user_activity")
     try:
         logger.info("Starting user activity update script")
         check_user_activity()
         logger.info("User activity update script completed successfully")
+        return 0
     except Exception as e:
         logger.error(f"Script failed: {e}")
-        exit(1)
\ No newline at end of file
+        return 1
+    finally:
+        sync_metrics.write_summary()
+
+if __name__ == "__main__":
+    exit(profiling.run("update_user_activity", main))
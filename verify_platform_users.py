@@ -3,11 +3,15 @@
 Script to verify which users have is_using_platform set to true in Supabase.
 """
 
+import argparse
 import os
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import logging
 
+from client_stats import fetch_client_stats, platform_users_count
+import profiling
+
 # Load environment variables
 load_dotenv()
 
@@ -28,40 +32,47 @@ def get_supabase_client():
     
     return create_client(supabase_url, supabase_key)
 
-def verify_platform_users():
+def verify_platform_users(list_users: bool = True):
     """Verify which users are marked as using the platform."""
     try:
         supabase_client = get_supabase_client()
         
-        # Get all users with is_using_platform = true
-        response = supabase_client.table('clients').select('email, name, is_using_platform').eq('is_using_platform', True).execute()
-        active_users = response.data
-        
-        logger.info(f"Found {len(active_users)} users marked as using the platform:")
+        # Counts come from one client_stats call
+        stats = fetch_client_stats(supabase_client)
+        active_count = platform_users_count(stats)
+        total_count = stats['total']
         
-        for i, user in enumerate(sorted(active_users, key=lambda x: x['email']), 1):
-            name = user.get('name', 'No name')
-            email = user['email']
-            logger.info(f"  {i:3d}. {email} ({name})")
+        logger.info(f"Found {active_count} users marked as using the platform{':' if list_users else '.'}")
         
-        # Also get total count of all users
-        total_response = supabase_client.table('clients').select('email', count='exact').execute()
-        total_count = total_response.count
+        if list_users:
+            # Only the listing needs the rows themselves
+            response = supabase_client.table('clients').select('email, name').eq('is_using_platform', True).order('email').execute()
+            for i, user in enumerate(response.data, 1):
+                name = user.get('name', 'No name')
+                email = user['email']
+                logger.info(f"  {i:3d}. {email} ({name})")
         
         logger.info(f"\nSummary:")
-        logger.info(f"  - Users using platform: {len(active_users)}")
+        logger.info(f"  - Users using platform: {active_count}")
         logger.info(f"  - Total users in system: {total_count}")
-        logger.info(f"  - Platform usage rate: {len(active_users)/total_count*100:.1f}%")
+        if total_count:
+            logger.info(f"  - Platform usage rate: {active_count/total_count*100:.1f}%")
         
     except Exception as e:
         logger.error(f"Error verifying platform users: {e}")
         raise
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="Verify which users are marked as using the platform")
+    parser.add_argument("--summary", action="store_true", help="print the counts only (one query)")
+    args = parser.parse_args()
     try:
         logger.info("Starting platform users verification")
-        verify_platform_users()
+        verify_platform_users(list_users=not args.summary)
         logger.info("Platform users verification completed successfully")
     except Exception as e:
         logger.error(f"Script failed: {e}")
-        exit(1)
\ No newline at end of file
+        exit(1)
+
+if __name__ == "__main__":
+    profiling.run("verify_platform_users", main)
@@ -2,6 +2,9 @@ import os
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from client_stats import assignable_count, employee_count, fetch_client_stats, unassigned_count
+import profiling
+
 # Load environment variables
 load_dotenv()
 
@@ -23,21 +26,15 @@ def verify_assignments():
         sid_name = sid_response.data[0]['name']
         print(f"Checking assignments for {sid_name} (ID: {sid_id})")
         
-        # Count users assigned to sid
-        assigned_response = supabase.table('clients').select('id', count='exact').eq('employee_id', sid_id).execute()
-        assigned_count = assigned_response.count
-        
-        # Count total unassigned users
-        unassigned_response = supabase.table('clients').select('id', count='exact').is_('employee_id', 'null').execute()
-        unassigned_count = unassigned_response.count
-        
-        # Count unassigned users without heffron.ai emails
-        unassigned_no_heffron_response = supabase.table('clients').select('id', count='exact').is_('employee_id', 'null').not_.like('email', '%heffron.ai%').execute()
-        unassigned_no_heffron_count = unassigned_no_heffron_response.count
+        # All three counts come from one client_stats call
+        stats = fetch_client_stats(supabase, exclude_domains=['heffron.ai'])
+        assigned_count = employee_count(stats, sid_id)
+        unassigned_total = unassigned_count(stats)
+        unassigned_no_heffron_count = assignable_count(stats)
         
         print(f"\n=== Assignment Verification ===")
         print(f"Users assigned to {sid_name}: {assigned_count}")
-        print(f"Total unassigned users remaining: {unassigned_count}")
+        print(f"Total unassigned users remaining: {unassigned_total}")
         print(f"Unassigned users without heffron.ai emails: {unassigned_no_heffron_count}")
         
         if unassigned_no_heffron_count == 0:
@@ -49,4 +46,4 @@ def verify_assignments():
         print(f"Error verifying assignments: {e}")
 
 if __name__ == "__main__":
-    verify_assignments()
\ No newline at end of file
+    profiling.run("verify_sid_assignments", verify_assignments)
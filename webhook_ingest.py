@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Webhook Ingestion Service
+
+Accepts the same signed webhooks as the clerk-webhook and stripe-webhooks
+edge functions, but writes them in micro-batches instead of one Supabase
+round trip (plus Stripe lookups) per event:
+
+  - events are verified (svix signature for Clerk, Stripe-Signature for
+    Stripe) and buffered until the window is WEBHOOK_INGEST_WINDOW seconds
+    old or holds WEBHOOK_INGEST_MAX_EVENTS events;
+  - a flush coalesces the buffered events to the latest state per Stripe
+    customer / Clerk user and writes the changes in bulk, using the same
+    code paths as replay_stripe_events.py and add_clerk_users_to_system.py;
+  - the HTTP response is held until the event's batch is written, so a
+    failed flush answers 500 and the sender retries it;
+  - writes set columns to the latest state and invoices are inserted with
+    ignore_duplicates, so retried or duplicated deliveries are harmless.
+    Event ids already written are also answered straight away.
+
+Point the Stripe and Clerk webhook endpoints (or benchmarks/webhook_burst.py)
+at /stripe and /clerk on this service instead of the edge functions.
+
+Clerk user.deleted events are logged, not applied, as in
+add_clerk_users_to_system.py. New Clerk users are not looked up in Stripe;
+the Stripe events and syncs link them by email.
+
+Usage:
+    python webhook_ingest.py
+    python webhook_ingest.py --port 8790 --window 2 --max-events 500
+
+Requirements:
+    - STRIPE_SECRET_KEY, STRIPE_WEBHOOK_SIGNING_SECRET in .env file
+    - CLERK_WEBHOOK_SECRET in .env file
+    - VITE_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env file
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import stripe
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+import add_clerk_users_to_system as clerk_sync
+import profiling
+import replay_stripe_events
+import sync_metrics
+from api_endpoints import configure_stripe
+from sync_records import ClerkUser
+
+SIGNATURE_TOLERANCE = 300           # seconds, as in the Stripe and svix libraries
+DEFAULT_WINDOW = 2.0
+DEFAULT_MAX_EVENTS = 500
+RESPONSE_TIMEOUT = 25               # both senders give up after ~30s
+SEEN_EVENT_IDS = 50000
+CLERK_EVENT_TYPES = ("user.created", "user.updated", "user.deleted")
+
+
+def get_supabase_client() -> Client:
+    """Initialize Supabase client"""
+    url = os.getenv("VITE_SUPABASE_URL") or os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if not url or not key:
+        raise ValueError("Missing VITE_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
+
+    return create_client(url, key)
+
+
+class InvalidSignature(Exception):
+    pass
+
+
+# ------------------------------------------------------------------
+#  Signatures
+# ------------------------------------------------------------------
+def verify_stripe(body: bytes, header: str, secret: str, now: float = None) -> dict:
+    """Checks a Stripe-Signature header (t=<ts>,v1=<hex hmac of "t.body">) and returns the event."""
+    parts = [p.split("=", 1) for p in (header or "").split(",") if "=" in p]
+    timestamp = next((v for k, v in parts if k == "t"), None)
+    signatures = [v for k, v in parts if k == "v1"]
+    if not timestamp or not signatures:
+        raise InvalidSignature("Unable to extract timestamp and signatures from header")
+    expected = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, s) for s in signatures):
+        raise InvalidSignature("No signatures found matching the expected signature for payload")
+    if abs((now or time.time()) - int(timestamp)) > SIGNATURE_TOLERANCE:
+        raise InvalidSignature("Timestamp outside the tolerance zone")
+    return json.loads(body)
+
+
+def verify_svix(body: bytes, headers: dict, secret: str, now: float = None) -> dict:
+    """Checks svix-id/-timestamp/-signature (v1,<base64 hmac of "id.ts.body">) and returns the event."""
+    msg_id, timestamp, header = headers.get("svix-id"), headers.get("svix-timestamp"), headers.get("svix-signature")
+    if not msg_id or not timestamp or not header:
+        raise InvalidSignature("Missing required headers")
+    key = base64.b64decode(secret[len("whsec_"):] if secret.startswith("whsec_") else secret)
+    expected = base64.b64encode(
+        hmac.new(key, f"{msg_id}.{timestamp}.".encode() + body, hashlib.sha256).digest()
+    ).decode()
+    signatures = [s.split(",", 1)[1] for s in header.split() if s.startswith("v1,")]
+    if not any(hmac.compare_digest(expected, s) for s in signatures):
+        raise InvalidSignature("No matching signature found")
+    if abs((now or time.time()) - int(timestamp)) > SIGNATURE_TOLERANCE:
+        raise InvalidSignature("Message timestamp too old or too new")
+    return json.loads(body)
+
+
+# ------------------------------------------------------------------
+#  Batching
+# ------------------------------------------------------------------
+class Batch:
+    """Events buffered in one window. `done` is set once they are written (or failed)."""
+
+    def __init__(self):
+        self.events = OrderedDict()     # event id -> (source, event)
+        self.opened = time.monotonic()
+        self.done = threading.Event()
+        self.error = None
+
+
+class Batcher:
+    """
+    Buffers events and hands each closed window to `flush` on one background
+    thread, so batches are written in arrival order and never concurrently.
+    """
+
+    def __init__(self, flush, window: float, max_events: int):
+        self.flush = flush
+        self.window = window
+        self.max_events = max_events
+        self.batch = Batch()
+        self.ready = []                 # full batches waiting for the flush thread, oldest first
+        self.seen = OrderedDict()       # ids of events already written
+        self.cond = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, source: str, event_id: str, event: dict):
+        """Returns the Batch that will carry the event, or None if it was already written."""
+        with self.cond:
+            if event_id in self.seen:
+                return None
+            for batch in self.ready:
+                if event_id in batch.events:
+                    return batch
+            batch = self.batch
+            if event_id not in batch.events:
+                if not batch.events:
+                    batch.opened = time.monotonic()
+                batch.events[event_id] = (source, event)
+                if len(batch.events) >= self.max_events:
+                    # Closed now, so that events arriving while a flush runs start a new batch
+                    self.ready.append(batch)
+                    self.batch = Batch()
+                    self.cond.notify()
+                elif len(batch.events) == 1:
+                    # Wakes the flush thread to start the window clock
+                    self.cond.notify()
+            return batch
+
+    def _take(self):
+        """Returns the oldest full batch, or waits for the open window to expire and swaps in a new one."""
+        with self.cond:
+            while True:
+                if self.ready:
+                    return self.ready.pop(0)
+                batch = self.batch
+                if batch.events:
+                    remaining = batch.opened + self.window - time.monotonic()
+                    if remaining <= 0 or len(batch.events) >= self.max_events or self.closed:
+                        self.batch = Batch()
+                        return batch
+                    self.cond.wait(remaining)
+                elif self.closed:
+                    return None
+                else:
+                    self.cond.wait()
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            try:
+                self.flush(list(batch.events.values()))
+                with self.cond:
+                    for event_id in batch.events:
+                        self.seen[event_id] = True
+                    while len(self.seen) > SEEN_EVENT_IDS:
+                        self.seen.popitem(last=False)
+            except Exception as e:
+                batch.error = e
+                print(f"❌ Flush of {len(batch.events)} events failed: {type(e).__name__}: {e}")
+            batch.done.set()
+
+    def close(self):
+        """Flushes what is buffered and stops the flush thread."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+
+
+# ------------------------------------------------------------------
+#  Flush
+# ------------------------------------------------------------------
+def coalesce_clerk(events: list):
+    """Latest user payload per Clerk user id, and the ids whose latest event is a deletion."""
+    latest = {}
+    for event in events:
+        data = event.get("data") or {}
+        if data.get("id"):
+            latest[data["id"]] = event
+    users = [ClerkUser.from_api(e["data"]) for e in latest.values() if e["type"] != "user.deleted"]
+    deleted = [user_id for user_id, e in latest.items() if e["type"] == "user.deleted"]
+    return users, deleted
+
+
+class Ingestor:
+    """Writes one batch of verified events; holds the Supabase client and Stripe product names between flushes."""
+
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+        self.product_names = {}
+        self.totals = {"events": 0, "flushes": 0, "clients_updated": 0, "clients_inserted": 0,
+                       "invoices_inserted": 0}
+
+    def __call__(self, batch: list):
+        started = time.perf_counter()
+        stripe_events = sorted((e for source, e in batch if source == "stripe"), key=lambda e: e["created"])
+        clerk_events = [e for source, e in batch if source == "clerk"]
+
+        result = {}
+        if stripe_events:
+            result = replay_stripe_events.replay(self.supabase, stripe_events, product_names=self.product_names)
+
+        inserts, updates, deleted = [], [], []
+        if clerk_events:
+            users, deleted = coalesce_clerk(clerk_events)
+            with sync_metrics.stage("clerk"):
+                existing = clerk_sync.load_clients_by_clerk_id(self.supabase, [u.id for u in users])
+                inserts, updates, _ = clerk_sync.plan_changes(users, existing)
+                failed = clerk_sync.apply_changes(self.supabase, inserts, updates)
+            if failed:
+                # Fails the batch so that the senders retry; the rows that did go in are rewritten as no-ops
+                raise RuntimeError(f"{len(failed)} Clerk users could not be written")
+            for user_id in deleted:
+                print(f"  ⚠️  Clerk user {user_id} was deleted; its client row is left in place")
+
+        self.totals["events"] += len(batch)
+        self.totals["flushes"] += 1
+        self.totals["clients_updated"] += result.get("clients_updated", 0) + len(updates)
+        self.totals["clients_inserted"] += len(inserts)
+        self.totals["invoices_inserted"] += result.get("invoices_inserted", 0)
+        print(f"📦 Flushed {len(batch)} events ({len(stripe_events)} Stripe, {len(clerk_events)} Clerk) → "
+              f"{result.get('clients_updated', 0) + len(updates)} client updates, {len(inserts)} new clients, "
+              f"{result.get('invoices_inserted', 0)} invoices in {time.perf_counter() - started:.2f}s")
+
+
+# ------------------------------------------------------------------
+#  HTTP
+# ------------------------------------------------------------------
+class IngestServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # A burst opens many connections at once; the default backlog of 5 resets them
+    request_queue_size = 256
+
+
+def make_handler(batcher: Batcher, stripe_secret: str, clerk_secret: str):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; with Nagle on, the body
+        # of every keep-alive response waits for the client's delayed ACK (~40 ms)
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, message: str):
+            raw = message.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            headers = {k.lower(): v for k, v in self.headers.items()}
+            try:
+                if self.path == "/stripe":
+                    event = verify_stripe(body, headers.get("stripe-signature"), stripe_secret)
+                    source, event_id = "stripe", event["id"]
+                    wanted = event["type"] in replay_stripe_events.EVENT_TYPES
+                elif self.path == "/clerk":
+                    event = verify_svix(body, headers, clerk_secret)
+                    source, event_id = "clerk", headers["svix-id"]
+                    wanted = event.get("type") in CLERK_EVENT_TYPES
+                else:
+                    return self._send(404, "Not found")
+            except (InvalidSignature, ValueError, KeyError) as e:
+                return self._send(400, str(e))
+
+            if not wanted:
+                return self._send(200, "Event ignored")
+            batch = batcher.submit(source, event_id, event)
+            if batch is None:
+                return self._send(200, "Already processed")
+            if not batch.done.wait(RESPONSE_TIMEOUT):
+                return self._send(503, "Batch not written in time")
+            if batch.error is not None:
+                return self._send(500, "Internal Server Error")
+            return self._send(200, json.dumps({"received": True}))
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Receive Clerk and Stripe webhooks and write them in micro-batches")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEBHOOK_INGEST_PORT", 8790)))
+    parser.add_argument("--window", type=float, default=float(os.getenv("WEBHOOK_INGEST_WINDOW", DEFAULT_WINDOW)),
+                        help="seconds an event may wait for its batch")
+    parser.add_argument("--max-events", type=int,
+                        default=int(os.getenv("WEBHOOK_INGEST_MAX_EVENTS", DEFAULT_MAX_EVENTS)),
+                        help="flush as soon as a batch holds this many events")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    stripe_secret = os.getenv("STRIPE_WEBHOOK_SIGNING_SECRET")
+    clerk_secret = os.getenv("CLERK_WEBHOOK_SECRET")
+    if not stripe_secret or not clerk_secret:
+        raise ValueError("STRIPE_WEBHOOK_SIGNING_SECRET and CLERK_WEBHOOK_SECRET environment variables are required")
+
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    configure_stripe(stripe)
+    sync_metrics.install("webhook_ingest")
+
+    ingestor = Ingestor(get_supabase_client())
+    batcher = Batcher(ingestor, args.window, args.max_events)
+    server = IngestServer((args.host, args.port), make_handler(batcher, stripe_secret, clerk_secret))
+
+    def stop(*_):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, stop)
+
+    print(f"🚀 Listening on http://{args.host}:{args.port} (/stripe, /clerk); "
+          f"window {args.window}s or {args.max_events} events")
+    try:
+        server.serve_forever()
+    finally:
+        batcher.close()
+        totals = ingestor.totals
+        print(f"\n📊 {totals['events']} events in {totals['flushes']} flushes: "
+              f"{totals['clients_updated']} client updates, {totals['clients_inserted']} new clients, "
+              f"{totals['invoices_inserted']} invoices")
+        sync_metrics.write_summary()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(profiling.run("webhook_ingest", main))